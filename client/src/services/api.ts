@@ -28,6 +28,9 @@ const api = axios.create({
     timeout: 10000, // 10 second timeout
 });
 
+// Time of our last write, echoed back so reads right after it skip lagging replicas
+let lastWrite: string | null = null;
+
 // Add request interceptor to add auth token
 api.interceptors.request.use(
     (config) => {
@@ -35,6 +38,9 @@ api.interceptors.request.use(
         if (token) {
             config.headers.Authorization = `Bearer ${token}`;
         }
+        if (lastWrite) {
+            config.headers['X-Last-Write'] = lastWrite;
+        }
         return config;
     },
     (error) => {
@@ -44,7 +50,13 @@ api.interceptors.request.use(
 
 // Add response interceptor for better error handling
 api.interceptors.response.use(
-    (response) => response,
+    (response) => {
+        const written = response.headers['x-last-write'];
+        if (written) {
+            lastWrite = written;
+        }
+        return response;
+    },
     (error) => {
         // Extract error message from response
         let errorMessage = 'An unexpected error occurred';
@@ -1,7 +1,19 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config.config import Config
 from config.database import db, jwt, mail
+from services.rate_limit import rate_limiter
+from services.db_routing import configure_replica_binds, replica_monitor, LAST_WRITE_HEADER
+from services.sharding import configure_shard_binds, create_shard_tables, shard_map
+from services.cache import response_cache, register_invalidation
+from services.slow_query_log import slow_query_log
+from services.profiler import request_profiler
+from services.jobs import job_runner
+from services.write_behind import write_behind
+from services.push import push_service
+from services.leaderboard import leaderboard
+from services.search import ensure_search_indexes
 import sys
 import os
 import logging
@@ -25,6 +37,13 @@ def create_app():
     
     # Load configuration
     app.config.from_object(Config)
+    configure_replica_binds(app)
+    configure_shard_binds(app)
+    
+    # Client addresses (rate limits) come from X-Forwarded-For when proxied
+    if app.config['TRUSTED_PROXIES']:
+        proxies = app.config['TRUSTED_PROXIES']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies, x_host=proxies)
     
     # Initialize extensions with app - Allow multiple frontend ports
     CORS(app, origins=[
@@ -34,27 +53,53 @@ def create_app():
         "http://127.0.0.1:5173",
         "http://127.0.0.1:3000", 
         "http://127.0.0.1:8080"
-    ])
+    ], expose_headers=[LAST_WRITE_HEADER])
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
+    rate_limiter.init_app(app)
+    response_cache.init_app(app)
+    slow_query_log.init_app(app)
+    request_profiler.init_app(app)
+    shard_map.init_app(app)
+    replica_monitor.init_app(app)
+    job_runner.init_app(app)
+    write_behind.init_app(app)
+    push_service.init_app(app)
+    leaderboard.init_app(app)
     
     # Import models to ensure they are registered
     from models.user import User
-    from models.habit import Habit, HabitCompletion
-    from models.notification import Notification
+    from models.habit import Habit, HabitCompletion, HabitCompletionBitmap
+    from models.notification import Notification, NotificationArchive, NotificationCounter
     from models.todo import Todo
+    from models.points_ledger import PointsLedgerEntry
+    from models.achievement import AchievementAwarded
+    from models.shard import ShardAssignment
+    from models.job import Job
+    from models.device_token import DeviceToken
+    
+    # Drop cached responses of a user whenever their data changes
+    register_invalidation(User, Habit, HabitCompletion, HabitCompletionBitmap, Todo, Notification, PointsLedgerEntry)
     
     # Register blueprints
     from routes.auth import auth_bp
     from routes.habits import habits_bp
     from routes.notifications import notifications_bp
     from routes.todos import todos_bp
+    from routes.leaderboard import leaderboard_bp
+    from routes.export import export_bp
+    from routes.admin import admin_bp
+    from routes.search import search_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(habits_bp, url_prefix='/api/habits')
     app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
     app.register_blueprint(todos_bp, url_prefix='/api')
+    app.register_blueprint(leaderboard_bp, url_prefix='/api/leaderboard')
+    app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(search_bp, url_prefix='/api')
     
     # Setup database with app context
     with app.app_context():
@@ -67,6 +112,11 @@ def create_app():
             # Now try to create tables
             db.create_all()
             print("✅ Database tables verified/created successfully!")
+            if create_shard_tables():
+                print(f"✅ Shard tables verified on {app.config['SHARD_COUNT']} shards")
+            created_indexes = ensure_search_indexes()
+            if created_indexes:
+                print(f"✅ Search indexes created: {', '.join(created_indexes)}")
             
         except Exception as e:
             error_msg = str(e).lower()
@@ -91,6 +141,8 @@ def create_app():
                         
                         # Create tables
                         db.create_all()
+                        create_shard_tables()
+                        ensure_search_indexes()
                         print("✅ All tables created successfully!")
                         
                         # Verify table creation
@@ -108,6 +160,14 @@ def create_app():
             else:
                 print("❌ Unexpected database error")
                 print("💡 Please check your XAMPP/MySQL configuration")
+        
+        # Load the in-memory leaderboard from the users table
+        try:
+            from services.leaderboard import rebuild_leaderboard
+            ranked_users = rebuild_leaderboard()
+            print(f"✅ Leaderboard loaded ({ranked_users} users)")
+        except Exception as e:
+            print(f"⚠️  Leaderboard could not be loaded: {e}")
     
     @app.route('/api/health')
     def health_check():
@@ -128,7 +188,8 @@ def create_app():
                 'message': 'Habit Tracker API is running',
                 'database': 'connected',
                 'tables': len(tables),
-                'table_names': tables
+                'table_names': tables,
+                'cache': response_cache.stats()
             }
         except Exception as e:
             return {
@@ -157,6 +218,7 @@ if __name__ == '__main__':
     print("   - Habits: http://localhost:5000/api/habits/*")
     print("   - Todos: http://localhost:5000/api/todos/*")
     print("   - Notifications: http://localhost:5000/api/notifications/*")
+    print("   - Leaderboard: http://localhost:5000/api/leaderboard/*")
     print("\n🎯 Starting server...")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the per-habit analytics endpoint's query and computation.
+
+Generates a synthetic completion history - --years of it, each day done
+with probability --density and some days twice - stores it for one habit
+in a throwaway SQLite database created by the app, and times the two steps
+of ``GET /api/habits/<id>/analytics``:
+
+* query   - ``completion_timestamps``, one SELECT of the habit's rows
+* compute - ``compute_analytics`` on the returned array
+
+Prints p50/p95 of each and of both together, and exits non-zero when the
+p95 of both together exceeds --budget-ms.
+
+Usage (from the server directory):
+
+    python benchmarks/bench_analytics.py --years 5 --runs 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def history(years, density, seed, today):
+    rng = random.Random(seed)
+    first = today - timedelta(days=round(years * 365.25) - 1)
+    stamps = []
+    for offset in range((today - first).days + 1):
+        day = datetime.combine(first + timedelta(days=offset), datetime.min.time())
+        for _ in range(2 if rng.random() < 0.1 else 1):
+            if rng.random() < density:
+                stamps.append(day + timedelta(minutes=rng.randrange(1440)))
+    rng.shuffle(stamps)
+    return stamps, first
+
+
+def store(stamps, first):
+    """One user and habit holding `stamps`; returns the habit id"""
+    from sqlalchemy import insert
+    
+    from config.database import db
+    from models.habit import Habit, HabitCompletion
+    from models.user import User
+    
+    db.session.execute(insert(User.__table__).values(
+        id=1, email='bench@example.com', username='bench', password_hash='-'
+    ))
+    db.session.execute(insert(Habit.__table__).values(
+        id=1, user_id=1, title='Bench', frequency='daily', created_at=datetime.combine(first, datetime.min.time())
+    ))
+    db.session.execute(insert(HabitCompletion.__table__), [{'habit_id': 1, 'completed_at': stamp} for stamp in stamps])
+    db.session.commit()
+    return 1
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=float, default=5)
+    parser.add_argument('--density', type=float, default=0.7, help='share of days the habit is completed')
+    parser.add_argument('--runs', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--budget-ms', type=float, default=10.0, help='p95 allowed for query + compute')
+    args = parser.parse_args()
+    
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_analytics.db')}",
+        'SHARD_TEST_COUNT': '0',
+        'RATE_LIMIT_ENABLED': 'false',
+        'JOBS_SCHEDULER_ENABLED': 'false',
+    })
+    from app import create_app
+    from config.database import db
+    from services.habit_analytics import completion_timestamps, compute_analytics
+    
+    today = date.today()
+    stamps, first = history(args.years, args.density, args.seed, today)
+    app = create_app()
+    with app.app_context():
+        habit_id = store(stamps, first)
+        print(f"📦 {len(stamps):,} completions from {first} to {today}")
+        
+        compute_analytics(completion_timestamps(habit_id), today, start=first)  # warm up
+        db.session.rollback()
+        query_ms, compute_ms, total_ms = [], [], []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            timestamps = completion_timestamps(habit_id)
+            fetched = time.perf_counter()
+            compute_analytics(timestamps, today, start=first)
+            done = time.perf_counter()
+            db.session.rollback()
+            query_ms.append((fetched - started) * 1000)
+            compute_ms.append((done - fetched) * 1000)
+            total_ms.append((done - started) * 1000)
+    
+    for label, samples in (('query', query_ms), ('compute', compute_ms), ('total', total_ms)):
+        p50, p95 = percentiles(samples)
+        print(f"⏱️  {label:<8} p50 {p50:>6.2f} ms   p95 {p95:>6.2f} ms")
+    
+    _, p95 = percentiles(total_ms)
+    if p95 > args.budget_ms:
+        print(f"❌ p95 {p95:.2f} ms is over the {args.budget_ms} ms budget")
+        return 1
+    print(f"✅ p95 {p95:.2f} ms within the {args.budget_ms} ms budget ({args.runs} runs)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
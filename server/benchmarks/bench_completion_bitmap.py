@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark: completion bitmaps vs scanning habit_completions rows.
+
+Creates the app on a throwaway SQLite database (or --db), fills the real
+tables with synthetic completions (2M by default, --habits-per-user habits
+per user), backfills the bitmaps with ``services.completion_bitmap
+.rebuild_bitmaps`` and then times what the two bitmap-backed views run,
+both ways:
+
+* calendar - ``GET /api/habits/<id>/calendar`` for the current year:
+  ``load_years`` + ``completed_days`` vs the ``habit_completions`` query
+  used without COMPLETION_BITMAPS_ENABLED
+* stats    - the 30-day completion count of ``GET /api/habits/stats`` for
+  all of a user's habits: ``completions_between`` vs a count over the
+  joined rows (both over the same calendar days, so the results match)
+
+Usage (from the server directory):
+
+    python benchmarks/bench_completion_bitmap.py --completions 10000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SERVER_DIR)
+
+
+def configure(path):
+    """Environment for create_app; must run before the config is imported"""
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{path}',
+        'SHARD_TEST_COUNT': '0',
+        'RATE_LIMIT_ENABLED': 'false',
+        'CACHE_ENABLED': 'false',
+        'JOBS_SCHEDULER_ENABLED': 'false',
+        'SLOW_QUERY_LOG_ENABLED': 'false',
+    })
+
+
+def populate(completions, years, density, habits_per_user, seed):
+    """Insert synthetic users, habits and completions; returns {user_id: [habit_id]}"""
+    from sqlalchemy import insert
+    
+    from config.database import db
+    from models.habit import Habit, HabitCompletion
+    from models.user import User
+    
+    rng = random.Random(seed)
+    today = date.today()
+    start = date(today.year - years + 1, 1, 1)
+    span = (today - start).days + 1
+    per_habit = max(min(int(span * density), span), 1)
+    habit_count = max(completions // per_habit, 1)
+    user_count = max(habit_count // habits_per_user, 1)
+    
+    db.session.execute(insert(User.__table__), [
+        {'id': user_id, 'email': f'bench{user_id}@example.com', 'username': f'bench{user_id}', 'password_hash': '-'}
+        for user_id in range(1, user_count + 1)
+    ])
+    habits = {}
+    for habit_id in range(1, habit_count + 1):
+        habits.setdefault((habit_id - 1) % user_count + 1, []).append(habit_id)
+    db.session.execute(insert(Habit.__table__), [
+        {'id': habit_id, 'user_id': user_id, 'title': f'Habit {habit_id}', 'frequency': 'daily',
+         'created_at': datetime.combine(start, datetime.min.time())}
+        for user_id, habit_ids in habits.items() for habit_id in habit_ids
+    ])
+    db.session.commit()
+    
+    inserted = 0
+    batch = []
+    for habit_id in range(1, habit_count + 1):
+        for offset in rng.sample(range(span), per_habit):
+            day = start + timedelta(days=offset)
+            batch.append({'habit_id': habit_id,
+                          'completed_at': datetime(day.year, day.month, day.day, rng.randrange(24), rng.randrange(60))})
+        if len(batch) >= 50000:
+            db.session.execute(insert(HabitCompletion.__table__), batch)
+            db.session.commit()
+            inserted += len(batch)
+            batch = []
+            print(f"   ... {inserted:,} completions", end='\r', flush=True)
+    if batch:
+        db.session.execute(insert(HabitCompletion.__table__), batch)
+        db.session.commit()
+        inserted += len(batch)
+    print(f"   {inserted:,} completions across {habit_count:,} habits of {user_count:,} users")
+    return habits
+
+
+def user_habits():
+    from config.database import db
+    from models.habit import Habit
+    
+    habits = {}
+    for habit_id, user_id in db.session.query(Habit.id, Habit.user_id).order_by(Habit.id):
+        habits.setdefault(user_id, []).append(habit_id)
+    return habits
+
+
+def calendar_rows(habit_id, year):
+    from models.habit import HabitCompletion
+    
+    rows = HabitCompletion.query.with_entities(HabitCompletion.completed_at).filter(
+        HabitCompletion.habit_id == habit_id,
+        HabitCompletion.completed_at >= date(year, 1, 1),
+        HabitCompletion.completed_at < date(year + 1, 1, 1)
+    ).all()
+    return sorted({row.completed_at.date() for row in rows})
+
+
+def calendar_bitmap(habit_id, year):
+    from services.completion_bitmap import completed_days, load_years
+    
+    return completed_days(load_years([habit_id], [year]).get((habit_id, year), 0), year)
+
+
+def stats_rows(user_id, first, last):
+    from models.habit import Habit, HabitCompletion
+    
+    return HabitCompletion.query.join(Habit).filter(
+        Habit.user_id == user_id,
+        Habit.deleted_at.is_(None),
+        HabitCompletion.completed_at >= first,
+        HabitCompletion.completed_at < last + timedelta(days=1)
+    ).count()
+
+
+def stats_bitmap(habit_ids, first, last):
+    from services.completion_bitmap import completions_between
+    
+    return sum(completions_between(habit_ids, first, last).values())
+
+
+def timed(label, fn, samples):
+    from config.database import db
+    
+    started = time.perf_counter()
+    results = []
+    for sample in samples:
+        results.append(fn(sample))
+        db.session.rollback()  # end the read transaction, as a request would
+    elapsed = time.perf_counter() - started
+    print(f"   {label:<10} {elapsed / len(samples) * 1e6:>10.1f} µs/op")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--completions', type=int, default=2_000_000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--density', type=float, default=0.6, help='share of days each habit is completed')
+    parser.add_argument('--habits-per-user', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='reuse/keep this SQLite file instead of a temporary one')
+    args = parser.parse_args()
+    
+    path = os.path.abspath(args.db or os.path.join(tempfile.mkdtemp(), 'bench_bitmap.db'))
+    fresh = not os.path.exists(path)
+    configure(path)
+    
+    from app import create_app
+    from config.database import db
+    from models.habit import HabitCompletion, HabitCompletionBitmap
+    from services.completion_bitmap import rebuild_bitmaps
+    
+    app = create_app()
+    with app.app_context():
+        print(f"📦 Database: {path}")
+        if fresh:
+            populate(args.completions, args.years, args.density, args.habits_per_user, args.seed)
+            started = time.perf_counter()
+            written = rebuild_bitmaps()
+            print(f"   rebuild_bitmaps: {written:,} bitmap rows in {time.perf_counter() - started:.1f}s")
+        habits = user_habits()
+        
+        rng = random.Random(args.seed)
+        today = date.today()
+        habit_ids = [habit_id for ids in habits.values() for habit_id in ids]
+        habit_samples = [rng.choice(habit_ids) for _ in range(args.queries)]
+        user_samples = [rng.choice(list(habits)) for _ in range(args.queries)]
+        window = (today - timedelta(days=29), today)
+        
+        print("\n📅 Calendar of the current year (GET /api/habits/<id>/calendar)")
+        a = timed('rows', lambda h: calendar_rows(h, today.year), habit_samples)
+        b = timed('bitmap', lambda h: calendar_bitmap(h, today.year), habit_samples)
+        assert a == b
+        
+        print(f"\n📈 Completions of all {args.habits_per_user} habits in the last 30 days (GET /api/habits/stats)")
+        a = timed('rows', lambda u: stats_rows(u, *window), user_samples)
+        b = timed('bitmap', lambda u: stats_bitmap(habits[u], *window), user_samples)
+        assert a == b
+        
+        rows = db.session.query(HabitCompletion).count()
+        bitmap_rows = db.session.query(HabitCompletionBitmap).count()
+        print(f"\n💾 {rows:,} completion rows vs {bitmap_rows:,} bitmap rows "
+              f"({bitmap_rows * 46 / 1024 / 1024:.1f} MiB of bitmap payload)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Load test: many simulated users replaying the React client's call sequences.
+
+Each simulated user follows the flows in client/src/services/api.ts as the
+pages issue them:
+
+* login        POST /auth/login, GET /auth/profile
+* dashboard    GET /habits + GET /habits/stats (in parallel, like Promise.all)
+* complete     POST /habits/:id/complete on a habit not done today, then
+               the dashboard reload
+* todos        GET /todos, GET /todos/stats, PUT /todos/:id toggling completed
+* notifications GET /notifications, POST /notifications/:id/read (or read-all)
+
+Users run concurrently on asyncio with their own keep-alive HTTP/1.1
+connections (two per user, like a browser's parallel requests).  Every
+random choice comes from a seeded RNG per user, so with the same --seed,
+--users and --iterations two runs send the same requests and can be compared.
+
+Usage (from the server directory):
+
+    # against a running instance (rate limiting must be off)
+    RATE_LIMIT_ENABLED=false gunicorn -c gunicorn.conf.py wsgi:app
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000 --users 50
+
+    # or let the tool start gunicorn on a throwaway SQLite database
+    python benchmarks/bench_load.py --start-server --users 50 --iterations 20
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (weight, flow) - how often a session does each thing after logging in
+FLOW_MIX = [
+    (35, 'dashboard'),
+    (25, 'complete'),
+    (25, 'todos'),
+    (15, 'notifications'),
+]
+
+HABITS_PER_USER = 5
+TODOS_PER_USER = 8
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection on asyncio streams"""
+    
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+    
+    async def request(self, method, path, body=None, token=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        
+        payload = json.dumps(body).encode() if body is not None else b''
+        headers = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+            'Accept: application/json',
+            f'Content-Length: {len(payload)}',
+        ]
+        if body is not None:
+            headers.append('Content-Type: application/json')
+        if token:
+            headers.append(f'Authorization: Bearer {token}')
+        
+        try:
+            self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + payload)
+            await self.writer.drain()
+            status, response_headers = await self._read_head()
+            data = await self._read_body(response_headers)
+        except (ConnectionError, asyncio.IncompleteReadError, HTTPError):
+            await self.close()
+            raise
+        
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, data
+    
+    async def _read_head(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return status, headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+    
+    async def _read_body(self, headers):
+        if 'content-length' in headers:
+            return await self.reader.readexactly(int(headers['content-length']))
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    return b''.join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+        # No length: the body runs until the server closes the connection
+        data = await self.reader.read()
+        await self.close()
+        return data
+    
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+
+class Stats:
+    """Latencies and errors per endpoint (method + route template)"""
+    
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+    
+    def record(self, endpoint, seconds, ok):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class SimulatedUser:
+    def __init__(self, index, host, port, prefix, stats, rng, think_ms):
+        self.index = index
+        self.email = f'{prefix}{index}@loadtest.local'
+        self.username = f'{prefix}{index}'
+        self.password = 'load-test-password'
+        self.connections = [Connection(host, port), Connection(host, port)]
+        self.stats = stats
+        self.rng = rng
+        self.think_ms = think_ms
+        self.token = None
+        self.habits = []
+    
+    async def call(self, endpoint, method, path, body=None, connection=0, expected=(200, 201)):
+        started = time.perf_counter()
+        try:
+            status, data = await self.connections[connection].request(method, '/api' + path, body, self.token)
+        except (OSError, asyncio.IncompleteReadError, HTTPError):
+            self.stats.record(endpoint, time.perf_counter() - started, False)
+            return None
+        self.stats.record(endpoint, time.perf_counter() - started, status in expected)
+        if status not in expected:
+            return None
+        return json.loads(data) if data else {}
+    
+    async def think(self):
+        if self.think_ms:
+            await asyncio.sleep(self.rng.expovariate(1000 / self.think_ms))
+    
+    # Setup (not measured): account, habits and todos
+    
+    async def setup(self):
+        unmeasured = Stats()
+        measured, self.stats = self.stats, unmeasured
+        try:
+            data = await self.call('setup', 'POST', '/auth/register', {
+                'email': self.email, 'username': self.username, 'password': self.password
+            }, expected=(201,))
+            if data is None:
+                # Already registered by an earlier run with the same prefix
+                data = await self.call('setup', 'POST', '/auth/login', {
+                    'email': self.email, 'password': self.password
+                })
+            if data is None:
+                raise RuntimeError(f'could not register or log in {self.email}')
+            self.token = data['access_token']
+            
+            habits = await self.call('setup', 'GET', '/habits')
+            for i in range(len(habits['habits']), HABITS_PER_USER):
+                await self.call('setup', 'POST', '/habits', {'title': f'Habit {i}', 'frequency': 'daily'})
+            todos = await self.call('setup', 'GET', '/todos')
+            for i in range(len(todos['todos']), TODOS_PER_USER):
+                await self.call('setup', 'POST', '/todos', {'text': f'Todo {i}'})
+            # Gives the notifications flow something to read
+            await self.call('setup', 'POST', '/notifications/reminders')
+        finally:
+            self.stats = measured
+    
+    # Flows, mirroring the pages in client/src/pages
+    
+    async def login(self):
+        data = await self.call('POST /auth/login', 'POST', '/auth/login', {
+            'email': self.email, 'password': self.password
+        })
+        if data:
+            self.token = data['access_token']
+        await self.call('GET /auth/profile', 'GET', '/auth/profile')
+    
+    async def dashboard(self):
+        habits, _ = await asyncio.gather(
+            self.call('GET /habits', 'GET', '/habits', connection=0),
+            self.call('GET /habits/stats', 'GET', '/habits/stats', connection=1),
+        )
+        if habits:
+            self.habits = habits['habits']
+    
+    async def complete(self):
+        if not self.habits:
+            await self.dashboard()
+        today = time.strftime('%Y-%m-%d', time.gmtime())
+        due = [h for h in self.habits if h['is_active'] and not (h['last_completed'] or '').startswith(today)]
+        if not due:
+            return
+        habit = self.rng.choice(due)
+        await self.call('POST /habits/:id/complete', 'POST', f"/habits/{habit['id']}/complete")
+        await self.dashboard()
+    
+    async def todos(self):
+        data = await self.call('GET /todos', 'GET', '/todos')
+        await self.call('GET /todos/stats', 'GET', '/todos/stats')
+        if data and data['todos']:
+            todo = self.rng.choice(data['todos'])
+            await self.think()
+            await self.call('PUT /todos/:id', 'PUT', f"/todos/{todo['id']}", {'completed': not todo['completed']})
+    
+    async def notifications(self):
+        data = await self.call('GET /notifications', 'GET', '/notifications')
+        unread = [n for n in (data or {}).get('notifications', []) if not n.get('read_at')]
+        if not unread:
+            return
+        await self.think()
+        if len(unread) > 1 and self.rng.random() < 0.3:
+            await self.call('POST /notifications/read-all', 'POST', '/notifications/read-all')
+        else:
+            notification = self.rng.choice(unread)
+            await self.call('POST /notifications/:id/read', 'POST', f"/notifications/{notification['id']}/read")
+    
+    async def run(self, iterations):
+        weights = [weight for weight, _ in FLOW_MIX]
+        await self.login()
+        await self.dashboard()
+        for _ in range(iterations):
+            await self.think()
+            _, flow = self.rng.choices(FLOW_MIX, weights)[0]
+            await getattr(self, flow)()
+        for connection in self.connections:
+            await connection.close()
+
+
+async def run_load(args, host, port):
+    stats = Stats()
+    users = [
+        SimulatedUser(i, host, port, args.prefix, stats, random.Random(args.seed * 100003 + i), args.think_ms)
+        for i in range(args.users)
+    ]
+    
+    print(f"👥 Preparing {args.users} users...")
+    semaphore = asyncio.Semaphore(20)
+    
+    async def prepare(user):
+        async with semaphore:
+            await user.setup()
+            for connection in user.connections:
+                await connection.close()
+    
+    await asyncio.gather(*(prepare(user) for user in users))
+    
+    async def start(user):
+        if args.ramp_up:
+            await asyncio.sleep(args.ramp_up * user.index / args.users)
+        await user.run(args.iterations)
+    
+    print(f"🏁 {args.users} users x {args.iterations} flows (seed {args.seed})\n")
+    started = time.perf_counter()
+    await asyncio.gather(*(start(user) for user in users))
+    return stats, time.perf_counter() - started
+
+
+def report(stats, elapsed):
+    rows = []
+    for endpoint, latencies in sorted(stats.latencies.items()):
+        latencies.sort()
+        errors = stats.errors.get(endpoint, 0)
+        rows.append({
+            'endpoint': endpoint,
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': errors / len(latencies),
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        })
+    total = sum(row['requests'] for row in rows)
+    total_errors = sum(row['errors'] for row in rows)
+    everything = sorted(value for latencies in stats.latencies.values() for value in latencies)
+    summary = {
+        'elapsed_seconds': elapsed,
+        'requests': total,
+        'errors': total_errors,
+        'error_rate': total_errors / total if total else 0.0,
+        'rps': total / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(everything, 0.50) * 1000,
+        'p95_ms': percentile(everything, 0.95) * 1000,
+        'p99_ms': percentile(everything, 0.99) * 1000,
+    }
+    
+    print(f"{'endpoint':<32}{'reqs':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'err %':>7}")
+    for row in rows + [dict(summary, endpoint='TOTAL')]:
+        print(f"{row['endpoint']:<32}{row['requests']:>7}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}"
+              f"{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['errors']:>8}{row['error_rate'] * 100:>7.2f}")
+    print(f"\n⏱️  {elapsed:.1f}s, {summary['rps']:.1f} req/s overall")
+    return {'summary': summary, 'endpoints': rows}
+
+
+def start_server(port, workers, profile):
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, **{
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        'GUNICORN_PROFILE': profile,
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(workers),
+        'GUNICORN_ACCESS_LOG': '',
+        'GUNICORN_LOG_LEVEL': 'warning',
+        'RATE_LIMIT_ENABLED': 'false',
+    })
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    return server, workdir
+
+
+async def wait_for(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        connection = Connection(host, port)
+        try:
+            status, _ = await connection.request('GET', '/api/health')
+            await connection.close()
+            if status < 500:
+                return True
+        except (OSError, asyncio.IncompleteReadError, HTTPError):
+            pass
+        await asyncio.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='instance to load (ignored with --start-server)')
+    parser.add_argument('--users', type=int, default=50, help='simulated users')
+    parser.add_argument('--iterations', type=int, default=20, help='flows each user runs after logging in')
+    parser.add_argument('--think-ms', type=float, default=200, help='mean think time between actions (0 = none)')
+    parser.add_argument('--ramp-up', type=float, default=2.0, help='seconds over which users start')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--prefix', default='load_user_', help='username prefix of the simulated accounts')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--start-server', action='store_true', help='run gunicorn on a throwaway database')
+    parser.add_argument('--port', type=int, default=5056, help='port for --start-server')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1, help='workers for --start-server')
+    parser.add_argument('--profile', default='gthread', help='gunicorn profile for --start-server')
+    args = parser.parse_args()
+    
+    server = workdir = None
+    if args.start_server:
+        host, port = '127.0.0.1', args.port
+        server, workdir = start_server(port, args.workers, args.profile)
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    
+    try:
+        if not asyncio.run(wait_for(host, port)):
+            detail = server.stderr.read().decode()[-2000:] if server else ''
+            sys.exit(f"❌ {host}:{port} is not answering /api/health\n{detail}")
+        stats, elapsed = asyncio.run(run_load(args, host, port))
+    finally:
+        if server:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    results = report(stats, elapsed)
+    if args.json:
+        results['config'] = {key: value for key, value in vars(args).items() if key != 'json'}
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark: push fan-out throughput in messages per second.
+
+Starts the stand-in provider from services.push in a separate process (or
+uses --url) and sends the same synthetic messages three ways:
+
+* single  - one message per request on a new connection each time
+* pooled  - one message per request over the pooled keep-alive session
+* batched - what services.push does: provider-sized batches over the pooled
+  session from --concurrency threads
+
+The stand-in can answer each request after --latency-ms, as a provider
+across the network would, and rejects --invalid-rate of the tokens as
+unregistered.  Exits non-zero when the batched rate is below --min-rate.
+
+Usage (from the server directory):
+
+    python benchmarks/bench_push.py --messages 100000 --latency-ms 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+import urllib.request
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from services.push import (  # noqa: E402
+    PushMessage, PushProvider, HttpProvider, StandInReceiver, _result_status, fan_out
+)
+
+
+def serve(ready, max_batch, latency_ms, fail_rate):
+    receiver = StandInReceiver(('127.0.0.1', 0), max_batch=max_batch, latency_ms=latency_ms,
+                               fail_rate=fail_rate, seed=1)
+    ready.put(receiver.url)
+    receiver.serve_forever()
+
+
+class UnpooledProvider(PushProvider):
+    """One message per request, each on a fresh connection"""
+    
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+    
+    def send_batch(self, messages):
+        message = messages[0]
+        response = requests.post(self.url, timeout=self.timeout, headers={'Connection': 'close'}, json={
+            'messages': [{'token': message.token, 'title': message.title, 'body': message.body, 'data': message.data}]
+        })
+        return [_result_status(response.json()['results'][0])]
+
+
+def receiver_stats(url):
+    with urllib.request.urlopen(url.rsplit('/', 1)[0] + '/stats') as response:
+        return json.load(response)
+
+
+def messages(count, invalid_rate, seed):
+    rng = random.Random(seed)
+    return [
+        PushMessage(
+            user_id=index // 3 + 1,
+            token=('invalid-' if rng.random() < invalid_rate else '') + f'{index:012x}' * 12,
+            title='Reminder: 3 habits due today',
+            body='Run, Read and Stretch are still open for today',
+            data={'notification_id': index + 1}
+        )
+        for index in range(count)
+    ]
+
+
+def run(label, provider, batch, concurrency, url, max_retries):
+    before = receiver_stats(url)
+    started = time.perf_counter()
+    counts, invalid = fan_out(provider, batch, concurrency=concurrency, max_retries=max_retries, retry_delay=0.05)
+    elapsed = time.perf_counter() - started
+    after = receiver_stats(url)
+    provider.close()
+    rate = len(batch) / elapsed
+    print(f"   {label:<8} {len(batch):>8,} msgs  {rate:>10,.0f} msgs/s  {after['batches'] - before['batches']:>7,} requests  "
+          f"{after['connections'] - before['connections'] - 1:>5,} connections  "
+          f"sent {counts['sent']:,} / invalid {counts['invalid']:,} / failed {counts['failed']:,}")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--unbatched-messages', type=int, default=2000, help='messages for the single/pooled runs')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='stand-in delay per request')
+    parser.add_argument('--invalid-rate', type=float, default=0.01)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share answered unavailable (retried)')
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--min-rate', type=float, default=20_000, help='batched msgs/s required')
+    parser.add_argument('--url', help='provider endpoint; default: start the stand-in')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    process = None
+    url = args.url
+    if url is None:
+        ready = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=serve, args=(ready, args.batch_size, args.latency_ms, args.fail_rate), daemon=True
+        )
+        process.start()
+        url = ready.get(timeout=10)
+    
+    try:
+        print(f"📱 Provider: {url} ({args.latency_ms} ms per request)")
+        small = messages(args.unbatched_messages, args.invalid_rate, args.seed)
+        run('single', UnpooledProvider(url), small, args.concurrency, url, 0)
+        run('pooled', HttpProvider(url, max_batch=1, pool_size=args.concurrency), small, args.concurrency, url, 0)
+        rate = run(
+            'batched',
+            HttpProvider(url, max_batch=args.batch_size, pool_size=args.concurrency),
+            messages(args.messages, args.invalid_rate, args.seed),
+            args.concurrency, url, args.max_retries
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+    
+    if rate < args.min_rate:
+        print(f"\n❌ batched {rate:,.0f} msgs/s is under the {args.min_rate:,.0f} msgs/s floor")
+        return 1
+    print(f"\n✅ batched {rate:,.0f} msgs/s (floor {args.min_rate:,.0f})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full-text search vs LIKE scans.
+
+Builds a throwaway SQLite database with the todos table, the FTS5 index and
+triggers that services.search creates, fills it with synthetic todos (2M by
+default, spread over many users, words drawn from a Zipf-like vocabulary)
+and times the statement behind ``GET /api/search`` against the ``LIKE``
+filtering a client would otherwise need.  Exits non-zero when the p95 of
+the indexed search exceeds --budget-ms.
+
+Usage (from the server directory):
+
+    python benchmarks/bench_search.py --todos 2000000 --users 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from services.search import SQLITE_INDEXES, _sqlite_query, _sqlite_rank, _sqlite_statements, search_terms  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE todos (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    completed BOOLEAN NOT NULL DEFAULT 0
+);
+CREATE INDEX ix_todos_user_id ON todos (user_id);
+"""
+
+VOCABULARY_SIZE = 5000
+
+
+def word(rng):
+    # Rank r is drawn with probability ~ 1/r, like words in real text
+    rank = int(VOCABULARY_SIZE ** rng.random())
+    return f'w{rank}'
+
+
+def populate(conn, todos, users, seed):
+    rng = random.Random(seed)
+    batch = []
+    for todo_id in range(1, todos + 1):
+        text = ' '.join(word(rng) for _ in range(rng.randint(3, 12)))
+        batch.append((todo_id, rng.randint(1, users), text))
+        if len(batch) == 10000:
+            conn.executemany("INSERT INTO todos (id, user_id, text) VALUES (?, ?, ?)", batch)
+            conn.commit()
+            batch = []
+            print(f"   ... {todo_id:,} todos", end='\r', flush=True)
+    conn.executemany("INSERT INTO todos (id, user_id, text) VALUES (?, ?, ?)", batch)
+    conn.commit()
+    print(f"   {todos:,} todos across {users:,} users")
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def timed(label, fn, samples):
+    durations = []
+    for sample in samples:
+        started = time.perf_counter()
+        fn(sample)
+        durations.append((time.perf_counter() - started) * 1000)
+    print(f"   {label:<8} p50 {percentile(durations, 0.5):>8.3f} ms   p95 {percentile(durations, 0.95):>8.3f} ms   "
+          f"p99 {percentile(durations, 0.99):>8.3f} ms")
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--todos', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=21, help='rows fetched per search (page size + 1)')
+    parser.add_argument('--budget-ms', type=float, default=10.0, help='p95 the indexed search must stay under')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='reuse/keep this SQLite file instead of a temporary one')
+    args = parser.parse_args()
+    
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    fresh = not os.path.exists(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+    
+    print(f"📦 Database: {path}")
+    if fresh:
+        conn.executescript(SCHEMA)
+        spec = SQLITE_INDEXES['todos_fts']
+        for statement in _sqlite_statements('todos_fts', spec['table'], spec['columns']):
+            conn.execute(statement)
+        started = time.perf_counter()
+        populate(conn, args.todos, args.users, args.seed)
+        print(f"   inserted through the FTS triggers in {time.perf_counter() - started:.1f}s")
+    
+    rng = random.Random(args.seed + 1)
+    samples = []
+    for _ in range(args.queries):
+        # A user searches for one or two words (or prefixes) of their own todos
+        user_id = rng.randint(1, args.users)
+        row = conn.execute(
+            "SELECT text FROM todos WHERE user_id = ? ORDER BY RANDOM() LIMIT 1", (user_id,)
+        ).fetchone()
+        words = row[0].split() if row else [word(rng)]
+        query = ' '.join(rng.sample(words, min(len(words), rng.randint(1, 2))))
+        if rng.random() < 0.3:
+            query = query[:max(len(query) - 1, 2)]
+        samples.append((user_id, query))
+    
+    def indexed(sample):
+        user_id, query = sample
+        terms = search_terms(query)
+        statement, params = _sqlite_query('todo', user_id, terms)
+        return _sqlite_rank('todo', terms, conn.execute(str(statement), params), args.limit)
+    
+    def like(sample):
+        user_id, query = sample
+        sql = "SELECT id FROM todos WHERE user_id = ?" + " AND text LIKE ?" * len(search_terms(query))
+        return conn.execute(
+            sql + " ORDER BY id DESC LIMIT ?",
+            [user_id, *(f'%{term}%' for term in search_terms(query)), args.limit]
+        ).fetchall()
+    
+    def like_all_users(sample):
+        _, query = sample
+        sql = "SELECT id FROM todos WHERE " + " AND ".join(["text LIKE ?"] * len(search_terms(query)))
+        return conn.execute(
+            sql + " LIMIT ?", [*(f'%{term}%' for term in search_terms(query)), args.limit]
+        ).fetchall()
+    
+    print(f"\n🔎 {args.queries} searches, {args.limit} rows each")
+    durations = timed('fts5', indexed, samples)
+    timed('like', like, samples)
+    timed('like*', like_all_users, samples[:50])
+    print("   (like*: LIKE without the user_id index, 50 queries)")
+    
+    p95 = percentile(durations, 0.95)
+    if p95 > args.budget_ms:
+        print(f"\n❌ fts5 p95 {p95:.3f} ms is over the {args.budget_ms} ms budget")
+        return 1
+    print(f"\n✅ fts5 p95 {p95:.3f} ms (budget {args.budget_ms} ms)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
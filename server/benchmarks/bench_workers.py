@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark: gunicorn worker profiles against the API's endpoint mix.
+
+Starts gunicorn once per profile (sync, gthread, gevent) on a fresh SQLite
+database, seeds a user with habits and todos, then drives a fixed request mix
+from a thread pool for a fixed duration and reports throughput and latency.
+
+Usage (from the server directory):
+
+    python benchmarks/bench_workers.py --duration 20 --concurrency 32
+"""
+import argparse
+import os
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# (weight, method, path) - the mix the dashboard, habits and todo pages produce
+ENDPOINT_MIX = [
+    (30, 'GET', '/api/habits'),
+    (15, 'GET', '/api/habits/stats'),
+    (20, 'GET', '/api/todos'),
+    (10, 'GET', '/api/todos/stats'),
+    (10, 'GET', '/api/notifications'),
+    (5, 'GET', '/api/auth/profile'),
+    (10, 'PUT', '/api/todos/{todo_id}'),
+]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def seed(base_url):
+    session = requests.Session()
+    response = session.post(f'{base_url}/api/auth/register', json={
+        'email': 'bench@example.com', 'username': 'bench_user', 'password': 'benchmark-password'
+    })
+    response.raise_for_status()
+    session.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+    for i in range(10):
+        session.post(f'{base_url}/api/habits', json={'title': f'Habit {i}', 'frequency': 'daily'}).raise_for_status()
+    todo_ids = [
+        session.post(f'{base_url}/api/todos', json={'text': f'Todo {i}'}).json()['todo']['id']
+        for i in range(20)
+    ]
+    return session.headers['Authorization'], todo_ids
+
+
+def drive(base_url, token, todo_ids, duration, concurrency, seed_value):
+    weights = [weight for weight, _, _ in ENDPOINT_MIX]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    
+    def client(index):
+        rng = random.Random(seed_value + index)
+        session = requests.Session()
+        session.headers['Authorization'] = token
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            _, method, path = rng.choices(ENDPOINT_MIX, weights)[0]
+            path = path.format(todo_id=rng.choice(todo_ids))
+            body = {'completed': rng.random() < 0.5} if method == 'PUT' else None
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=30)
+                if response.status_code >= 400:
+                    failed += 1
+            except requests.RequestException:
+                failed += 1
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return latencies, errors[0]
+
+
+def run_profile(profile, args):
+    workdir = tempfile.mkdtemp()
+    port = args.port
+    env = dict(os.environ, **{
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'GUNICORN_PROFILE': profile,
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'GUNICORN_WORKERS': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        'GUNICORN_ACCESS_LOG': '',
+        'GUNICORN_LOG_LEVEL': 'warning',
+        'RATE_LIMIT_ENABLED': 'false',
+    })
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        if not wait_for(f'{base_url}/api/health'):
+            print(f"   {profile}: server did not start\n{server.stderr.read().decode()[-2000:]}")
+            return None
+        token, todo_ids = seed(base_url)
+        latencies, errors = drive(base_url, token, todo_ids, args.duration, args.concurrency, args.seed)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    latencies.sort()
+    return {
+        'profile': profile,
+        'requests': len(latencies),
+        'rps': len(latencies) / args.duration,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95)] * 1000,
+        'p99': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() * 2 + 1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    print(f"🏁 {args.workers} workers, {args.concurrency} concurrent clients, {args.duration:.0f}s per profile\n")
+    print(f"{'profile':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for profile in args.profiles.split(','):
+        result = run_profile(profile.strip(), args)
+        if result:
+            print(f"{result['profile']:<10}{result['rps']:>10.1f}{result['p50']:>10.1f}"
+                  f"{result['p95']:>10.1f}{result['p99']:>10.1f}{result['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
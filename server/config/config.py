@@ -17,6 +17,34 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite (e.g. DATABASE_URL=sqlite:///habit_tracker.db, created in the
+    # instance folder) runs in WAL mode: one writer, many concurrent readers
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_KIB = int(os.getenv('SQLITE_CACHE_KIB', 20000))
+    
+    # Read replicas: comma separated URLs used by read-only GET endpoints.
+    # Replicas lagging more than REPLICA_MAX_LAG_SECONDS are skipped, and a
+    # user keeps reading from the primary for REPLICA_STICKY_SECONDS after
+    # one of their writes.
+    SQLALCHEMY_READ_REPLICA_URIS = [
+        url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+    ]
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', 10))
+    REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    
+    # Sharding: comma separated URLs of the databases holding user-owned
+    # tables (habits, todos, notifications, points ledger, ...); users stay
+    # on the primary.  SHARD_TEST_COUNT creates that many local SQLite shards
+    # in SHARD_TEST_DIR (default: the instance folder) instead.
+    SQLALCHEMY_SHARD_URIS = [
+        url.strip() for url in os.getenv('DATABASE_SHARD_URLS', '').split(',') if url.strip()
+    ]
+    SHARD_TEST_COUNT = int(os.getenv('SHARD_TEST_COUNT', 0))
+    SHARD_TEST_DIR = os.getenv('SHARD_TEST_DIR')
+    SHARD_MAP_TTL_SECONDS = float(os.getenv('SHARD_MAP_TTL_SECONDS', 10))
+    
     # Email Configuration
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -24,5 +52,105 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     
-    # Development settings
-    DEBUG = True 
\ No newline at end of file
+    # Notification retention: read notifications older than the retention
+    # window are archived ('table' or 'file') and purged in small batches
+    NOTIFICATION_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 90))
+    NOTIFICATION_PURGE_BATCH_SIZE = int(os.getenv('NOTIFICATION_PURGE_BATCH_SIZE', 500))
+    NOTIFICATION_ARCHIVE_MODE = os.getenv('NOTIFICATION_ARCHIVE_MODE', 'table')
+    NOTIFICATION_ARCHIVE_PATH = os.getenv('NOTIFICATION_ARCHIVE_PATH', 'notification_archive.ndjson')
+    
+    # Unread counters behind /api/notifications/unread-count are repaired by
+    # python -m services.unread_counter, this many users per transaction
+    UNREAD_RECONCILE_BATCH_SIZE = int(os.getenv('UNREAD_RECONCILE_BATCH_SIZE', 500))
+    
+    # Background jobs (services.jobs): JOBS_WORKER_THREADS > 0 runs workers
+    # inside each gunicorn worker; otherwise run python -m services.jobs work
+    JOBS_WORKER_THREADS = int(os.getenv('JOBS_WORKER_THREADS', 0))
+    JOBS_SCHEDULER_ENABLED = os.getenv('JOBS_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    JOBS_POLL_SECONDS = float(os.getenv('JOBS_POLL_SECONDS', 2))
+    JOBS_RETRY_BASE_SECONDS = float(os.getenv('JOBS_RETRY_BASE_SECONDS', 10))
+    JOBS_RETRY_MAX_SECONDS = float(os.getenv('JOBS_RETRY_MAX_SECONDS', 3600))
+    JOBS_LOCK_TIMEOUT_SECONDS = int(os.getenv('JOBS_LOCK_TIMEOUT_SECONDS', 3600))
+    JOBS_DEFER_EMAIL = os.getenv('JOBS_DEFER_EMAIL', 'false').lower() == 'true'
+    JOBS_DEFER_PUSH = os.getenv('JOBS_DEFER_PUSH', 'false').lower() == 'true'
+    # Finished jobs are deleted by the jobs.purge_finished schedule
+    JOBS_RETENTION_DAYS = float(os.getenv('JOBS_RETENTION_DAYS', 7))
+    JOBS_FAILED_RETENTION_DAYS = float(os.getenv('JOBS_FAILED_RETENTION_DAYS', 30))
+    JOBS_PURGE_BATCH_SIZE = int(os.getenv('JOBS_PURGE_BATCH_SIZE', 1000))
+    
+    # Push notifications (services.push): PUSH_PROVIDER is none, log or http;
+    # http POSTs batches of PUSH_BATCH_SIZE messages to PUSH_PROVIDER_URL from
+    # at most PUSH_CONCURRENCY threads per process over pooled connections
+    PUSH_PROVIDER = os.getenv('PUSH_PROVIDER', 'none')
+    PUSH_PROVIDER_URL = os.getenv('PUSH_PROVIDER_URL', 'http://127.0.0.1:8099/send')
+    PUSH_PROVIDER_API_KEY = os.getenv('PUSH_PROVIDER_API_KEY', '')
+    PUSH_BATCH_SIZE = int(os.getenv('PUSH_BATCH_SIZE', 500))
+    PUSH_CONCURRENCY = int(os.getenv('PUSH_CONCURRENCY', 8))
+    PUSH_TIMEOUT_SECONDS = float(os.getenv('PUSH_TIMEOUT_SECONDS', 10))
+    PUSH_MAX_RETRIES = int(os.getenv('PUSH_MAX_RETRIES', 2))
+    PUSH_RETRY_BASE_MS = float(os.getenv('PUSH_RETRY_BASE_MS', 200))
+    PUSH_MAX_DEVICES_PER_USER = int(os.getenv('PUSH_MAX_DEVICES_PER_USER', 10))
+    
+    # users.last_login is buffered per worker and written in batches
+    # (services.write_behind) instead of one commit per login
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+    WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', 5))
+    WRITE_BEHIND_MAX_ENTRIES = int(os.getenv('WRITE_BEHIND_MAX_ENTRIES', 1000))
+    
+    # Keep a per-habit, per-year completion bitmap next to habit_completions
+    COMPLETION_BITMAPS_ENABLED = os.getenv('COMPLETION_BITMAPS_ENABLED', 'false').lower() == 'true'
+    
+    # Rate limiting: 'memory' keeps buckets per worker, 'sqlite' shares them
+    # between workers through RATE_LIMIT_STORAGE_PATH (e.g. under /dev/shm).
+    # RATE_LIMITS is a JSON object of per-endpoint overrides, for example
+    # {"auth.login": {"ip": "50/minute", "account": "10/minute"}}
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_STORAGE_PATH = os.getenv('RATE_LIMIT_STORAGE_PATH')
+    RATE_LIMITS = os.getenv('RATE_LIMITS', '{}')
+    # Reverse proxies (nginx, load balancer) in front of gunicorn that set
+    # X-Forwarded-For/-Proto/-Host; 0 trusts none and uses the socket address
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 0))
+    
+    # Response cache for read endpoints: 'memory' (per worker LRU) or 'sqlite'
+    # (shared by the workers on one host through CACHE_STORAGE_PATH).  Under
+    # gunicorn with more than one worker the memory backend is turned off.
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_STORAGE_PATH = os.getenv('CACHE_STORAGE_PATH')
+    CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    
+    # Each worker keeps its own leaderboard and reloads it from the database
+    # when a read finds it older than this (0 = never; single worker only)
+    LEADERBOARD_REFRESH_SECONDS = float(os.getenv('LEADERBOARD_REFRESH_SECONDS', 10))
+    
+    # Accounts allowed to use the /api/admin endpoints (comma separated user
+    # ids).  Ids rather than e-mails: users can change their e-mail at will.
+    ADMIN_USER_IDS = [
+        int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()
+    ]
+    
+    # Slow query log: statements above the threshold are kept in a ring
+    # buffer (GET /api/admin/slow-queries) and written to a rotating file
+    SLOW_QUERY_LOG_ENABLED = os.getenv('SLOW_QUERY_LOG_ENABLED', 'false').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_BUFFER_SIZE = int(os.getenv('SLOW_QUERY_BUFFER_SIZE', 200))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
+    SLOW_QUERY_LOG_PATH = os.getenv('SLOW_QUERY_LOG_PATH', 'slow_queries.log')
+    
+    # Per-request profiler: admins send X-Profile: 1|cprofile|sample (or
+    # ?profile=) and get an X-Profile-Id; profiles are files in PROFILER_DIR
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'true').lower() == 'true'
+    PROFILER_DIR = os.getenv('PROFILER_DIR', '')  # default: <tmp>/stride_streak_profiles
+    PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', 50))
+    PROFILER_DEFAULT_MODE = os.getenv('PROFILER_DEFAULT_MODE', 'cprofile')
+    PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILER_SAMPLE_INTERVAL_MS', 2))
+    
+    # Deleted habits can be restored for HABIT_UNDO_WINDOW_HOURS; afterwards
+    # services.habit_purge removes them and their completions in batches
+    HABIT_UNDO_WINDOW_HOURS = float(os.getenv('HABIT_UNDO_WINDOW_HOURS', 24))
+    HABIT_PURGE_BATCH_SIZE = int(os.getenv('HABIT_PURGE_BATCH_SIZE', 1000))
+    
+    # Development settings (python app.py always runs with the debugger)
+    DEBUG = os.getenv('FLASK_DEBUG', 'false').lower() == 'true' 
\ No newline at end of file
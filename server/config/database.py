@@ -1,8 +1,56 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config.config import Config
+from services.db_routing import RoutingSession
 
 # Initialize Flask extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
-mail = Mail() 
\ No newline at end of file
+mail = Mail()
+
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Pragmas for SQLite databases (primary, shards and replicas)
+    
+    WAL lets readers run alongside the single writer, busy_timeout makes
+    writers queue for the lock instead of failing, and synchronous=NORMAL is
+    durable across application crashes in WAL mode (only an OS crash can
+    lose the last commits).
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    
+    # pysqlite's default transaction handling is kept on purpose: reads run
+    # outside a transaction and BEGIN is only sent before the first write, so
+    # the write lock is held from the first INSERT/UPDATE to the commit and
+    # slow work before it (password hashing) never blocks other writers
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute(f"PRAGMA synchronous = {Config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size = -{int(Config.SQLITE_CACHE_KIB)}")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.execute("PRAGMA foreign_keys = ON")
+    cursor.close()
+
+
+def commit_without_expire():
+    """Commit without expiring the session's objects
+
+    Write handlers serialize the rows they just saved; with the default
+    expire_on_commit every to_dict() after commit would re-SELECT the row.
+    Column defaults and primary keys are already populated by the flush
+    (via RETURNING where the backend supports it), so the in-memory state
+    is exactly what was written.
+    """
+    session = db.session()
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = True
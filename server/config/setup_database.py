@@ -5,22 +5,53 @@ This script will create the database and all tables automatically
 """
 import sys
 import os
-import pymysql
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import OperationalError, ProgrammingError
 
 # This script is called from the server directory, so imports work normally
 
 def create_database():
     """Create the database if it doesn't exist"""
+    from config.config import Config
+    
+    url = make_url(Config.SQLALCHEMY_DATABASE_URI)
+    if url.get_backend_name() == 'sqlite':
+        return create_sqlite_database(url)
+    return create_mysql_database(url)
+
+def create_sqlite_database(url):
+    """SQLite needs no server: make sure the file's directory exists"""
+    print("🔍 Checking SQLite database...")
+    
+    path = url.database
+    if not path or path == ':memory:':
+        print("✅ Using an in-memory SQLite database")
+        return True
+    
+    if not os.path.isabs(path):
+        # Flask-SQLAlchemy resolves relative SQLite paths in the instance folder
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    print(f"✅ SQLite database: {path}")
+    return True
+
+def create_mysql_database(url):
+    """Create the MySQL database named in DATABASE_URL if it doesn't exist"""
     print("🔍 Checking database connection...")
     
+    # pymysql is only needed for MySQL installs
+    import pymysql
+    
+    database = url.database or 'habit_tracker'
+    
     # Connection without database to create it
     try:
         connection = pymysql.connect(
-            host='localhost',
-            user='root',
-            password='',  # Default XAMPP password is empty
+            host=url.host or 'localhost',
+            port=url.port or 3306,
+            user=url.username or 'root',
+            password=url.password or '',  # Default XAMPP password is empty
             charset='utf8mb4'
         )
         
@@ -28,13 +59,13 @@ def create_database():
         
         with connection.cursor() as cursor:
             # Create database if it doesn't exist
-            cursor.execute("CREATE DATABASE IF NOT EXISTS habit_tracker CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-            print("✅ Database 'habit_tracker' created/verified")
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+            print(f"✅ Database '{database}' created/verified")
             
             # Show databases to confirm
             cursor.execute("SHOW DATABASES")
             databases = [db[0] for db in cursor.fetchall()]
-            if 'habit_tracker' in databases:
+            if database in databases:
                 print("✅ Database exists in MySQL")
             else:
                 print("❌ Database creation failed")
@@ -55,6 +86,7 @@ def create_database():
         print("   1. Make sure XAMPP is running")
         print("   2. Start Apache and MySQL in XAMPP Control Panel")
         print("   3. Check if MySQL is running on port 3306")
+        print("   4. Or skip MySQL: set DATABASE_URL=sqlite:///habit_tracker.db")
         return False
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
@@ -73,39 +105,58 @@ def create_tables():
         app = Flask(__name__)
         app.config.from_object(Config)
         
+        from services.sharding import configure_shard_binds, create_shard_tables
+        configure_shard_binds(app)
         db.init_app(app)
         
         with app.app_context():
             # Test database connection first
             try:
                 db.session.execute(text("SELECT 1"))
-                print("✅ Connected to habit_tracker database")
+                print("✅ Connected to the application database")
             except Exception as conn_error:
                 print(f"❌ Failed to connect to database: {conn_error}")
                 return False
             
             # Import all models to register them
             from models.user import User
-            from models.habit import Habit, HabitCompletion
-            from models.notification import Notification
+            from models.habit import Habit, HabitCompletion, HabitCompletionBitmap
+            from models.notification import Notification, NotificationArchive, NotificationCounter
             from models.todo import Todo
+            from models.points_ledger import PointsLedgerEntry
+            from models.achievement import AchievementAwarded
+            from models.shard import ShardAssignment
+            from models.job import Job
+            from models.device_token import DeviceToken
+            from services.search import ensure_search_indexes
             
             print("📋 Creating tables:")
             print("   - users")
             print("   - habits")
             print("   - habit_completions")
+            print("   - habit_completion_bitmaps")
             print("   - notifications")
+            print("   - notifications_archive")
+            print("   - notification_counters")
             print("   - todos")
+            print("   - points_ledger")
+            print("   - achievements_awarded")
+            print("   - shard_assignments")
+            print("   - jobs")
             
             # Create all tables
             db.create_all()
+            if create_shard_tables():
+                print(f"   ✅ user tables on {app.config['SHARD_COUNT']} shards")
+            for index_name in ensure_search_indexes():
+                print(f"   ✅ search index {index_name}")
             
             # Verify tables were created
             from sqlalchemy import inspect
             inspector = inspect(db.engine)
             tables = inspector.get_table_names()
             
-            expected_tables = ['users', 'habits', 'habit_completions', 'notifications', 'todos']
+            expected_tables = ['users', 'habits', 'habit_completions', 'habit_completion_bitmaps', 'notifications', 'notifications_archive', 'notification_counters', 'todos', 'points_ledger', 'achievements_awarded', 'shard_assignments', 'jobs']
             created_tables = []
             missing_tables = []
             
@@ -0,0 +1,66 @@
+"""
+Gunicorn settings for the Habit Tracker API.
+
+Pick a worker profile with GUNICORN_PROFILE:
+
+  sync     - one request per process; predictable, CPU-bound work (bcrypt)
+  gthread  - GUNICORN_THREADS threads per process; cheap concurrency for
+             the short DB-bound requests that make up most traffic
+  gevent   - cooperative greenlets (requires `pip install gevent`); best when
+             requests mostly wait on MySQL or SMTP
+
+See DEPLOYMENT.md for measured throughput of each profile.
+"""
+import multiprocessing
+import os
+
+PROFILES = {
+    'sync': {'worker_class': 'sync'},
+    'gthread': {'worker_class': 'gthread', 'threads': int(os.getenv('GUNICORN_THREADS', 8))},
+    'gevent': {'worker_class': 'gevent', 'worker_connections': int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))},
+}
+
+profile = os.getenv('GUNICORN_PROFILE', 'gthread')
+if profile not in PROFILES:
+    raise ValueError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}")
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = PROFILES[profile]['worker_class']
+threads = PROFILES[profile].get('threads', 1)
+worker_connections = PROFILES[profile].get('worker_connections', 1000)
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Engines created in the master during preload must not share sockets
+    # with the workers
+    from wsgi import app, reset_after_fork
+    from services.cache import response_cache
+    from services.jobs import job_runner
+    reset_after_fork(app)
+    # The memory cache is per process: other workers would keep serving data this one changed
+    if response_cache.require_shared_backend(server.cfg.workers) and worker.age <= server.cfg.workers:
+        server.log.warning("Response cache disabled: CACHE_BACKEND=memory is not shared between "
+                           "workers; set CACHE_BACKEND=sqlite (and CACHE_STORAGE_PATH) to enable it")
+    # Threads do not survive the fork, so job workers start here (JOBS_WORKER_THREADS)
+    job_runner.start(app)
+    server.log.info(f"Worker {worker.pid} ready ({profile} profile)")
+
+
+def worker_exit(server, worker):
+    # Write buffered last_login updates before the worker goes away
+    from services.write_behind import write_behind
+    write_behind.stop()
@@ -0,0 +1,24 @@
+from config.database import db
+from datetime import datetime
+
+class AchievementAwarded(db.Model):
+    """One row per achievement a user has earned; makes awarding idempotent"""
+    __tablename__ = 'achievements_awarded'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'rule_key', 'subject_key', name='uq_achievements_awarded_subject'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    rule_key = db.Column(db.String(50), nullable=False)
+    subject_key = db.Column(db.String(100), nullable=False)  # e.g. habit:12:2024-05-01 or level:3
+    awarded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'rule_key': self.rule_key,
+            'subject_key': self.subject_key,
+            'awarded_at': self.awarded_at.isoformat()
+        }
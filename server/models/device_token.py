@@ -0,0 +1,26 @@
+from config.database import db
+from datetime import datetime
+
+class DeviceToken(db.Model):
+    """A device registered for push notifications; users may have several"""
+    __tablename__ = 'device_tokens'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'token', name='uq_device_tokens_user_token'),
+        db.Index('ix_device_tokens_token', 'token'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    token = db.Column(db.String(255), nullable=False)  # issued by the provider to the app install
+    platform = db.Column(db.String(20), nullable=False, default='android')  # android, ios, web
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)  # last registration
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'platform': self.platform,
+            'token': self.token,
+            'created_at': self.created_at.isoformat(),
+            'last_seen_at': self.last_seen_at.isoformat()
+        }
@@ -1,4 +1,5 @@
-from config.database import db
+from flask import current_app
+from config.database import db, commit_without_expire
 from datetime import datetime, timedelta
 
 class Habit(db.Model):
@@ -15,9 +16,14 @@ class Habit(db.Model):
     longest_streak = db.Column(db.Integer, default=0)
     last_completed = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
+    deleted_at = db.Column(db.DateTime, index=True)  # soft delete; purged by services.habit_purge
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # optimistic lock, see services.versioning
+    
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationships
     completions = db.relationship('HabitCompletion', backref='habit', lazy=True, cascade='all, delete-orphan')
+    completion_bitmaps = db.relationship('HabitCompletionBitmap', lazy=True, cascade='all, delete-orphan')
     
     def complete(self):
         """Mark the habit as completed for today"""
@@ -31,6 +37,11 @@ class Habit(db.Model):
         completion = HabitCompletion(habit_id=self.id, completed_at=datetime.utcnow())
         db.session.add(completion)
         
+        # Keep the compact per-year bitmap in sync when it is enabled
+        if current_app.config.get('COMPLETION_BITMAPS_ENABLED'):
+            from services.completion_bitmap import mark_completed
+            mark_completed(self.id, completion.completed_at.date())
+        
         # Update streak
         if self.last_completed:
             yesterday = (datetime.utcnow() - timedelta(days=1)).date()
@@ -46,7 +57,7 @@ class Habit(db.Model):
             self.longest_streak = self.current_streak
         
         self.last_completed = datetime.utcnow()
-        db.session.commit()
+        commit_without_expire()
         return True
     
     def to_dict(self):
@@ -61,7 +72,8 @@ class Habit(db.Model):
             'current_streak': self.current_streak,
             'longest_streak': self.longest_streak,
             'last_completed': self.last_completed.isoformat() if self.last_completed else None,
-            'is_active': self.is_active
+            'is_active': self.is_active,
+            'version': self.version
         }
 
 class HabitCompletion(db.Model):
@@ -76,4 +88,12 @@ class HabitCompletion(db.Model):
             'id': self.id,
             'habit_id': self.habit_id,
             'completed_at': self.completed_at.isoformat()
-        } 
\ No newline at end of file
+        }
+
+class HabitCompletionBitmap(db.Model):
+    """One bit per day of the year for a habit, mirroring habit_completions"""
+    __tablename__ = 'habit_completion_bitmaps'
+    
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    days = db.Column(db.LargeBinary(46), nullable=False)  # 366 bits, bit 0 = January 1st
@@ -0,0 +1,43 @@
+from config.database import db
+from datetime import datetime
+
+class Job(db.Model):
+    """A unit of deferred or scheduled work, run by services.jobs workers"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_ready', 'status', 'run_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, index=True)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    dedupe_key = db.Column(db.String(150), unique=True)  # e.g. points.fold@2025-01-01T03:30
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Float)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'payload': self.payload,
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat()
+        }
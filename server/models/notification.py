@@ -12,7 +12,7 @@ class Notification(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, sent, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     sent_at = db.Column(db.DateTime)
-    read_at = db.Column(db.DateTime)
+    read_at = db.Column(db.DateTime, index=True)
     
     def mark_as_sent(self):
         self.status = 'sent'
@@ -20,8 +20,17 @@ class Notification(db.Model):
         db.session.commit()
     
     def mark_as_read(self):
-        self.read_at = datetime.utcnow()
+        """Set read_at and drop the unread counter in one transaction; returns False if already read"""
+        from services.unread_counter import adjust_unread
+        
+        # Conditional UPDATE: of two concurrent reads only one decrements the counter
+        marked = Notification.query.filter_by(id=self.id, read_at=None).update(
+            {'read_at': datetime.utcnow()}, synchronize_session='fetch'
+        )
+        if marked:
+            adjust_unread(self.user_id, -marked)
         db.session.commit()
+        return bool(marked)
     
     def to_dict(self):
         return {
@@ -34,4 +43,26 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat(),
             'sent_at': self.sent_at.isoformat() if self.sent_at else None,
             'read_at': self.read_at.isoformat() if self.read_at else None
-        } 
\ No newline at end of file
+        }
+
+class NotificationArchive(db.Model):
+    """Read notifications moved out of the live table by the retention job"""
+    __tablename__ = 'notifications_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    title = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    read_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class NotificationCounter(db.Model):
+    """Unread notifications per user, kept in step with notifications.read_at"""
+    __tablename__ = 'notification_counters'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    unread = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,26 @@
+from config.database import db
+from datetime import datetime
+
+class PointsLedgerEntry(db.Model):
+    """Append-only record of every points award; folded into users.points periodically"""
+    __tablename__ = 'points_ledger'
+    __table_args__ = (
+        db.Index('ix_points_ledger_user_id_id', 'user_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(50), nullable=False)  # habit_completed, ...
+    habit_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'delta': self.delta,
+            'reason': self.reason,
+            'habit_id': self.habit_id,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,19 @@
+from config.database import db
+from datetime import datetime
+
+class ShardAssignment(db.Model):
+    """Which shard holds a user's habits, todos, notifications and points"""
+    __tablename__ = 'shard_assignments'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    shard = db.Column(db.Integer, nullable=False, index=True)
+    state = db.Column(db.String(10), nullable=False, default='active')  # active, moving
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'shard': self.shard,
+            'state': self.state,
+            'updated_at': self.updated_at.isoformat()
+        }
@@ -12,6 +12,9 @@ class Todo(db.Model):
     completed = db.Column(db.Boolean, default=False, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # optimistic lock, see services.versioning
+    
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationship with User
     user = relationship("User", back_populates="todos")
@@ -23,5 +26,6 @@ class Todo(db.Model):
             'text': self.text,
             'completed': self.completed,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'version': self.version
         } 
\ No newline at end of file
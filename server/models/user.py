@@ -11,12 +11,17 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
-    points = db.Column(db.Integer, default=0)
+    points = db.Column(db.Integer, default=0, index=True)
     level = db.Column(db.Integer, default=1)
+    points_ledger_id = db.Column(db.Integer, default=0, nullable=False)  # last ledger entry folded into points
     notification_preferences = db.Column(db.JSON, default={
         'email': True,
-        'push': True
+        'push': True,
+        'reminder_mode': 'digest'  # digest: one reminder for all due habits, individual: one per habit
     })
+    version = db.Column(db.Integer, nullable=False, server_default='1')  # optimistic lock, see services.versioning
+    
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationships
     habits = db.relationship('Habit', backref='user', lazy=True)
@@ -33,14 +38,27 @@ class User(db.Model):
         stored_hash = self.password_hash.encode('utf-8') if isinstance(self.password_hash, str) else self.password_hash
         return bcrypt.checkpw(password.encode('utf-8'), stored_hash)
     
+    def current_points(self):
+        """Folded points plus ledger entries that have not been folded yet"""
+        from services.points_ledger import pending_points
+        return (self.points or 0) + pending_points(self.id, self.points_ledger_id)
+    
+    def current_level(self, points=None):
+        from services.points_ledger import level_for_points
+        if points is None:
+            points = self.current_points()
+        return max(self.level or 1, level_for_points(points))
+    
     def to_dict(self):
+        points = self.current_points()
         return {
             'id': self.id,
             'email': self.email,
             'username': self.username,
-            'points': self.points,
-            'level': self.level,
+            'points': points,
+            'level': self.current_level(points),
             'created_at': self.created_at.isoformat(),
             'last_login': self.last_login.isoformat() if self.last_login else None,
-            'notification_preferences': self.notification_preferences
+            'notification_preferences': self.notification_preferences,
+            'version': self.version
         } 
\ No newline at end of file
@@ -0,0 +1,91 @@
+from flask import Blueprint, Response, request, jsonify, send_file
+from models.job import Job
+from services.admin import admin_required
+from services.jobs import job_runner, job_stats
+from services.profiler import request_profiler
+from services.push import push_service
+from services.slow_query_log import slow_query_log
+from services.write_behind import write_behind
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    """Most recent slow statements, newest first"""
+    limit = request.args.get('limit', type=int)
+    
+    return jsonify({
+        'enabled': slow_query_log.enabled,
+        'threshold_ms': round(slow_query_log.threshold * 1000, 2),
+        'slow_queries': slow_query_log.recent(limit)
+    }), 200
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+@admin_required
+def clear_slow_queries():
+    slow_query_log.clear()
+    return jsonify({'message': 'Slow query log cleared'}), 200
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def list_request_profiles():
+    """Stored request profiles (X-Profile), newest first"""
+    limit = request.args.get('limit', 20, type=int)
+    
+    return jsonify({
+        'enabled': request_profiler.enabled,
+        'profiles': request_profiler.recent(limit)
+    }), 200
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def get_request_profile(profile_id):
+    """One profile as JSON, as collapsed stacks (format=collapsed) or as a pstats dump (format=pstats)"""
+    output = request.args.get('format', 'json')
+    
+    if output == 'pstats':
+        path = request_profiler.path(profile_id, '.prof')
+        if path is None:
+            return jsonify({'error': 'No pstats dump for this profile'}), 404
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+    
+    profile = request_profiler.load(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if output == 'collapsed':
+        return Response(profile['collapsed'] + '\n', mimetype='text/plain')
+    return jsonify(profile), 200
+
+@admin_bp.route('/jobs', methods=['GET'])
+@admin_required
+def get_job_stats():
+    """Per-job counts and timings, with the most recent failures"""
+    failed = Job.query.filter_by(status='failed').order_by(Job.finished_at.desc()).limit(20).all()
+    
+    return jsonify({
+        'workers_running': job_runner.running,
+        'jobs': job_stats(),
+        'recent_failures': [job.to_dict() for job in failed]
+    }), 200
+
+@admin_bp.route('/write-behind', methods=['GET'])
+@admin_required
+def get_write_behind_stats():
+    """Buffered last_login updates of the worker that serves this request"""
+    return jsonify({
+        'enabled': write_behind.enabled,
+        'pending': write_behind.pending(),
+        'stats': write_behind.stats
+    }), 200
+
+@admin_bp.route('/push', methods=['GET'])
+@admin_required
+def get_push_stats():
+    """Push deliveries made by the worker that serves this request"""
+    return jsonify({
+        'provider': push_service.app.config.get('PUSH_PROVIDER'),
+        'enabled': push_service.enabled,
+        'stats': push_service.stats
+    }), 200
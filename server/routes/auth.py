@@ -2,12 +2,22 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models.user import User
 from config.database import db
+from services.leaderboard import leaderboard
+from services.rate_limit import rate_limit
+from services.db_routing import read_only
+from services.cache import cached
+from services.sharding import shard_map
+from services.versioning import check_if_match, stale_conflict, tagged
+from services.write_behind import write_behind
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit(ip='10/hour')
 def register():
     data = request.get_json()
     
@@ -101,6 +111,7 @@ def register():
         
         db.session.add(user)
         db.session.commit()
+        leaderboard.update(user.id, user.current_points())
         
         # Create access token
         access_token = create_access_token(identity=user.id)
@@ -124,6 +135,7 @@ def register():
         }), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit(ip='30/minute', account='10/minute')
 def login():
     data = request.get_json()
     
@@ -174,9 +186,13 @@ def login():
         }), 401
     
     try:
-        # Update last login
-        user.last_login = datetime.utcnow()
-        db.session.commit()
+        # Update last login.  It is bookkeeping rather than profile data: the
+        # write-behind buffer batches it with other logins (no commit here)
+        # and skips the version check, so logins on two devices never
+        # conflict with each other or change the ETag of a profile edit.
+        last_login = datetime.utcnow()
+        write_behind.record('last_login', user.id, last_login, user_id=user.id)
+        set_committed_value(user, 'last_login', last_login)
         
         # Create access token
         access_token = create_access_token(identity=user.id)
@@ -201,6 +217,8 @@ def login():
 
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
+@cached()
+@read_only
 def get_profile():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -208,10 +226,30 @@ def get_profile():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    return jsonify(user.to_dict()), 200
+    return tagged(user.to_dict(), user)
+
+@auth_bp.route('/points/history', methods=['GET'])
+@jwt_required()
+@read_only
+def get_points_history():
+    from models.points_ledger import PointsLedgerEntry
+    
+    user_id = get_jwt_identity()
+    limit = min(request.args.get('limit', 50, type=int), 200)
+    before_id = request.args.get('before_id', type=int)
+    
+    query = PointsLedgerEntry.query.filter_by(user_id=user_id)
+    if before_id:
+        query = query.filter(PointsLedgerEntry.id < before_id)
+    entries = query.order_by(PointsLedgerEntry.id.desc()).limit(limit).all()
+    
+    return jsonify({
+        'entries': [entry.to_dict() for entry in entries]
+    }), 200
 
 @auth_bp.route('/profile', methods=['PUT'])
 @jwt_required()
+@rate_limit(account='30/minute')
 def update_profile():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -219,6 +257,10 @@ def update_profile():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
+    conflict = check_if_match(user)
+    if conflict:
+        return conflict
+    
     data = request.get_json()
     
     # Update allowed fields
@@ -242,10 +284,12 @@ def update_profile():
     
     try:
         db.session.commit()
-        return jsonify({
+        return tagged({
             'message': 'Profile updated successfully',
             'user': user.to_dict()
-        }), 200
+        }, user)
+    except StaleDataError:
+        return stale_conflict(User, user_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -262,8 +306,12 @@ def delete_account():
     try:
         # Delete all user's habits and related data
         from models.habit import Habit
-        from models.notification import Notification
+        from models.notification import Notification, NotificationArchive, NotificationCounter
         from models.todo import Todo
+        from models.points_ledger import PointsLedgerEntry
+        from models.achievement import AchievementAwarded
+        from models.device_token import DeviceToken
+        from models.shard import ShardAssignment
         
         # Delete habits using ORM to trigger cascade behavior for habit_completions
         user_habits = Habit.query.filter_by(user_id=user_id).all()
@@ -272,13 +320,27 @@ def delete_account():
         
         # Delete user's notifications
         Notification.query.filter_by(user_id=user_id).delete()
+        NotificationArchive.query.filter_by(user_id=user_id).delete()
+        NotificationCounter.query.filter_by(user_id=user_id).delete()
         
         # Delete user's todos
         Todo.query.filter_by(user_id=user_id).delete()
         
+        # Delete user's points history
+        PointsLedgerEntry.query.filter_by(user_id=user_id).delete()
+        AchievementAwarded.query.filter_by(user_id=user_id).delete()
+        
+        # Stop pushing to the user's devices
+        DeviceToken.query.filter_by(user_id=user_id).delete()
+        
+        # Forget which shard held the user's data
+        ShardAssignment.query.filter_by(user_id=user_id).delete()
+        
         # Delete the user
         db.session.delete(user)
         db.session.commit()
+        leaderboard.remove(user_id)
+        shard_map.forget(user_id)
         
         return jsonify({
             'message': 'Account deleted successfully'
@@ -0,0 +1,235 @@
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select, insert
+from models.user import User
+from models.habit import Habit, HabitCompletion
+from models.todo import Todo
+from models.notification import Notification
+from config.database import db
+from services.db_routing import read_only
+from services.rate_limit import rate_limit
+from services.cache import response_cache
+from services.unread_counter import adjust_unread
+from datetime import datetime, date, time
+import csv
+import io
+import json
+
+export_bp = Blueprint('export', __name__)
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+
+# Record type -> (table, columns written on import)
+ENTITIES = {
+    'habit': (Habit.__table__, [
+        'title', 'description', 'frequency', 'reminder_time', 'created_at',
+        'current_streak', 'longest_streak', 'last_completed', 'is_active'
+    ]),
+    'habit_completion': (HabitCompletion.__table__, ['habit_id', 'completed_at']),
+    'todo': (Todo.__table__, ['text', 'completed', 'created_at', 'updated_at']),
+    'notification': (Notification.__table__, [
+        'title', 'message', 'type', 'status', 'created_at', 'sent_at', 'read_at'
+    ]),
+}
+
+def to_json_value(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+def entity_query(entity, user_id):
+    """Select every row of one record type that belongs to the user"""
+    table = ENTITIES[entity][0]
+    habits = Habit.__table__
+    if entity == 'habit_completion':
+        return select(table).join(habits, habits.c.id == table.c.habit_id).where(
+            habits.c.user_id == user_id,
+            habits.c.deleted_at.is_(None)
+        ).order_by(table.c.id)
+    query = select(table).where(table.c.user_id == user_id)
+    if entity == 'habit':
+        # Deleted habits waiting to be purged are not part of the history
+        query = query.where(table.c.deleted_at.is_(None))
+    return query.order_by(table.c.id)
+
+def stream_rows(entity, user_id):
+    """Yield row mappings through a server-side cursor, EXPORT_BATCH_SIZE at a time"""
+    result = db.session.execute(
+        entity_query(entity, user_id),
+        execution_options={'yield_per': EXPORT_BATCH_SIZE}
+    )
+    for row in result.mappings():
+        yield {key: to_json_value(value) for key, value in row.items()}
+
+def generate_ndjson(user):
+    profile = user.to_dict()
+    yield json.dumps({'type': 'user', 'data': profile}) + '\n'
+    for entity in ENTITIES:
+        for row in stream_rows(entity, user.id):
+            yield json.dumps({'type': entity, 'data': row}) + '\n'
+
+def generate_csv(entity, user_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in ENTITIES[entity][0].columns])
+    for row in stream_rows(entity, user_id):
+        writer.writerow(row.values())
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@export_bp.route('/export', methods=['GET'])
+@jwt_required()
+@read_only
+def export_data():
+    """Stream the user's full history as NDJSON, or one record type as CSV"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    export_format = request.args.get('format', 'ndjson')
+    stamp = datetime.utcnow().strftime('%Y%m%d')
+    
+    if export_format == 'ndjson':
+        return Response(
+            stream_with_context(generate_ndjson(user)),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename=stridestreak-{stamp}.ndjson'}
+        )
+    
+    if export_format == 'csv':
+        entity = request.args.get('entity', 'habit')
+        if entity not in ENTITIES:
+            return jsonify({
+                'error': 'Invalid entity',
+                'message': f'entity must be one of: {", ".join(ENTITIES)}'
+            }), 400
+        return Response(
+            stream_with_context(generate_csv(entity, user.id)),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename=stridestreak-{entity}-{stamp}.csv'}
+        )
+    
+    return jsonify({'error': 'Invalid format', 'message': 'format must be ndjson or csv'}), 400
+
+def parse_value(column, value):
+    """Convert an exported JSON value back to the column's Python type"""
+    if value is None:
+        if not column.nullable:
+            raise ValueError(f'{column.name} cannot be null')
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is time:
+        return time.fromisoformat(value)
+    if python_type is bool:
+        # bool('false') is True, so only JSON booleans are accepted
+        if not isinstance(value, bool):
+            raise ValueError(f'{column.name} must be true or false, not {value!r}')
+        return value
+    return value
+
+def import_row(entity, data, user_id, habit_ids):
+    table, columns = ENTITIES[entity]
+    row = {name: parse_value(table.c[name], data.get(name)) for name in columns if name in data}
+    if entity == 'habit_completion':
+        row['habit_id'] = habit_ids.get(data.get('habit_id'))
+        return row if row['habit_id'] is not None and row.get('completed_at') else None
+    row['user_id'] = user_id
+    return row
+
+@export_bp.route('/import', methods=['POST'])
+@jwt_required()
+@rate_limit(account='5/hour')
+def import_data():
+    """Bulk import an NDJSON export into the current account"""
+    user_id = get_jwt_identity()
+    
+    # Old habit id -> new habit id, so completions follow their habit
+    habit_ids = {}
+    pending = {entity: [] for entity in ENTITIES if entity != 'habit'}
+    counts = {entity: 0 for entity in ENTITIES}
+    skipped = 0
+    unread = 0
+    
+    def flush(entity):
+        nonlocal unread
+        rows = pending[entity]
+        if rows:
+            db.session.execute(insert(ENTITIES[entity][0]), rows)
+            counts[entity] += len(rows)
+            if entity == 'notification':
+                unread += sum(1 for row in rows if row.get('read_at') is None)
+            pending[entity] = []
+    
+    try:
+        for line_number, raw in enumerate(iter(request.stream.readline, b''), start=1):
+            if not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+                entity, data = record['type'], record['data']
+            except (ValueError, KeyError, TypeError):
+                db.session.rollback()
+                return jsonify({
+                    'error': 'Invalid import file',
+                    'message': f'Line {line_number} is not a valid export record'
+                }), 400
+            
+            if entity == 'user':
+                # Profile data stays with the account being imported into
+                continue
+            if entity not in ENTITIES:
+                skipped += 1
+                continue
+            
+            try:
+                row = import_row(entity, data, user_id, habit_ids)
+            except (ValueError, TypeError, AttributeError) as e:
+                db.session.rollback()
+                return jsonify({
+                    'error': 'Invalid import file',
+                    'message': f'Line {line_number}: {e}'
+                }), 400
+            if row is None:
+                skipped += 1
+            elif entity == 'habit':
+                # Habits are inserted one by one: their new ids are needed
+                # to remap the completions that follow them
+                result = db.session.execute(insert(Habit.__table__).values(**row))
+                habit_ids[data.get('id')] = result.inserted_primary_key[0]
+                counts['habit'] += 1
+            else:
+                pending[entity].append(row)
+                if len(pending[entity]) >= IMPORT_BATCH_SIZE:
+                    flush(entity)
+        
+        for entity in pending:
+            flush(entity)
+        if unread:
+            # Bulk inserts skip the counter behind the unread badge
+            adjust_unread(user_id, unread)
+        db.session.commit()
+        
+        # Bulk inserts bypass the ORM events that invalidate cached responses
+        response_cache.invalidate_user(user_id)
+        
+        if current_app.config.get('COMPLETION_BITMAPS_ENABLED'):
+            from services.completion_bitmap import rebuild_bitmaps
+            for habit_id in habit_ids.values():
+                rebuild_bitmaps(habit_id)
+        
+        return jsonify({
+            'message': 'Import completed successfully',
+            'imported': counts,
+            'skipped': skipped
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Import failed', 'message': str(e)}), 500
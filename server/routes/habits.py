@@ -1,14 +1,25 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.habit import Habit, HabitCompletion
 from models.user import User
-from config.database import db
-from datetime import datetime, timedelta
+from config.database import db, commit_without_expire
+from services.leaderboard import leaderboard
+from services.points_ledger import award_points
+from services import achievements as achievement_engine
+from services.rate_limit import rate_limit
+from services.completion_bitmap import load_years, completed_days, completions_between
+from services.db_routing import read_only
+from services.cache import cached
+from services.habit_analytics import compute_analytics, completion_timestamps
+from services.versioning import check_if_match, stale_conflict, tagged
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime, timedelta, date
 
 habits_bp = Blueprint('habits', __name__)
 
 @habits_bp.route('', methods=['POST'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def create_habit():
     user_id = get_jwt_identity()
     data = request.get_json()
@@ -42,7 +53,7 @@ def create_habit():
     
     try:
         db.session.add(habit)
-        db.session.commit()
+        commit_without_expire()
         return jsonify({
             'message': 'Habit created successfully',
             'habit': habit.to_dict()
@@ -53,9 +64,11 @@ def create_habit():
 
 @habits_bp.route('', methods=['GET'])
 @jwt_required()
+@cached()
+@read_only
 def get_habits():
     user_id = get_jwt_identity()
-    habits = Habit.query.filter_by(user_id=user_id).all()
+    habits = Habit.query.filter_by(user_id=user_id, deleted_at=None).all()
     
     return jsonify({
         'habits': [habit.to_dict() for habit in habits]
@@ -63,24 +76,31 @@ def get_habits():
 
 @habits_bp.route('/<int:habit_id>', methods=['GET'])
 @jwt_required()
+@cached()
+@read_only
 def get_habit(habit_id):
     user_id = get_jwt_identity()
-    habit = Habit.query.filter_by(id=habit_id, user_id=user_id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id, deleted_at=None).first()
     
     if not habit:
         return jsonify({'error': 'Habit not found'}), 404
     
-    return jsonify(habit.to_dict()), 200
+    return tagged(habit.to_dict(), habit)
 
 @habits_bp.route('/<int:habit_id>', methods=['PUT'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def update_habit(habit_id):
     user_id = get_jwt_identity()
-    habit = Habit.query.filter_by(id=habit_id, user_id=user_id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id, deleted_at=None).first()
     
     if not habit:
         return jsonify({'error': 'Habit not found'}), 404
     
+    conflict = check_if_match(habit)
+    if conflict:
+        return conflict
+    
     data = request.get_json()
     
     # Update allowed fields
@@ -107,41 +127,78 @@ def update_habit(habit_id):
         habit.is_active = data['is_active']
     
     try:
-        db.session.commit()
-        return jsonify({
+        commit_without_expire()
+        return tagged({
             'message': 'Habit updated successfully',
             'habit': habit.to_dict()
-        }), 200
+        }, habit)
+    except StaleDataError:
+        return stale_conflict(Habit, habit_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @habits_bp.route('/<int:habit_id>', methods=['DELETE'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def delete_habit(habit_id):
     user_id = get_jwt_identity()
-    habit = Habit.query.filter_by(id=habit_id, user_id=user_id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id, deleted_at=None).first()
     
     if not habit:
         return jsonify({'error': 'Habit not found'}), 404
     
     try:
-        # First delete all related habit completions
-        HabitCompletion.query.filter_by(habit_id=habit_id).delete()
-        
-        # Then delete the habit
-        db.session.delete(habit)
+        # Soft delete: the habit disappears at once and its completions are
+        # removed later, in small batches, by services.habit_purge
+        habit.deleted_at = datetime.utcnow()
         db.session.commit()
-        return jsonify({'message': 'Habit deleted successfully'}), 200
+        undo_until = habit.deleted_at + timedelta(hours=current_app.config['HABIT_UNDO_WINDOW_HOURS'])
+        return jsonify({
+            'message': 'Habit deleted successfully',
+            'undo_until': undo_until.isoformat()
+        }), 200
+    except StaleDataError:
+        return stale_conflict(Habit, habit_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@habits_bp.route('/<int:habit_id>/restore', methods=['POST'])
+@jwt_required()
+@rate_limit(account='120/minute')
+def restore_habit(habit_id):
+    """Undo a delete while the habit is still inside the undo window"""
+    user_id = get_jwt_identity()
+    habit = Habit.query.filter(
+        Habit.id == habit_id,
+        Habit.user_id == user_id,
+        Habit.deleted_at.isnot(None)
+    ).first()
+    
+    undo_window = timedelta(hours=current_app.config['HABIT_UNDO_WINDOW_HOURS'])
+    if not habit or habit.deleted_at < datetime.utcnow() - undo_window:
+        return jsonify({'error': 'Habit not found or can no longer be restored'}), 404
+    
+    try:
+        habit.deleted_at = None
+        commit_without_expire()
+        return tagged({
+            'message': 'Habit restored successfully',
+            'habit': habit.to_dict()
+        }, habit)
+    except StaleDataError:
+        return stale_conflict(Habit, habit_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @habits_bp.route('/<int:habit_id>/complete', methods=['POST'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def complete_habit(habit_id):
     user_id = get_jwt_identity()
-    habit = Habit.query.filter_by(id=habit_id, user_id=user_id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id, deleted_at=None).first()
     
     if not habit:
         return jsonify({'error': 'Habit not found'}), 404
@@ -149,25 +206,33 @@ def complete_habit(habit_id):
     if not habit.is_active:
         return jsonify({'error': 'Habit is not active'}), 400
     
-    if habit.complete():
-        # Award points based on streak
-        user = User.query.get(user_id)
+    try:
+        completed = habit.complete()
+    except StaleDataError:
+        # A concurrent request (often a double tap) updated the habit first
+        return stale_conflict(Habit, habit_id)
+    
+    if completed:
+        # Award points based on streak; the ledger is folded into users.points later
         points_earned = min(habit.current_streak * 10, 100)  # Cap at 100 points
-        user.points += points_earned
-        
-        # Level up if enough points
-        new_level = (user.points // 1000) + 1
-        if new_level > user.level:
-            user.level = new_level
+        award_points(user_id, points_earned, 'habit_completed', habit_id=habit.id)
         
         try:
-            db.session.commit()
+            commit_without_expire()
+            user = User.query.get(user_id)
+            total_points = user.current_points()
+            leaderboard.update(user.id, total_points)
+            
+            # Award any achievements this completion unlocked
+            achievements = achievement_engine.habit_completed(user_id, habit, total_points)
+            
             return jsonify({
                 'message': 'Habit completed successfully',
                 'habit': habit.to_dict(),
                 'points_earned': points_earned,
-                'total_points': user.points,
-                'level': user.level
+                'total_points': total_points,
+                'level': user.current_level(total_points),
+                'achievements': [{'title': a['title'], 'message': a['message']} for a in achievements]
             }), 200
         except Exception as e:
             db.session.rollback()
@@ -175,11 +240,66 @@ def complete_habit(habit_id):
     else:
         return jsonify({'error': 'Habit already completed today'}), 400
 
+@habits_bp.route('/<int:habit_id>/calendar', methods=['GET'])
+@jwt_required()
+@cached()
+@read_only
+def get_habit_calendar(habit_id):
+    user_id = get_jwt_identity()
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id, deleted_at=None).first()
+    
+    if not habit:
+        return jsonify({'error': 'Habit not found'}), 404
+    
+    year = request.args.get('year', datetime.utcnow().year, type=int)
+    if year < 1 or year > 9998:
+        return jsonify({'error': 'Invalid year'}), 400
+    
+    if current_app.config.get('COMPLETION_BITMAPS_ENABLED'):
+        bits = load_years([habit.id], [year]).get((habit.id, year), 0)
+        days = completed_days(bits, year)
+    else:
+        rows = HabitCompletion.query.with_entities(HabitCompletion.completed_at).filter(
+            HabitCompletion.habit_id == habit.id,
+            HabitCompletion.completed_at >= date(year, 1, 1),
+            HabitCompletion.completed_at < date(year + 1, 1, 1)
+        ).all()
+        days = sorted({row.completed_at.date() for row in rows})
+    
+    return jsonify({
+        'habit_id': habit.id,
+        'year': year,
+        'completed_days': [day.isoformat() for day in days],
+        'total_completed': len(days)
+    }), 200
+
+@habits_bp.route('/<int:habit_id>/analytics', methods=['GET'])
+@jwt_required()
+@cached()
+@read_only
+def get_habit_analytics(habit_id):
+    user_id = get_jwt_identity()
+    habit = Habit.query.filter_by(id=habit_id, user_id=user_id, deleted_at=None).first()
+    
+    if not habit:
+        return jsonify({'error': 'Habit not found'}), 404
+    
+    analytics = compute_analytics(
+        completion_timestamps(habit.id),
+        datetime.utcnow().date(),
+        start=habit.created_at.date() if habit.created_at else None
+    )
+    analytics['habit_id'] = habit.id
+    
+    return jsonify(analytics), 200
+
 @habits_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@cached()
+@read_only
 def get_habits_stats():
     user_id = get_jwt_identity()
-    habits = Habit.query.filter_by(user_id=user_id).all()
+    habits = Habit.query.filter_by(user_id=user_id, deleted_at=None).all()
     
     total_habits = len(habits)
     active_habits = len([h for h in habits if h.is_active])
@@ -187,11 +307,16 @@ def get_habits_stats():
     longest_streak = max((h.longest_streak for h in habits), default=0)
     
     # Get completion rate for the last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    completions = HabitCompletion.query.join(Habit).filter(
-        Habit.user_id == user_id,
-        HabitCompletion.completed_at >= thirty_days_ago
-    ).count()
+    if current_app.config.get('COMPLETION_BITMAPS_ENABLED'):
+        today = datetime.utcnow().date()
+        completions = sum(completions_between([h.id for h in habits], today - timedelta(days=29), today).values())
+    else:
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        completions = HabitCompletion.query.join(Habit).filter(
+            Habit.user_id == user_id,
+            Habit.deleted_at.is_(None),
+            HabitCompletion.completed_at >= thirty_days_ago
+        ).count()
     
     total_possible_completions = sum(
         30 if h.frequency == 'daily' else
@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.user import User
+from services.leaderboard import leaderboard
+from services.points_ledger import level_for_points
+from services.db_routing import read_only
+
+leaderboard_bp = Blueprint('leaderboard', __name__)
+
+MAX_LIMIT = 100
+
+def serialize_entries(entries):
+    """Attach usernames to (rank, user_id, points) entries with a single query"""
+    user_ids = [user_id for _, user_id, _ in entries]
+    usernames = {}
+    if user_ids:
+        rows = User.query.with_entities(User.id, User.username).filter(User.id.in_(user_ids)).all()
+        usernames = {row.id: row.username for row in rows}
+    
+    return [{
+        'rank': rank,
+        'user_id': user_id,
+        'username': usernames.get(user_id),
+        'points': points,
+        'level': level_for_points(points)
+    } for rank, user_id, points in entries]
+
+@leaderboard_bp.route('', methods=['GET'])
+@jwt_required()
+@read_only
+def get_leaderboard():
+    limit = min(request.args.get('limit', 10, type=int), MAX_LIMIT)
+    leaderboard.refresh_if_stale()
+    
+    return jsonify({
+        'leaderboard': serialize_entries(leaderboard.top(max(limit, 0))),
+        'total_users': len(leaderboard)
+    }), 200
+
+@leaderboard_bp.route('/me', methods=['GET'])
+@jwt_required()
+@read_only
+def get_my_rank():
+    user_id = get_jwt_identity()
+    leaderboard.refresh_if_stale()
+    rank = leaderboard.rank(user_id)
+    
+    if rank is None:
+        return jsonify({'error': 'User not ranked'}), 404
+    
+    return jsonify({
+        'rank': rank,
+        'points': leaderboard.points(user_id),
+        'total_users': len(leaderboard)
+    }), 200
+
+@leaderboard_bp.route('/around', methods=['GET'])
+@jwt_required()
+@read_only
+def get_around_me():
+    user_id = get_jwt_identity()
+    radius = min(request.args.get('radius', 5, type=int), MAX_LIMIT)
+    leaderboard.refresh_if_stale()
+    
+    entries = leaderboard.around(user_id, max(radius, 0))
+    if not entries:
+        return jsonify({'error': 'User not ranked'}), 404
+    
+    return jsonify({
+        'leaderboard': serialize_entries(entries),
+        'total_users': len(leaderboard)
+    }), 200
@@ -1,9 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify, render_template
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.notification import Notification
 from models.user import User
 from models.habit import Habit
+from models.device_token import DeviceToken
 from config.database import db, mail
+from services.db_routing import read_only
+from services import achievements as achievement_engine
+from services.cache import response_cache
+from services.push import push_service
+from services.sharding import on_shard, shard_indexes
+from services.unread_counter import adjust_unread, unread_count
 from flask_mail import Message
 from datetime import datetime, timedelta
 import os
@@ -12,6 +19,7 @@ notifications_bp = Blueprint('notifications', __name__)
 
 @notifications_bp.route('', methods=['GET'])
 @jwt_required()
+@read_only
 def get_notifications():
     user_id = get_jwt_identity()
     notifications = Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).all()
@@ -20,6 +28,14 @@ def get_notifications():
         'notifications': [notification.to_dict() for notification in notifications]
     }), 200
 
+@notifications_bp.route('/unread-count', methods=['GET'])
+@jwt_required()
+@read_only
+def get_unread_count():
+    """Unread notifications for the navigation badge, from the per-user counter"""
+    user_id = get_jwt_identity()
+    return jsonify({'unread': unread_count(user_id)}), 200
+
 @notifications_bp.route('/<int:notification_id>/read', methods=['POST'])
 @jwt_required()
 def mark_notification_read(notification_id):
@@ -29,25 +45,131 @@ def mark_notification_read(notification_id):
     if not notification:
         return jsonify({'error': 'Notification not found'}), 404
     
-    notification.mark_as_read()
+    try:
+        if notification.mark_as_read():
+            # Bulk updates skip the ORM hooks that invalidate cached responses
+            response_cache.invalidate_user(user_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
     return jsonify({'message': 'Notification marked as read'}), 200
 
 @notifications_bp.route('/read-all', methods=['POST'])
 @jwt_required()
 def mark_all_notifications_read():
     user_id = get_jwt_identity()
-    notifications = Notification.query.filter_by(user_id=user_id, read_at=None).all()
     
-    for notification in notifications:
-        notification.mark_as_read()
+    try:
+        # One UPDATE for every unread row, with the counter in the same transaction
+        marked = Notification.query.filter_by(user_id=user_id, read_at=None).update(
+            {'read_at': datetime.utcnow()}, synchronize_session=False
+        )
+        adjust_unread(user_id, -marked)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    # Bulk updates skip the ORM hooks that invalidate cached responses
+    response_cache.invalidate_user(user_id)
+    return jsonify({'message': 'All notifications marked as read', 'marked': marked}), 200
+
+@notifications_bp.route('/devices', methods=['GET'])
+@jwt_required()
+@read_only
+def get_devices():
+    user_id = get_jwt_identity()
+    devices = DeviceToken.query.filter_by(user_id=user_id).order_by(DeviceToken.last_seen_at.desc()).all()
     
-    return jsonify({'message': 'All notifications marked as read'}), 200
+    return jsonify({'devices': [device.to_dict() for device in devices]}), 200
+
+@notifications_bp.route('/devices', methods=['POST'])
+@jwt_required()
+def register_device():
+    """Register the push token of an app install; registering it again refreshes it"""
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    token = data.get('token')
+    platform = data.get('platform', 'android')
+    
+    if not isinstance(token, str) or not token.strip() or len(token) > 255:
+        return jsonify({'error': 'A token of at most 255 characters is required'}), 400
+    if platform not in ('android', 'ios', 'web'):
+        return jsonify({'error': 'Platform must be android, ios or web'}), 400
+    token = token.strip()
+    
+    try:
+        # A device that signs in to another account stops receiving the old
+        # account's pushes; that account may live on any shard
+        for shard in shard_indexes():
+            with on_shard(shard):
+                DeviceToken.query.filter(DeviceToken.token == token, DeviceToken.user_id != user_id).delete(
+                    synchronize_session=False
+                )
+        device = DeviceToken.query.filter_by(user_id=user_id, token=token).first()
+        created = device is None
+        if created:
+            device = DeviceToken(user_id=user_id, token=token, platform=platform)
+            db.session.add(device)
+        else:
+            device.platform = platform
+            device.last_seen_at = datetime.utcnow()
+        db.session.flush()
+        
+        # Keep the most recently registered devices
+        limit = current_app.config.get('PUSH_MAX_DEVICES_PER_USER', 10)
+        stale = DeviceToken.query.filter_by(user_id=user_id).order_by(
+            DeviceToken.last_seen_at.desc(), DeviceToken.id.desc()
+        ).offset(limit).all()
+        for old_device in stale:
+            db.session.delete(old_device)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'device': device.to_dict()}), 201 if created else 200
+
+@notifications_bp.route('/devices/<int:device_id>', methods=['DELETE'])
+@jwt_required()
+def unregister_device(device_id):
+    user_id = get_jwt_identity()
+    device = DeviceToken.query.filter_by(id=device_id, user_id=user_id).first()
+    
+    if not device:
+        return jsonify({'error': 'Device not found'}), 404
+    
+    db.session.delete(device)
+    db.session.commit()
+    return jsonify({'message': 'Device unregistered'}), 200
 
 def send_email_notification(user, subject, message):
     """Helper function to send email notifications"""
     if not user.notification_preferences.get('email', True):
         return False
     
+    if current_app.config.get('JOBS_DEFER_EMAIL'):
+        # Sent by a job worker once the caller's transaction commits
+        from services.jobs import enqueue
+        enqueue('email.send', {'user_id': user.id, 'subject': subject, 'message': message})
+        return True
+    return deliver_email(user, subject, message)
+
+def send_push_notification(user, title, message, data=None):
+    """Helper function to send push notifications to the user's devices"""
+    if not push_service.enabled or not user.notification_preferences.get('push', True):
+        return False
+    
+    if current_app.config.get('JOBS_DEFER_PUSH'):
+        # Sent by a job worker once the caller's transaction commits
+        from services.jobs import enqueue
+        enqueue('push.send', {'user_ids': [user.id], 'title': title, 'message': message, 'data': data})
+        return True
+    return push_service.push_to_users([user], title, message, data)['sent'] > 0
+
+def deliver_email(user, subject, message):
+    """Send one e-mail now; returns False if it could not be sent"""
     try:
         msg = Message(
             subject=subject,
@@ -72,15 +194,17 @@ def create_notification(user_id, title, message, notification_type='both'):
     
     try:
         db.session.add(notification)
+        adjust_unread(user_id, 1)
         db.session.commit()
         
-        # Send email if notification type includes email
-        if 'email' in notification_type:
+        if notification_type in ('email', 'push', 'both'):
             user = User.query.get(user_id)
-            send_email_notification(user, title, message)
-        
-        # TODO: Implement push notification sending using Firebase Cloud Messaging
+            if notification_type in ('email', 'both'):
+                send_email_notification(user, title, message)
+            if notification_type in ('push', 'both'):
+                send_push_notification(user, title, message, {'notification_id': notification.id})
         
+        # Also commits jobs queued for deferred delivery
         notification.mark_as_sent()
         return True
     except Exception as e:
@@ -88,11 +212,45 @@ def create_notification(user_id, title, message, notification_type='both'):
         print(f"Error creating notification: {str(e)}")
         return False
 
+def create_digest_notification(user, habits):
+    """Combine all due reminders for a user into one notification, one email and one push"""
+    title = f"Reminder: {len(habits)} habit{'s' if len(habits) != 1 else ''} due today"
+    message = render_template('email/reminder_digest.txt', user=user, habits=habits)
+    notification = Notification(
+        user_id=user.id,
+        title=title,
+        message=message,
+        type='both'
+    )
+    
+    try:
+        db.session.add(notification)
+        send_email_notification(user, title, message)
+        
+        # Single commit (and INSERT) for the row, its sent status and the counter
+        notification.status = 'sent'
+        notification.sent_at = datetime.utcnow()
+        adjust_unread(user.id, 1)
+        db.session.flush()
+        notification_id = notification.id  # read before commit expires the row
+        db.session.commit()
+        
+        # Once committed, so the app finds the notification the push points at
+        send_push_notification(user, title, f"{len(habits)} habit{'s' if len(habits) != 1 else ''} left for today",
+                               {'notification_id': notification_id})
+        db.session.commit()  # a deferred push is queued in this transaction
+        return True
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating reminder digest: {str(e)}")
+        return False
+
 @notifications_bp.route('/reminders', methods=['POST'])
 @jwt_required()
 def send_reminders():
     """Endpoint to send reminders for habits due today"""
     user_id = get_jwt_identity()
+    
     user = User.query.get(user_id)
     
     if not user:
@@ -104,35 +262,50 @@ def send_reminders():
     
     habits = Habit.query.filter_by(
         user_id=user_id,
-        is_active=True
+        is_active=True,
+        deleted_at=None
     ).all()
     
-    reminders_sent = 0
+    due_habits = []
     for habit in habits:
         # Skip if habit was already completed today
         if habit.last_completed and habit.last_completed.date() == today:
             continue
         
         # Check if it's time to send a reminder based on frequency
-        should_remind = False
         if habit.frequency == 'daily':
-            should_remind = True
+            due_habits.append(habit)
         elif habit.frequency == 'weekly' and today.weekday() == 0:  # Monday
-            should_remind = True
+            due_habits.append(habit)
         elif habit.frequency == 'monthly' and today.day == 1:
-            should_remind = True
-        
-        if should_remind:
+            due_habits.append(habit)
+    
+    # Accounts created before the digest have no reminder_mode and keep one
+    # notification per habit; new accounts default to the digest (models.user)
+    preferences = user.notification_preferences or {}
+    reminder_mode = preferences.get('reminder_mode', 'individual')
+    
+    reminders_sent = 0
+    notifications_created = 0
+    if reminder_mode == 'digest':
+        if due_habits and create_digest_notification(user, due_habits):
+            reminders_sent = len(due_habits)
+            notifications_created = 1
+    else:
+        for habit in due_habits:
             # Create reminder notification
             title = f"Reminder: {habit.title}"
             message = f"Don't forget to complete your habit: {habit.title}"
             
             if create_notification(user_id, title, message, 'both'):
                 reminders_sent += 1
+                notifications_created += 1
     
     return jsonify({
         'message': f'Reminders sent successfully',
-        'reminders_sent': reminders_sent
+        'reminders_sent': reminders_sent,
+        'notifications_created': notifications_created,
+        'mode': reminder_mode
     }), 200
 
 @notifications_bp.route('/achievements', methods=['POST'])
@@ -145,44 +318,25 @@ def check_achievements():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    achievements = []
-    
-    # Check level up
-    new_level = (user.points // 1000) + 1
-    if new_level > user.level:
-        user.level = new_level
-        achievements.append({
-            'title': f'Level Up! 🎉',
-            'message': f'Congratulations! You\'ve reached level {new_level}!'
-        })
-    
-    # Check streak achievements
-    habits = Habit.query.filter_by(user_id=user_id).all()
-    for habit in habits:
-        if habit.current_streak == 7:
-            achievements.append({
-                'title': 'Week Streak! 🌟',
-                'message': f'You\'ve maintained {habit.title} for 7 days straight!'
-            })
-        elif habit.current_streak == 30:
-            achievements.append({
-                'title': 'Month Master! 🏆',
-                'message': f'Incredible! You\'ve kept up {habit.title} for 30 days!'
-            })
-    
-    # Send notifications for achievements
-    notifications_sent = 0
-    for achievement in achievements:
-        if create_notification(user_id, achievement['title'], achievement['message'], 'both'):
-            notifications_sent += 1
+    # Only habits completed today can have moved their streak; everything
+    # else was already evaluated when it was completed
+    today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    changed_habits = Habit.query.filter(
+        Habit.user_id == user_id,
+        Habit.deleted_at.is_(None),
+        Habit.last_completed >= today_start
+    ).all()
     
     try:
-        db.session.commit()
+        achievements = achievement_engine.evaluate('points_changed', user_id, points=user.current_points())
+        for habit in changed_habits:
+            achievements += achievement_engine.evaluate('habit_completed', user_id, habit=habit)
+        
         return jsonify({
             'message': 'Achievements checked successfully',
             'achievements_found': len(achievements),
-            'notifications_sent': notifications_sent
+            'notifications_sent': len([a for a in achievements if a['notified']])
         }), 200
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,36 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from services.db_routing import read_only
+from services.search import search
+
+search_bp = Blueprint('search', __name__)
+
+MAX_LIMIT = 50
+MAX_OFFSET = 500
+KINDS = {'all': ('habit', 'todo'), 'habit': ('habit',), 'todo': ('todo',)}
+
+@search_bp.route('/search', methods=['GET'])
+@jwt_required()
+@read_only
+def search_items():
+    """Ranked full-text matches among the user's habits and todos"""
+    user_id = get_jwt_identity()
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'all')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), MAX_LIMIT)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    if not query:
+        return jsonify({'error': 'Search query (q) is required'}), 400
+    if kind not in KINDS:
+        return jsonify({'error': f"type must be one of {', '.join(KINDS)}"}), 400
+    if offset > MAX_OFFSET:
+        return jsonify({'error': f'offset cannot exceed {MAX_OFFSET}; refine the search instead'}), 400
+    
+    results, has_more = search(user_id, query, KINDS[kind], limit=limit, offset=offset)
+    
+    return jsonify({
+        'query': query,
+        'results': results,
+        'next_offset': offset + limit if has_more else None
+    }), 200
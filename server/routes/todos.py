@@ -1,14 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from config.database import db
+from config.database import db, commit_without_expire
 from models.todo import Todo
 from models.user import User
+from services.rate_limit import rate_limit
+from services.db_routing import read_only
+from services.cache import cached
+from services.versioning import check_if_match, stale_conflict, tagged
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
 
 todos_bp = Blueprint('todos', __name__)
 
 @todos_bp.route('/todos', methods=['GET'])
 @jwt_required()
+@read_only
 def get_todos():
     """Get all todos for the current user"""
     try:
@@ -30,6 +36,7 @@ def get_todos():
 
 @todos_bp.route('/todos', methods=['POST'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def create_todo():
     """Create a new todo"""
     try:
@@ -50,7 +57,7 @@ def create_todo():
         )
         
         db.session.add(todo)
-        db.session.commit()
+        commit_without_expire()
         
         return jsonify({
             'success': True,
@@ -67,6 +74,7 @@ def create_todo():
 
 @todos_bp.route('/todos/<int:todo_id>', methods=['PUT'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def update_todo(todo_id):
     """Update a todo"""
     try:
@@ -82,6 +90,10 @@ def update_todo(todo_id):
                 'message': 'Todo not found'
             }), 404
         
+        conflict = check_if_match(todo)
+        if conflict:
+            return conflict
+        
         # Update todo fields
         if 'text' in data:
             if not data['text'].strip():
@@ -95,14 +107,16 @@ def update_todo(todo_id):
             todo.completed = bool(data['completed'])
         
         todo.updated_at = datetime.utcnow()
-        db.session.commit()
+        commit_without_expire()
         
-        return jsonify({
+        return tagged({
             'success': True,
             'message': 'Todo updated successfully',
             'todo': todo.to_dict()
-        }), 200
+        }, todo)
         
+    except StaleDataError:
+        return stale_conflict(Todo, todo_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -112,6 +126,7 @@ def update_todo(todo_id):
 
 @todos_bp.route('/todos/<int:todo_id>', methods=['DELETE'])
 @jwt_required()
+@rate_limit(account='120/minute')
 def delete_todo(todo_id):
     """Delete a todo"""
     try:
@@ -134,6 +149,8 @@ def delete_todo(todo_id):
             'message': 'Todo deleted successfully'
         }), 200
         
+    except StaleDataError:
+        return stale_conflict(Todo, todo_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -143,6 +160,8 @@ def delete_todo(todo_id):
 
 @todos_bp.route('/todos/stats', methods=['GET'])
 @jwt_required()
+@cached()
+@read_only
 def get_todo_stats():
     """Get todo statistics for the current user"""
     try:
@@ -0,0 +1,108 @@
+"""
+Incremental achievement engine.
+
+Achievements are declared in ``RULES``.  Each rule listens to one event
+(``habit_completed`` or ``points_changed``) and is only evaluated against the
+entity that event is about, so awarding costs O(changed habits) rather than a
+scan over every habit.  A rule produces a subject key identifying what it
+fired for (a habit's streak run, a level); ``achievements_awarded`` has a
+unique constraint on (user, rule, subject), so an achievement is never sent
+twice no matter how often it is evaluated.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from config.database import db
+from models.achievement import AchievementAwarded
+from services.points_ledger import level_for_points
+
+AchievementRule = namedtuple('AchievementRule', 'key event condition subject title message')
+
+
+def _streak_subject(habit):
+    # A streak run is identified by the day it started, so a new 7-day run
+    # after a break earns the achievement again
+    started = habit.last_completed.date() - timedelta(days=habit.current_streak - 1)
+    return f'habit:{habit.id}:{started.isoformat()}'
+
+
+RULES = [
+    AchievementRule(
+        key='week_streak',
+        event='habit_completed',
+        condition=lambda ctx: ctx['habit'].current_streak == 7,
+        subject=lambda ctx: _streak_subject(ctx['habit']),
+        title='Week Streak! 🌟',
+        message=lambda ctx: f"You've maintained {ctx['habit'].title} for 7 days straight!"
+    ),
+    AchievementRule(
+        key='month_streak',
+        event='habit_completed',
+        condition=lambda ctx: ctx['habit'].current_streak == 30,
+        subject=lambda ctx: _streak_subject(ctx['habit']),
+        title='Month Master! 🏆',
+        message=lambda ctx: f"Incredible! You've kept up {ctx['habit'].title} for 30 days!"
+    ),
+    AchievementRule(
+        key='level_up',
+        event='points_changed',
+        condition=lambda ctx: level_for_points(ctx['points']) > 1,
+        subject=lambda ctx: f"level:{level_for_points(ctx['points'])}",
+        title='Level Up! 🎉',
+        message=lambda ctx: f"Congratulations! You've reached level {level_for_points(ctx['points'])}!"
+    ),
+]
+
+RULES_BY_EVENT = {}
+for _rule in RULES:
+    RULES_BY_EVENT.setdefault(_rule.event, []).append(_rule)
+
+
+def evaluate(event, user_id, **context):
+    """Check the rules for one event and award anything new.
+
+    Returns the list of achievements awarded by this call.
+    """
+    from routes.notifications import create_notification
+    
+    context['user_id'] = user_id
+    candidates = []
+    for rule in RULES_BY_EVENT.get(event, []):
+        if rule.condition(context):
+            candidates.append((rule, rule.subject(context)))
+    if not candidates:
+        return []
+    
+    already_awarded = {
+        (row.rule_key, row.subject_key)
+        for row in db.session.query(AchievementAwarded.rule_key, AchievementAwarded.subject_key).filter(
+            AchievementAwarded.user_id == user_id,
+            AchievementAwarded.rule_key.in_([rule.key for rule, _ in candidates])
+        )
+    }
+    
+    awarded = []
+    for rule, subject in candidates:
+        if (rule.key, subject) in already_awarded:
+            continue
+        
+        try:
+            db.session.add(AchievementAwarded(user_id=user_id, rule_key=rule.key, subject_key=subject))
+            db.session.commit()
+        except IntegrityError:
+            # Another request awarded it first
+            db.session.rollback()
+            continue
+        
+        achievement = {'key': rule.key, 'title': rule.title, 'message': rule.message(context)}
+        achievement['notified'] = create_notification(user_id, achievement['title'], achievement['message'], 'both')
+        awarded.append(achievement)
+    
+    return awarded
+
+
+def habit_completed(user_id, habit, points):
+    """Evaluate the rules affected by a habit completion"""
+    return evaluate('habit_completed', user_id, habit=habit) + evaluate('points_changed', user_id, points=points)
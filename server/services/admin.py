@@ -0,0 +1,41 @@
+"""
+Admin access checks.
+
+Admins are the accounts whose id is listed in ``ADMIN_USER_IDS``.  E-mail
+addresses are not verified and can be changed through the profile, so they
+never grant access.
+"""
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import get_jwt_identity, jwt_required, verify_jwt_in_request
+
+
+def is_admin(user_id):
+    if user_id is None:
+        return False
+    try:
+        return int(user_id) in (current_app.config.get('ADMIN_USER_IDS') or [])
+    except (TypeError, ValueError):
+        return False
+
+
+def current_user_is_admin():
+    """True when the request carries a valid JWT for an admin account"""
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception:
+        return False
+    return is_admin(get_jwt_identity())
+
+
+def admin_required(view):
+    """Like jwt_required, but the user must also be an admin"""
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not is_admin(get_jwt_identity()):
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    
+    return wrapper
@@ -0,0 +1,330 @@
+"""
+Response cache for read endpoints.
+
+``@cached()`` stores a view's 200 response (body, mimetype and ETag) keyed
+by user, endpoint, URL arguments and query string.  Each user also has a generation counter that
+is part of the key; bumping it makes all of that user's entries unreachable
+at once.  SQLAlchemy ``after_insert``/``after_update``/``after_delete``
+events on the user-owned models bump the generation of the affected user,
+immediately and again after commit (a read that raced the transaction could
+otherwise re-cache the old state).
+
+Generations are nanosecond timestamps rather than counters starting at 0,
+so a generation that expired or was evicted is never handed out again and
+entries built on it stay unreachable.
+
+Backends:
+
+* ``memory`` - per-process LRU with TTL (default).  A write only bumps the
+  generation in the worker that made it, so under gunicorn with several
+  workers the cache turns itself off (see ``require_shared_backend``)
+* ``sqlite`` - a SQLite file shared by every worker on the host, the local
+  stand-in for a cache server
+
+Bulk statements (``query.delete()``, Core ``insert``/``update``) bypass the
+ORM events; code issuing them calls ``response_cache.invalidate_user``.
+"""
+import sqlite3
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, select
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.util import identity_key
+
+from services.db_routing import RoutingSession
+
+
+class MemoryBackend:
+    """LRU dict with per-entry expiry"""
+    
+    def __init__(self, max_entries=10000):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+    
+    def advance(self, key, floor, ttl):
+        """Set the counter at `key` past its current value and at least to `floor`"""
+        with self._lock:
+            value, expires = self._entries.get(key, (0, 0))
+            if expires < time.monotonic():
+                value = 0
+            value = max(value + 1, floor)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            return value
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+
+class SQLiteBackend:
+    """Entries in a SQLite file shared by every worker process on the host"""
+    
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self._max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+    
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM response_cache WHERE key = ? AND expires >= ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            self._prune(connection)
+    
+    def _prune(self, connection):
+        connection.execute("DELETE FROM response_cache WHERE expires < ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            "SELECT key FROM response_cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self._max_entries,)
+        )
+    
+    def advance(self, key, floor, ttl):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value FROM response_cache WHERE key = ? AND expires >= ?", (key, time.time())
+            ).fetchone()
+            value = max((int(row[0]) if row else 0) + 1, floor)
+            connection.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+    
+    def clear(self):
+        self._connection().execute("DELETE FROM response_cache")
+    
+    def after_fork(self):
+        self._local = threading.local()
+
+
+class ResponseCache:
+    """Flask extension holding the cache backend and hit/miss metrics"""
+    
+    # Generation counters must outlive every entry built on them
+    GENERATION_TTL = 7 * 24 * 3600
+    
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = False
+        self.default_ttl = 60
+        self._metrics = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+        self._metrics_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 10000)
+        
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        if backend == 'sqlite':
+            path = app.config.get('CACHE_STORAGE_PATH') or os.path.join(
+                tempfile.gettempdir(), 'stride_streak_cache.db'
+            )
+            self.backend = SQLiteBackend(path, max_entries)
+        elif backend == 'memory':
+            self.backend = MemoryBackend(max_entries)
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+        app.extensions['response_cache'] = self
+    
+    def _count(self, metric):
+        with self._metrics_lock:
+            self._metrics[metric] += 1
+    
+    def generation(self, user_id):
+        generation = self.backend.get(f'gen:{user_id}')
+        if generation is None:
+            # Never 0 again after an eviction: start from a number no entry was built on
+            generation = self.backend.advance(f'gen:{user_id}', time.time_ns(), self.GENERATION_TTL)
+        return generation
+    
+    def invalidate_user(self, user_id):
+        if self.backend is None or user_id is None:
+            return
+        self.backend.advance(f'gen:{user_id}', time.time_ns(), self.GENERATION_TTL)
+        self._count('invalidations')
+    
+    def require_shared_backend(self, workers):
+        """Turn the cache off when `workers` processes would each keep a private copy
+
+        Returns True if it was turned off.
+        """
+        if self.enabled and workers > 1 and isinstance(self.backend, MemoryBackend):
+            self.enabled = False
+            return True
+        return False
+    
+    def stats(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hit_rate'] = round(metrics['hits'] / lookups * 100, 2) if lookups else 0.0
+        metrics['backend'] = type(self.backend).__name__ if self.backend else None
+        return metrics
+    
+    def after_fork(self):
+        self._metrics_lock = threading.Lock()
+        if self.backend is not None:
+            self.backend.after_fork()
+
+
+response_cache = ResponseCache()
+
+
+def cached(ttl=None):
+    """Cache a JWT-protected view's successful responses per user"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # A profiled request (services.profiler) must run the view, not replay it
+            if not response_cache.enabled or response_cache.backend is None or 'request_profile' in g:
+                return view(*args, **kwargs)
+            
+            user_id = get_jwt_identity()
+            view_args = ','.join(f'{k}={v}' for k, v in sorted(kwargs.items()))
+            key = (f"resp2:{user_id}:{response_cache.generation(user_id)}:{request.endpoint}:"
+                   f"{view_args}:{request.query_string.decode('utf-8', 'replace')}")
+            
+            entry = response_cache.backend.get(key)
+            if entry is not None:
+                response_cache._count('hits')
+                mimetype, etag, body = entry.split(b'\n', 2)
+                response = Response(body, status=200, mimetype=mimetype.decode())
+                if etag:
+                    response.headers['ETag'] = etag.decode()
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            response_cache._count('misses')
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                response_cache.backend.set(
+                    key,
+                    b'\n'.join([
+                        response.mimetype.encode(),
+                        response.headers.get('ETag', '').encode(),
+                        response.get_data()
+                    ]),
+                    ttl or response_cache.default_ttl
+                )
+                response_cache._count('stores')
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        
+        return wrapper
+    
+    return decorator
+
+
+def _owner_id(mapper, connection, target):
+    """The id of the user whose cached responses a row affects"""
+    if hasattr(target, 'user_id'):
+        return target.user_id
+    if mapper.local_table.name == 'users':
+        return target.id
+    habit_id = getattr(target, 'habit_id', None)
+    if habit_id is not None:
+        from models.habit import Habit
+        # The parent habit is usually already loaded in this session
+        session = object_session(target)
+        habit = session.identity_map.get(identity_key(Habit, habit_id)) if session is not None else None
+        if habit is not None and 'user_id' in habit.__dict__:
+            return habit.user_id
+        return connection.execute(
+            select(Habit.__table__.c.user_id).where(Habit.__table__.c.id == habit_id)
+        ).scalar()
+    return None
+
+
+def _on_write(mapper, connection, target):
+    if response_cache.backend is None:
+        return
+    user_id = _owner_id(mapper, connection, target)
+    if user_id is None:
+        return
+    response_cache.invalidate_user(user_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('cache_invalidate', set()).add(user_id)
+
+
+def register_invalidation(*models):
+    """Invalidate a user's cached responses whenever one of their rows changes"""
+    for model in models:
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, name, _on_write):
+                event.listen(model, name, _on_write)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('cache_invalidate', ()):
+        response_cache.invalidate_user(user_id)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_invalidations(session):
+    session.info.pop('cache_invalidate', None)
@@ -0,0 +1,155 @@
+"""
+Compact completion history.
+
+Every habit gets one 46-byte row per year in ``habit_completion_bitmaps``
+with bit ``n`` set when the habit was completed on day ``n + 1`` of that
+year.  Calendars (``GET /api/habits/<id>/calendar``) and the 30-day
+completion rate of ``GET /api/habits/stats`` then become bit operations on a
+Python int instead of scans over ``habit_completions``.
+
+The bitmaps are written next to each completion when
+``COMPLETION_BITMAPS_ENABLED`` is set; ``python -m services.completion_bitmap``
+backfills them from existing completions.
+"""
+import argparse
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+from config.database import db
+from models.habit import HabitCompletion, HabitCompletionBitmap
+from services.sharding import for_user, on_shard, shard_indexes, sharding_enabled
+
+BITMAP_BYTES = 46  # 366 bits rounded up
+
+
+def day_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def days_in_year(year):
+    return (date(year + 1, 1, 1) - date(year, 1, 1)).days
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def from_bytes(data):
+    return int.from_bytes(data, 'little') if data else 0
+
+
+def mark_completed(habit_id, day):
+    """Set the bit for `day` in the current session (the caller commits)"""
+    bitmap = db.session.get(HabitCompletionBitmap, (habit_id, day.year))
+    if bitmap is None:
+        bitmap = HabitCompletionBitmap(habit_id=habit_id, year=day.year, days=to_bytes(0))
+        db.session.add(bitmap)
+    bitmap.days = to_bytes(from_bytes(bitmap.days) | (1 << day_index(day)))
+
+
+def load_years(habit_ids, years):
+    """Fetch bitmaps as {(habit_id, year): int} with one query"""
+    if not habit_ids or not years:
+        return {}
+    rows = db.session.query(
+        HabitCompletionBitmap.habit_id,
+        HabitCompletionBitmap.year,
+        HabitCompletionBitmap.days
+    ).filter(
+        HabitCompletionBitmap.habit_id.in_(list(habit_ids)),
+        HabitCompletionBitmap.year.in_(list(years))
+    ).all()
+    return {(row.habit_id, row.year): from_bytes(row.days) for row in rows}
+
+
+def completed_days(bits, year):
+    """Dates whose bits are set, in order"""
+    start = date(year, 1, 1)
+    days = []
+    while bits:
+        lowest = bits & -bits
+        days.append(start + timedelta(days=lowest.bit_length() - 1))
+        bits ^= lowest
+    return days
+
+
+def count_between(bits, first_index, last_index):
+    """Number of completed days with first_index <= index <= last_index"""
+    if last_index < first_index:
+        return 0
+    mask = ((1 << (last_index - first_index + 1)) - 1) << first_index
+    return popcount(bits & mask)
+
+
+def completions_between(habit_ids, start, end):
+    """Completed days of each habit in [start, end] as {habit_id: count}, with one query"""
+    counts = dict.fromkeys(habit_ids, 0)
+    if end < start:
+        return counts
+    for (habit_id, year), bits in load_years(habit_ids, range(start.year, end.year + 1)).items():
+        first = day_index(start) if year == start.year else 0
+        last = day_index(end) if year == end.year else days_in_year(year) - 1
+        counts[habit_id] += count_between(bits, first, last)
+    return counts
+
+
+def rebuild_bitmaps(habit_id=None, batch_size=10000):
+    """Recompute bitmaps from habit_completions; returns the number of rows written
+
+    Without `habit_id` every shard is rebuilt.  Habit ids are per shard, so a
+    single habit is rebuilt on the shard currently selected (the request's,
+    or one picked with services.sharding.for_user).
+    """
+    if habit_id is None and sharding_enabled():
+        written = 0
+        for shard in shard_indexes():
+            with on_shard(shard):
+                written += _rebuild(None, batch_size)
+        return written
+    return _rebuild(habit_id, batch_size)
+
+
+def _rebuild(habit_id, batch_size):
+    query = db.session.query(HabitCompletion.habit_id, HabitCompletion.completed_at)
+    bitmap_query = HabitCompletionBitmap.query
+    if habit_id is not None:
+        query = query.filter(HabitCompletion.habit_id == habit_id)
+        bitmap_query = bitmap_query.filter(HabitCompletionBitmap.habit_id == habit_id)
+    
+    bitmaps = {}
+    for row in query.yield_per(batch_size):
+        key = (row.habit_id, row.completed_at.year)
+        bitmaps[key] = bitmaps.get(key, 0) | (1 << day_index(row.completed_at.date()))
+    
+    bitmap_query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(HabitCompletionBitmap, [
+        {'habit_id': key[0], 'year': key[1], 'days': to_bytes(bits)}
+        for key, bits in bitmaps.items()
+    ])
+    db.session.commit()
+    return len(bitmaps)
+
+
+def main():
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Backfill habit completion bitmaps')
+    parser.add_argument('--habit-id', type=int, help='only rebuild this habit')
+    parser.add_argument('--user-id', type=int, help="owner of --habit-id (selects the shard when sharded)")
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        if args.habit_id is not None and sharding_enabled() and args.user_id is None:
+            parser.error('--user-id is required with --habit-id when sharding is enabled')
+        with for_user(args.user_id) if args.user_id is not None else nullcontext():
+            written = rebuild_bitmaps(args.habit_id)
+    print(f"✅ Wrote {written} completion bitmaps")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Read-replica routing.
+
+Views decorated with ``@read_only`` run their queries against one of the
+configured read replicas; everything else, including any flush, goes to the
+primary (``SQLALCHEMY_DATABASE_URI``).  Two rules keep reads consistent:
+
+* read-your-own-writes - a user who wrote within ``REPLICA_STICKY_SECONDS``
+  keeps reading from the primary.  Responses to a write carry the write time
+  in ``X-Last-Write``; a client that echoes it back is kept on the primary by
+  every worker, not only by the one that served the write
+* lag-aware fallback - replicas whose measured lag exceeds
+  ``REPLICA_MAX_LAG_SECONDS`` (or that cannot be reached) are skipped until
+  the next check, and reads fall back to the primary.  Lag is measured every
+  ``REPLICA_LAG_CHECK_SECONDS`` by a background thread per process, so no
+  request waits on a slow replica
+
+Replicas are registered as Flask-SQLAlchemy binds named ``replica_<n>``, so
+for a local test it is enough to point ``DATABASE_REPLICA_URLS`` at a copy
+of the primary SQLite file.
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from services.sharding import shard_engine
+
+REPLICA_PREFIX = 'replica_'
+LAST_WRITE_HEADER = 'X-Last-Write'
+
+
+def configure_replica_binds(app):
+    """Register every URL in SQLALCHEMY_READ_REPLICA_URIS as a replica bind"""
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for index, uri in enumerate(app.config.get('SQLALCHEMY_READ_REPLICA_URIS') or []):
+        binds[f'{REPLICA_PREFIX}{index}'] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+
+class ReplicaMonitor:
+    """Replica lag, measured by a background thread and read without waiting
+    
+    Requests only look at the last measurement.  A replica that has not been
+    measured yet, or whose last measurement is more than ``STALE_CHECKS``
+    intervals old (the probe hangs on it), counts as unhealthy.
+    """
+    STALE_CHECKS = 3
+    
+    def __init__(self):
+        self._status = {}
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._recent_writers = {}
+        self._pruned_at = time.monotonic()
+        self._engines = {}
+        self._source = None
+        self._interval = 10
+        self._prober = None
+        self._stop = threading.Event()
+    
+    def init_app(self, app):
+        app.extensions['replica_monitor'] = self
+        app.after_request(_stamp_last_write)
+    
+    def after_fork(self):
+        """Measure lag afresh in the worker instead of trusting the master's"""
+        self._lock = threading.Lock()
+        self._status = {}
+        self._recent_writers = {}
+        self._pruned_at = time.monotonic()
+        self._prober = None
+        self._stop = threading.Event()
+    
+    def healthy_replicas(self, engines, max_lag, check_interval):
+        self._ensure_prober(engines, check_interval)
+        now = time.monotonic()
+        healthy = []
+        for key in sorted(k for k in engines if k and k.startswith(REPLICA_PREFIX)):
+            lag, checked = self._status.get(key, (None, None))
+            if checked is None or now - checked > self.STALE_CHECKS * check_interval:
+                continue
+            if lag is not None and lag <= max_lag:
+                healthy.append(key)
+        return healthy
+    
+    def probe(self):
+        """Measure every replica once (the prober's loop body)"""
+        for key, engine in list(self._engines.items()):
+            lag = measure_lag(engine)
+            self._status[key] = (lag, time.monotonic())
+    
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._prober is not None:
+            self._prober.join(timeout)
+        self._prober = None
+    
+    def _ensure_prober(self, engines, check_interval):
+        if self._source is not engines:
+            # A new app (and its engines) took over; probe those from now on
+            self._engines = {key: engine for key, engine in engines.items()
+                             if key and key.startswith(REPLICA_PREFIX)}
+            self._source = engines
+        self._interval = check_interval
+        if self._prober is not None and self._prober.is_alive():
+            return
+        with self._lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._stop.clear()
+            self._prober = threading.Thread(target=self._run, name='replica-lag-probe', daemon=True)
+            self._prober.start()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe()
+            except Exception as e:
+                print(f"⚠️  Replica lag probe error: {e}")
+            self._stop.wait(self._interval)
+    
+    def pick(self, healthy):
+        return healthy[next(self._round_robin) % len(healthy)]
+    
+    def record_write(self, user_id, window):
+        now = time.monotonic()
+        self._recent_writers[str(user_id)] = now
+        if now - self._pruned_at >= window:
+            # Forget writers whose window has passed, at most once per window
+            with self._lock:
+                self._pruned_at = now
+                self._recent_writers = {
+                    key: written for key, written in self._recent_writers.items() if now - written <= window
+                }
+    
+    def wrote_recently(self, user_id, window):
+        written = self._recent_writers.get(str(user_id))
+        if written is None:
+            return False
+        if time.monotonic() - written > window:
+            self._recent_writers.pop(str(user_id), None)
+            return False
+        return True
+    
+    def status(self):
+        return {key: lag for key, (lag, _) in self._status.items()}
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def measure_lag(engine):
+    """Replication lag in seconds, or None when the replica is unusable"""
+    try:
+        with engine.connect() as connection:
+            if engine.dialect.name != 'mysql':
+                connection.execute(text("SELECT 1"))
+                return 0.0
+            
+            row = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            if row is None:
+                # Not configured as a replica (e.g. a read-only copy)
+                return 0.0
+            lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+            return float(lag) if lag is not None else None
+    except Exception as e:
+        print(f"⚠️  Replica check failed for {engine.url.render_as_string(hide_password=True)}: {e}")
+        return None
+
+
+def _current_user_id():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _client_wrote_recently(window):
+    """Whether the request echoes an X-Last-Write stamp from the last `window` seconds"""
+    try:
+        written = float(request.headers.get(LAST_WRITE_HEADER, ''))
+    except ValueError:
+        return False
+    # Stamps slightly in the future are tolerated for clock skew between hosts
+    return abs(time.time() - written) <= window
+
+
+def _stamp_last_write(response):
+    if g.get('db_wrote'):
+        response.headers[LAST_WRITE_HEADER] = f'{time.time():.3f}'
+    return response
+
+
+def _replica_engine(session):
+    """The replica engine this request should read from, if any"""
+    if not has_request_context() or not g.get('use_replica') or g.get('db_wrote'):
+        return None
+    if session._flushing or session.new or session.dirty or session.deleted:
+        return None
+    
+    engines = session._db.engines
+    if len(engines) < 2:
+        return None
+    
+    config = current_app.config
+    sticky_seconds = config.get('REPLICA_STICKY_SECONDS', 5)
+    if _client_wrote_recently(sticky_seconds):
+        return None
+    user_id = _current_user_id()
+    if user_id is not None and replica_monitor.wrote_recently(user_id, sticky_seconds):
+        return None
+    
+    healthy = replica_monitor.healthy_replicas(
+        engines,
+        config.get('REPLICA_MAX_LAG_SECONDS', 5),
+        config.get('REPLICA_LAG_CHECK_SECONDS', 10)
+    )
+    if not healthy:
+        return None
+    return engines[replica_monitor.pick(healthy)]
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that routes sharded tables to the user's shard
+    and sends read-only views to a replica"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            # User-owned tables live on the user's shard when sharding is on
+            engine = shard_engine(self, mapper, clause) or _replica_engine(self)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+        user_id = _current_user_id()
+        if user_id is not None:
+            replica_monitor.record_write(user_id, current_app.config.get('REPLICA_STICKY_SECONDS', 5))
+
+
+def read_only(view):
+    """Allow a view's queries to be served by a read replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    
+    return wrapper
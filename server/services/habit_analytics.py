@@ -0,0 +1,100 @@
+"""
+Per-habit analytics computed with NumPy.
+
+Completion timestamps are fetched once and turned into a daily series with
+``bincount``; every metric is then derived with vectorised array operations
+(cumulative sums for rolling windows, bincounts for weekday and hour
+distributions, a closed-form least-squares fit for the trend).
+"""
+import numpy as np
+
+from config.database import db
+from models.habit import HabitCompletion
+
+ROLLING_WINDOWS = (7, 30, 90)
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+def completion_timestamps(habit_id):
+    """All completion times of a habit as a datetime64 array"""
+    rows = db.session.execute(
+        db.select(HabitCompletion.completed_at).where(HabitCompletion.habit_id == habit_id)
+    ).scalars().all()
+    return np.array(rows, dtype='datetime64[s]')
+
+
+def _rate(value):
+    return round(float(value) * 100, 2)
+
+
+def compute_analytics(timestamps, today, start=None):
+    """Analytics for one habit from its completion timestamps.
+
+    `start` is the first day the habit could be completed (its creation
+    date); rates are measured from there or from the first completion,
+    whichever is earlier.
+    """
+    today = np.datetime64(today, 'D')
+    timestamps = timestamps[timestamps < today + 1]
+    
+    result = {
+        'total_completions': int(timestamps.size),
+        'days_completed': 0,
+        'first_completion': None,
+        'rolling_completion_rates': {f'{window}d': 0.0 for window in ROLLING_WINDOWS},
+        'weekday_completion_rates': {name: 0.0 for name in WEEKDAYS},
+        'best_weekday': None,
+        'worst_weekday': None,
+        'hour_distribution': [0] * 24,
+        'trend': {'weeks': 0, 'slope_per_week': 0.0}
+    }
+    if timestamps.size == 0:
+        return result
+    
+    days = timestamps.astype('datetime64[D]')
+    first_day = days.min()
+    if start is not None:
+        first_day = min(first_day, np.datetime64(start, 'D'))
+    span = int((today - first_day).astype(np.int64)) + 1
+    day_index = (days - first_day).astype(np.int64)
+    
+    # One entry per calendar day since the first completion: 1 if completed
+    done = (np.bincount(day_index, minlength=span) > 0).astype(np.int64)
+    cumulative = np.concatenate(([0], np.cumsum(done)))
+    result['days_completed'] = int(cumulative[-1])
+    result['first_completion'] = str(timestamps.min())
+    
+    for window in ROLLING_WINDOWS:
+        length = min(window, span)
+        result['rolling_completion_rates'][f'{window}d'] = _rate(
+            (cumulative[-1] - cumulative[-1 - length]) / length
+        )
+    
+    # Weekday rate = completed days on that weekday / occurrences of that weekday
+    first_weekday = (int(first_day.astype(np.int64)) + EPOCH_WEEKDAY) % 7
+    weekday_of_day = (np.arange(span) + first_weekday) % 7
+    occurrences = np.bincount(weekday_of_day, minlength=7)
+    completed = np.bincount(weekday_of_day, weights=done, minlength=7)
+    weekday_rates = np.divide(completed, occurrences, out=np.zeros(7), where=occurrences > 0)
+    result['weekday_completion_rates'] = {
+        name: _rate(rate) for name, rate in zip(WEEKDAYS, weekday_rates)
+    }
+    observed = np.flatnonzero(occurrences)
+    result['best_weekday'] = WEEKDAYS[observed[np.argmax(weekday_rates[observed])]]
+    result['worst_weekday'] = WEEKDAYS[observed[np.argmin(weekday_rates[observed])]]
+    
+    hours = ((timestamps - days).astype('timedelta64[h]')).astype(np.int64)
+    result['hour_distribution'] = np.bincount(hours, minlength=24).tolist()
+    
+    # Weekly completed days in full weeks ending today, oldest first, and the
+    # least-squares slope of that series (change in days completed per week)
+    weeks = span // 7
+    if weeks >= 2:
+        weekly = done[span - weeks * 7:].reshape(weeks, 7).sum(axis=1)
+        x = np.arange(weeks, dtype=np.float64)
+        x_centered = x - x.mean()
+        slope = float((x_centered * (weekly - weekly.mean())).sum() / (x_centered ** 2).sum())
+        result['trend'] = {'weeks': weeks, 'slope_per_week': round(slope, 4)}
+    
+    return result
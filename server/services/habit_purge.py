@@ -0,0 +1,103 @@
+"""
+Purge job for soft-deleted habits.
+
+Deleting a habit only sets ``habits.deleted_at``; the habit can be restored
+until ``HABIT_UNDO_WINDOW_HOURS`` have passed.  This job then removes each
+expired habit's completions in batches of ``HABIT_PURGE_BATCH_SIZE`` rows,
+committing after every batch so no transaction holds locks for long, and
+finally deletes its bitmaps and the habit itself.  Habits past the window
+can no longer be restored, so nothing races the purge.
+
+Run it periodically from the server directory:
+
+    python -m services.habit_purge --batch-size 1000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from config.database import db
+from models.habit import Habit, HabitCompletion, HabitCompletionBitmap
+from services.sharding import on_shard, shard_indexes, shard_map
+
+
+def purge_deleted_habits(undo_window_hours, batch_size=1000, pause_seconds=0.0):
+    """Remove habits deleted longer than the undo window ago, with their history.
+
+    Must be called inside an application context.  Returns a stats dict.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=undo_window_hours)
+    habits = Habit.__table__
+    completions = HabitCompletion.__table__
+    bitmaps = HabitCompletionBitmap.__table__
+    
+    purged_habits = 0
+    purged_completions = 0
+    batches = 0
+    started = time.perf_counter()
+    
+    for shard in shard_indexes():
+        with on_shard(shard):
+            expired = db.session.execute(
+                select(habits.c.id, habits.c.user_id)
+                .where(habits.c.deleted_at.isnot(None), habits.c.deleted_at < cutoff)
+            ).all()
+            
+            for habit_id, user_id in expired:
+                while user_id not in shard_map.moving():
+                    ids = db.session.execute(
+                        select(completions.c.id)
+                        .where(completions.c.habit_id == habit_id)
+                        .limit(batch_size)
+                    ).scalars().all()
+                    if not ids:
+                        break
+                    db.session.execute(delete(completions).where(completions.c.id.in_(ids)))
+                    db.session.commit()
+                    purged_completions += len(ids)
+                    batches += 1
+                    if pause_seconds:
+                        time.sleep(pause_seconds)
+                else:
+                    continue  # the user is being moved to another shard; a later run purges it there
+                
+                db.session.execute(delete(bitmaps).where(bitmaps.c.habit_id == habit_id))
+                db.session.execute(delete(habits).where(habits.c.id == habit_id))
+                db.session.commit()
+                purged_habits += 1
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'habits': purged_habits,
+        'completions': purged_completions,
+        'batches': batches,
+        'cutoff': cutoff.isoformat(),
+        'elapsed_seconds': round(elapsed, 3)
+    }
+
+
+def main():
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Purge soft-deleted habits past the undo window')
+    parser.add_argument('--hours', type=float, help='undo window in hours')
+    parser.add_argument('--batch-size', type=int, help='completions deleted per batch')
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        stats = purge_deleted_habits(
+            undo_window_hours=args.hours if args.hours is not None else app.config['HABIT_UNDO_WINDOW_HOURS'],
+            batch_size=args.batch_size or app.config['HABIT_PURGE_BATCH_SIZE'],
+            pause_seconds=args.pause
+        )
+    
+    print(f"🧹 Purged {stats['habits']} deleted habits and {stats['completions']} completions "
+          f"in {stats['batches']} batches ({stats['elapsed_seconds']}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,514 @@
+"""
+Background jobs.
+
+Work that should not run inside a request handler (e-mail, maintenance
+passes) is stored as rows of the ``jobs`` table, so it survives restarts and
+any number of worker processes can share it:
+
+* ``@job('name')`` registers a function; ``enqueue('name', ...)`` adds a job
+  to the current session, so it only becomes visible when the caller's
+  transaction commits and vanishes with a rollback
+* workers claim the ready job with the highest ``priority`` through a
+  compare-and-set UPDATE, run it in an application context and record its
+  duration; a failing job is retried with exponential backoff until it has
+  used ``max_attempts``
+* ``SCHEDULES`` holds cron expressions; a scheduler thread enqueues each due
+  run once, deduplicated across processes by the unique ``jobs.dedupe_key``
+
+Run a worker process next to gunicorn:
+
+    python -m services.jobs work --threads 4
+
+or set ``JOBS_WORKER_THREADS`` to run worker threads inside every gunicorn
+worker.  ``python -m services.jobs stats`` prints per-job timings.  Finished
+jobs are deleted by the ``jobs.purge_finished`` schedule once they are older
+than ``JOBS_RETENTION_DAYS`` (failed ones after ``JOBS_FAILED_RETENTION_DAYS``).
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from config.database import db
+from models.job import Job
+
+JobSpec = namedtuple('JobSpec', 'name func priority max_attempts')
+Schedule = namedtuple('Schedule', 'cron name payload')
+
+JOBS = {}
+
+
+def job(name, priority=0, max_attempts=3):
+    """Register a function as the job `name`; it is called with the payload as kwargs"""
+    def register(func):
+        JOBS[name] = JobSpec(name, func, priority, max_attempts)
+        return func
+    
+    return register
+
+
+def enqueue(name, payload=None, priority=None, delay_seconds=0, run_at=None, dedupe_key=None):
+    """Add a job to the current session (the caller commits)"""
+    spec = JOBS.get(name)
+    if spec is None:
+        raise KeyError(f"Unknown job '{name}'")
+    
+    queued = Job(
+        name=name,
+        payload=payload or {},
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_at=run_at or datetime.utcnow() + timedelta(seconds=delay_seconds),
+        dedupe_key=dedupe_key
+    )
+    db.session.add(queued)
+    return queued
+
+
+def backoff_seconds(attempts, base=None, cap=None):
+    """Delay before retry number `attempts`: base * 2^(attempts-1), capped, +/-20% jitter"""
+    config = current_app.config
+    base = config.get('JOBS_RETRY_BASE_SECONDS', 10) if base is None else base
+    cap = config.get('JOBS_RETRY_MAX_SECONDS', 3600) if cap is None else cap
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+# Cron schedules
+
+class CronSchedule:
+    """A five-field cron expression: minute hour day-of-month month day-of-week
+
+    Fields accept ``*``, numbers, ranges (``1-5``), lists (``1,15``) and steps
+    (``*/15``, ``0-30/10``).  Day of week runs from 0 (Sunday) to 6.  Unlike
+    classic cron, day of month and day of week must both match.
+    """
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+    
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have 5 fields")
+        self.expression = expression
+        self.fields = [self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)]
+    
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            part, _, step = part.partition('/')
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field '{field}' is outside {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+    
+    def matches(self, moment):
+        minutes, hours, days, months, weekdays = self.fields
+        return (
+            moment.minute in minutes
+            and moment.hour in hours
+            and moment.day in days
+            and moment.month in months
+            and moment.isoweekday() % 7 in weekdays
+        )
+
+
+SCHEDULES = [
+    Schedule('*/5 * * * *', 'points.fold', {}),
+    Schedule('*/15 * * * *', 'notifications.reconcile_unread', {}),
+    Schedule('10 * * * *', 'habits.purge_deleted', {}),
+    Schedule('30 3 * * *', 'notifications.retention', {}),
+    Schedule('45 3 * * *', 'jobs.purge_finished', {}),
+]
+
+
+def enqueue_due(moment, schedules=None):
+    """Enqueue every schedule matching the minute of `moment`; returns how many were new
+
+    Each run gets the dedupe key ``name@minute``, so when several schedulers
+    see the same minute only the first insert succeeds.
+    """
+    minute = moment.replace(second=0, microsecond=0)
+    created = 0
+    for schedule in SCHEDULES if schedules is None else schedules:
+        if not CronSchedule(schedule.cron).matches(minute):
+            continue
+        try:
+            enqueue(schedule.name, schedule.payload, run_at=minute,
+                    dedupe_key=f"{schedule.name}@{minute.isoformat(timespec='minutes')}")
+            db.session.commit()
+            created += 1
+        except IntegrityError:
+            # Another scheduler enqueued this run
+            db.session.rollback()
+    return created
+
+
+# Running jobs
+
+def claim_next(worker_id):
+    """Atomically take the best ready job, or return None"""
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    candidates = db.session.execute(
+        select(jobs.c.id)
+        .where(jobs.c.status == 'queued', jobs.c.run_at <= now)
+        .order_by(jobs.c.priority.desc(), jobs.c.run_at, jobs.c.id)
+        .limit(5)
+    ).scalars().all()
+    
+    for job_id in candidates:
+        # Only one worker's UPDATE can still see the job queued
+        result = db.session.execute(
+            update(jobs)
+            .where(jobs.c.id == job_id, jobs.c.status == 'queued')
+            .values(status='running', locked_by=worker_id, locked_at=now, started_at=now,
+                    attempts=jobs.c.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(claimed):
+    """Run a claimed job and record the outcome; returns True on success"""
+    spec = JOBS.get(claimed.name)
+    started = time.perf_counter()
+    error = None
+    try:
+        if spec is None:
+            raise KeyError(f"Unknown job '{claimed.name}'")
+        spec.func(**(claimed.payload or {}))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+    
+    claimed.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    claimed.finished_at = datetime.utcnow()
+    claimed.locked_by = None
+    claimed.locked_at = None
+    if error is None:
+        claimed.status = 'done'
+        claimed.last_error = None
+    elif spec is not None and claimed.attempts < claimed.max_attempts:
+        claimed.status = 'queued'
+        claimed.run_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(claimed.attempts))
+        claimed.last_error = error
+    else:
+        claimed.status = 'failed'
+        claimed.last_error = error
+    db.session.commit()
+    
+    if error is not None:
+        print(f"⚠️  Job {claimed.id} ({claimed.name}) failed on attempt {claimed.attempts}: "
+              f"{error.strip().splitlines()[-1]}")
+    return error is None
+
+
+def requeue_stale(timeout_seconds):
+    """Put back jobs whose worker died while running them; returns how many
+
+    Jobs that already used every attempt are failed instead, so a job that
+    kills its worker cannot loop forever.
+    """
+    jobs = Job.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout_seconds)
+    stale = (jobs.c.status == 'running', jobs.c.locked_at < cutoff)
+    db.session.execute(
+        update(jobs)
+        .where(*stale, jobs.c.attempts >= jobs.c.max_attempts)
+        .values(status='failed', locked_by=None, locked_at=None, last_error='Worker stopped while running the job')
+    )
+    result = db.session.execute(
+        update(jobs)
+        .where(*stale)
+        .values(status='queued', locked_by=None, locked_at=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def run_pending(worker_id='inline', limit=None):
+    """Run ready jobs in this thread until none are left; returns how many ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        claimed = claim_next(worker_id)
+        if claimed is None:
+            return ran
+        run_job(claimed)
+        ran += 1
+    return ran
+
+
+def job_stats(since=None):
+    """Per-job counts by status and timing of finished runs"""
+    jobs = Job.__table__
+    query = select(
+        jobs.c.name,
+        jobs.c.status,
+        func.count(),
+        func.avg(jobs.c.duration_ms),
+        func.max(jobs.c.duration_ms)
+    ).group_by(jobs.c.name, jobs.c.status)
+    if since is not None:
+        query = query.where(jobs.c.created_at >= since)
+    
+    stats = {}
+    for name, status, count, avg_ms, max_ms in db.session.execute(query):
+        entry = stats.setdefault(name, {'queued': 0, 'running': 0, 'done': 0, 'failed': 0,
+                                        'avg_ms': None, 'max_ms': None})
+        entry[status] = count
+        if status in ('done', 'failed') and avg_ms is not None:
+            entry['avg_ms'] = round(float(avg_ms), 2)
+            entry['max_ms'] = max(entry['max_ms'] or 0, round(float(max_ms), 2))
+    return stats
+
+
+def purge_finished(done_days, failed_days, batch_size=1000):
+    """Delete done jobs older than `done_days` and failed ones older than `failed_days`
+
+    Rows are deleted in batches of `batch_size`, one commit each; returns how
+    many were deleted.  Jobs failed by ``requeue_stale`` have no finish time
+    and age from when they were created.
+    """
+    jobs = Job.__table__
+    now = datetime.utcnow()
+    finished = func.coalesce(jobs.c.finished_at, jobs.c.created_at)
+    purged = 0
+    for status, days in (('done', done_days), ('failed', failed_days)):
+        cutoff = now - timedelta(days=days)
+        # A job cannot finish before its run_at, which keeps the scan on ix_jobs_ready
+        batch_query = (
+            select(jobs.c.id)
+            .where(jobs.c.status == status, jobs.c.run_at < cutoff, finished < cutoff)
+            .limit(batch_size)
+        )
+        while True:
+            ids = db.session.execute(batch_query).scalars().all()
+            if not ids:
+                break
+            db.session.execute(delete(jobs).where(jobs.c.id.in_(ids)))
+            db.session.commit()
+            purged += len(ids)
+    return purged
+
+
+class JobRunner:
+    """Worker threads polling the jobs table, plus the cron scheduler"""
+    
+    def __init__(self):
+        self.app = None
+        self._threads = []
+        self._stop = threading.Event()
+    
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_runner'] = self
+    
+    def after_fork(self):
+        """Threads do not survive the fork; post_fork starts the worker's own"""
+        self._threads = []
+        self._stop = threading.Event()
+    
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+    
+    def start(self, app=None, threads=None, schedule=None):
+        """Start worker threads (and the scheduler) in this process"""
+        app = app or self.app
+        threads = app.config.get('JOBS_WORKER_THREADS', 0) if threads is None else threads
+        schedule = app.config.get('JOBS_SCHEDULER_ENABLED', True) if schedule is None else schedule
+        if self.running or threads <= 0:
+            return
+        
+        self._stop.clear()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for index in range(threads):
+            thread = threading.Thread(target=self._work, args=(app, f'{prefix}:{index}'),
+                                      name=f'job-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if schedule:
+            thread = threading.Thread(target=self._schedule, args=(app,), name='job-scheduler', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🧵 Started {threads} job worker thread{'s' if threads != 1 else ''} ({prefix})")
+    
+    def stop(self, timeout=None):
+        """Ask every thread to finish its current job and wait for them"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def _work(self, app, worker_id):
+        poll = app.config.get('JOBS_POLL_SECONDS', 2)
+        while not self._stop.is_set():
+            try:
+                with app.app_context():
+                    ran = run_pending(worker_id, limit=100)
+            except Exception as e:
+                print(f"⚠️  Job worker {worker_id} error: {e}")
+                ran = 0
+            if not ran:
+                self._stop.wait(poll * random.uniform(0.5, 1.5))
+    
+    def _schedule(self, app):
+        last_minute = None
+        while not self._stop.is_set():
+            now = datetime.utcnow().replace(second=0, microsecond=0)
+            if now != last_minute:
+                try:
+                    with app.app_context():
+                        enqueue_due(now)
+                        requeue_stale(app.config.get('JOBS_LOCK_TIMEOUT_SECONDS', 3600))
+                    last_minute = now
+                except Exception as e:
+                    print(f"⚠️  Job scheduler error: {e}")
+            self._stop.wait(5)
+
+
+job_runner = JobRunner()
+
+
+# Built-in jobs
+
+@job('email.send', priority=10, max_attempts=5)
+def send_email(user_id, subject, message):
+    from models.user import User
+    from routes.notifications import deliver_email
+    
+    user = db.session.get(User, user_id)
+    if user is not None and not deliver_email(user, subject, message):
+        raise RuntimeError(f"Could not send e-mail to user {user_id}")
+
+
+@job('push.send', priority=10, max_attempts=5)
+def send_push(user_ids, title, message, data=None):
+    from models.user import User
+    from services.push import push_service
+    
+    users = User.query.filter(User.id.in_(user_ids)).all()
+    counts = push_service.push_to_users(users, title, message, data)
+    if counts['failed'] and not counts['sent']:
+        # Nothing got through, so retrying cannot push anything twice
+        raise RuntimeError(f"Could not push to users {user_ids}: {counts['failed']} messages failed")
+
+
+@job('points.fold')
+def fold_points(settle_seconds=60):
+    from services.points_ledger import fold_pending
+    
+    fold_pending(settle_seconds=settle_seconds)
+
+
+@job('notifications.reconcile_unread', priority=-5)
+def reconcile_unread():
+    from services.unread_counter import reconcile_counters
+    
+    reconcile_counters(batch_size=current_app.config['UNREAD_RECONCILE_BATCH_SIZE'])
+
+
+@job('notifications.retention', priority=-10, max_attempts=2)
+def notification_retention():
+    from services.notification_retention import purge_read_notifications
+    
+    config = current_app.config
+    purge_read_notifications(
+        retention_days=config['NOTIFICATION_RETENTION_DAYS'],
+        batch_size=config['NOTIFICATION_PURGE_BATCH_SIZE'],
+        archive_mode=config['NOTIFICATION_ARCHIVE_MODE'],
+        archive_path=config['NOTIFICATION_ARCHIVE_PATH']
+    )
+
+
+@job('habits.purge_deleted', priority=-10, max_attempts=2)
+def purge_deleted_habits():
+    from services.habit_purge import purge_deleted_habits as purge
+    
+    config = current_app.config
+    purge(config['HABIT_UNDO_WINDOW_HOURS'], batch_size=config['HABIT_PURGE_BATCH_SIZE'])
+
+
+@job('jobs.purge_finished', priority=-10, max_attempts=2)
+def purge_finished_jobs():
+    config = current_app.config
+    purged = purge_finished(
+        config['JOBS_RETENTION_DAYS'],
+        config['JOBS_FAILED_RETENTION_DAYS'],
+        batch_size=config['JOBS_PURGE_BATCH_SIZE']
+    )
+    print(f"🧹 Purged {purged} finished jobs")
+
+
+def main():
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Run and inspect background jobs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    work_parser = commands.add_parser('work', help='run worker threads until interrupted')
+    work_parser.add_argument('--threads', type=int, default=2)
+    work_parser.add_argument('--no-schedule', action='store_true', help='do not enqueue cron schedules')
+    enqueue_parser = commands.add_parser('enqueue', help='queue one job')
+    enqueue_parser.add_argument('name', choices=sorted(JOBS))
+    enqueue_parser.add_argument('--payload', default='{}', help='JSON object of keyword arguments')
+    enqueue_parser.add_argument('--priority', type=int)
+    commands.add_parser('run-pending', help='run every ready job once and exit')
+    commands.add_parser('stats', help='per-job counts and timings')
+    commands.add_parser('purge', help='delete finished jobs past their retention window')
+    commands.add_parser('schedules', help='list cron schedules')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        if args.command == 'work':
+            job_runner.start(app, threads=args.threads, schedule=not args.no_schedule)
+            try:
+                while job_runner.running:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print("🛑 Stopping job workers...")
+                job_runner.stop()
+        elif args.command == 'enqueue':
+            queued = enqueue(args.name, json.loads(args.payload), priority=args.priority)
+            db.session.commit()
+            print(f"✅ Queued job {queued.id} ({queued.name})")
+        elif args.command == 'run-pending':
+            print(f"✅ Ran {run_pending()} jobs")
+        elif args.command == 'stats':
+            print(json.dumps(job_stats(), indent=2))
+        elif args.command == 'purge':
+            config = app.config
+            purged = purge_finished(
+                config['JOBS_RETENTION_DAYS'],
+                config['JOBS_FAILED_RETENTION_DAYS'],
+                batch_size=config['JOBS_PURGE_BATCH_SIZE']
+            )
+            print(f"🧹 Purged {purged} finished jobs")
+        else:
+            for schedule in SCHEDULES:
+                print(f"{schedule.cron:<16} {schedule.name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+"""
+In-memory points leaderboard.
+
+Users are kept in an order-statistic treap keyed by ``(-points, user_id)``,
+so the in-order position of a node is its rank.  Every node also stores the
+size of its subtree, which lets "top N", "my rank" and "users around me" be
+answered in O(log n) instead of sorting the users table per request.
+
+The structure lives in the worker process.  It is rebuilt from the database
+at startup and updated incrementally whenever this process changes a user's
+points.  Changes made by other gunicorn workers (and deleted users) reach it
+through a full reload from the database, started in the background by the
+first read after LEADERBOARD_REFRESH_SECONDS; until then a worker can serve
+ranks that are up to that many seconds behind the others.
+"""
+import random
+import threading
+import time
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'left', 'right', 'size')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = 1
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node, key):
+    """Split a treap into (keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        _update(node)
+        return node, right
+    left, right = _split(node.left, key)
+    node.left = right
+    _update(node)
+    return left, node
+
+
+def _merge(left, right):
+    """Merge two treaps where every key in left is smaller than in right"""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key == node.key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    else:
+        node.right = _remove(node.right, key)
+    _update(node)
+    return node
+
+
+class Leaderboard:
+    """Order-statistic index of users by points (highest first)"""
+
+    def __init__(self):
+        self._root = None
+        self._points = {}
+        self._lock = threading.Lock()
+        self.app = None
+        self.refresh_seconds = 10.0
+        self.loaded_at = None
+        self._refreshing = False
+
+    def init_app(self, app):
+        self.app = app
+        self.refresh_seconds = app.config.get('LEADERBOARD_REFRESH_SECONDS', 10.0)
+        app.extensions['leaderboard'] = self
+
+    def after_fork(self):
+        """A refresh running in the master does not exist in the worker"""
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def __len__(self):
+        return len(self._points)
+
+    def rebuild(self, rows):
+        """Replace the contents with (user_id, points) rows"""
+        # Build the new tree outside the lock so reads are not held up
+        fresh = Leaderboard()
+        for user_id, points in rows:
+            fresh._insert(int(user_id), points or 0)
+        with self._lock:
+            self._root, self._points = fresh._root, fresh._points
+            self.loaded_at = time.monotonic()
+
+    def refresh_if_stale(self):
+        """Reload from the database in the background once the data is too old
+
+        Returns True if a reload was started.  The caller keeps reading the
+        current data; a disabled interval (0) or a missing app never reloads.
+        """
+        if self.app is None or self.refresh_seconds <= 0:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if self._refreshing:
+                return False
+            if self.loaded_at is not None and now - self.loaded_at < self.refresh_seconds:
+                return False
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='leaderboard-refresh', daemon=True).start()
+        return True
+
+    def _refresh(self):
+        from services.points_ledger import current_totals
+
+        try:
+            with self.app.app_context():
+                rows = current_totals()
+            self.rebuild(rows)
+        except Exception as e:
+            print(f"⚠️  Leaderboard refresh failed: {e}")
+            with self._lock:
+                self.loaded_at = time.monotonic()  # retry after another interval
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def update(self, user_id, points):
+        """Insert a user or move them to their new points total"""
+        user_id = int(user_id)
+        points = points or 0
+        with self._lock:
+            current = self._points.get(user_id)
+            if current == points:
+                return
+            if current is not None:
+                self._root = _remove(self._root, (-current, user_id))
+                del self._points[user_id]
+            self._insert(user_id, points)
+
+    def remove(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            current = self._points.pop(user_id, None)
+            if current is not None:
+                self._root = _remove(self._root, (-current, user_id))
+
+    def rank(self, user_id):
+        """1-based rank of a user, or None if they are not ranked"""
+        user_id = int(user_id)
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return self._count_before((-points, user_id)) + 1
+
+    def points(self, user_id):
+        return self._points.get(int(user_id))
+
+    def top(self, limit):
+        """The first `limit` entries as (rank, user_id, points)"""
+        with self._lock:
+            return self._slice(0, limit)
+
+    def around(self, user_id, radius):
+        """Entries within `radius` places of a user, including the user"""
+        user_id = int(user_id)
+        with self._lock:
+            points = self._points.get(user_id)
+            if points is None:
+                return []
+            index = self._count_before((-points, user_id))
+            start = max(index - radius, 0)
+            return self._slice(start, index + radius + 1 - start)
+
+    def _insert(self, user_id, points):
+        key = (-points, user_id)
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+        self._points[user_id] = points
+
+    def _count_before(self, key):
+        count = 0
+        node = self._root
+        while node is not None:
+            if key <= node.key:
+                node = node.left
+            else:
+                count += _size(node.left) + 1
+                node = node.right
+        return count
+
+    def _select(self, index):
+        node = self._root
+        while node is not None:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.key
+            else:
+                index -= left_size + 1
+                node = node.right
+        return None
+
+    def _slice(self, start, count):
+        entries = []
+        for index in range(start, min(start + count, _size(self._root))):
+            negative_points, user_id = self._select(index)
+            entries.append((index + 1, user_id, -negative_points))
+        return entries
+
+
+leaderboard = Leaderboard()
+
+
+def rebuild_leaderboard():
+    """Load every user's points (including unfolded ledger entries) into the leaderboard"""
+    from services.points_ledger import current_totals
+
+    leaderboard.rebuild(current_totals())
+    return len(leaderboard)
@@ -0,0 +1,155 @@
+"""
+Retention job for the notifications table.
+
+Read notifications older than the retention window are copied to the
+``notifications_archive`` table (or appended to an NDJSON export file) and
+then deleted from the live table.  Work is done in small batches selected
+through the ``read_at`` index and committed one at a time, so no single
+transaction holds locks on the live table for long.
+
+Run it from the server directory:
+
+    python -m services.notification_retention --days 90 --batch-size 500
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from config.database import db
+from models.notification import Notification, NotificationArchive
+from services.cache import response_cache
+from services.sharding import on_shard, shard_indexes, shard_map
+
+ARCHIVE_MODES = ('table', 'file', 'none')
+
+ARCHIVED_COLUMNS = [
+    'id', 'user_id', 'title', 'message', 'type', 'status',
+    'created_at', 'sent_at', 'read_at'
+]
+
+
+def _serialize_row(row):
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    }
+
+
+def purge_read_notifications(retention_days, batch_size=500, archive_mode='table',
+                             archive_path=None, pause_seconds=0.0):
+    """Archive and delete read notifications older than `retention_days`.
+
+    Must be called inside an application context.  Returns a stats dict with
+    the number of rows moved, the batch count, elapsed time and rows/second.
+    """
+    if archive_mode not in ARCHIVE_MODES:
+        raise ValueError(f"archive_mode must be one of {', '.join(ARCHIVE_MODES)}")
+    if archive_mode == 'file' and not archive_path:
+        raise ValueError("archive_path is required when archive_mode is 'file'")
+    
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    table = Notification.__table__
+    columns = [table.c[name] for name in ARCHIVED_COLUMNS]
+    
+    # Deleted rows drop out of the index range, so every batch simply takes
+    # the oldest remaining rows below the cutoff
+    batch_query = (
+        select(*columns)
+        .where(table.c.read_at.isnot(None), table.c.read_at < cutoff)
+        .order_by(table.c.read_at)
+        .limit(batch_size)
+    )
+    
+    archive_file = open(archive_path, 'a', encoding='utf-8') if archive_mode == 'file' else None
+    purged = 0
+    batches = 0
+    started = time.perf_counter()
+    
+    try:
+        # Each shard holds its own users' notifications (one pass on the
+        # primary when sharding is off)
+        for shard in shard_indexes():
+            with on_shard(shard):
+                while True:
+                    # Users being moved to another shard are left for the next run
+                    moving = shard_map.moving()
+                    query = batch_query.where(table.c.user_id.notin_(moving)) if moving else batch_query
+                    rows = [dict(row) for row in db.session.execute(query).mappings()]
+                    if not rows:
+                        break
+                    
+                    try:
+                        if archive_mode == 'table':
+                            archived_at = datetime.utcnow()
+                            db.session.execute(
+                                insert(NotificationArchive.__table__),
+                                [dict(row, archived_at=archived_at) for row in rows]
+                            )
+                        elif archive_mode == 'file':
+                            archive_file.writelines(json.dumps(_serialize_row(row)) + '\n' for row in rows)
+                            archive_file.flush()
+                            os.fsync(archive_file.fileno())
+                        
+                        db.session.execute(
+                            delete(table).where(table.c.id.in_([row['id'] for row in rows]))
+                        )
+                        db.session.commit()
+                        
+                        for user_id in {row['user_id'] for row in rows}:
+                            response_cache.invalidate_user(user_id)
+                    except Exception:
+                        db.session.rollback()
+                        raise
+                    
+                    purged += len(rows)
+                    batches += 1
+                    if len(rows) < batch_size:
+                        break
+                    if pause_seconds:
+                        time.sleep(pause_seconds)
+    finally:
+        if archive_file:
+            archive_file.close()
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'purged': purged,
+        'batches': batches,
+        'archive_mode': archive_mode,
+        'cutoff': cutoff.isoformat(),
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(purged / elapsed, 1) if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Archive and purge old read notifications')
+    parser.add_argument('--days', type=int, help='retention window in days')
+    parser.add_argument('--batch-size', type=int, help='rows per batch')
+    parser.add_argument('--mode', choices=ARCHIVE_MODES, help='where archived rows go')
+    parser.add_argument('--path', help='export file for --mode file')
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between batches')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        stats = purge_read_notifications(
+            retention_days=args.days if args.days is not None else app.config['NOTIFICATION_RETENTION_DAYS'],
+            batch_size=args.batch_size or app.config['NOTIFICATION_PURGE_BATCH_SIZE'],
+            archive_mode=args.mode or app.config['NOTIFICATION_ARCHIVE_MODE'],
+            archive_path=args.path or app.config['NOTIFICATION_ARCHIVE_PATH'],
+            pause_seconds=args.pause
+        )
+    
+    print(f"🧹 Purged {stats['purged']} notifications in {stats['batches']} batches "
+          f"({stats['elapsed_seconds']}s, {stats['rows_per_second']} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Points ledger.
+
+Awards are appended to ``points_ledger`` instead of updating the user's row,
+so concurrent habit completions never contend on ``users``.  A user's total
+is ``users.points`` (everything folded so far, up to ``points_ledger_id``)
+plus the sum of newer ledger entries.  The fold moves pending entries into
+the row with a compare-and-set on the cursor, so it can run periodically
+from any process:
+
+    python -m services.points_ledger
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, update
+
+from config.database import db
+from models.points_ledger import PointsLedgerEntry
+from models.user import User
+from services.sharding import for_user, on_shard, shard_map, sharding_enabled
+
+POINTS_PER_LEVEL = 1000
+
+
+def level_for_points(points):
+    return (points // POINTS_PER_LEVEL) + 1
+
+
+def award_points(user_id, delta, reason, habit_id=None):
+    """Append a ledger entry to the current session (the caller commits)"""
+    entry = PointsLedgerEntry(user_id=user_id, delta=delta, reason=reason, habit_id=habit_id)
+    db.session.add(entry)
+    return entry
+
+
+def pending_points(user_id, folded_through):
+    """Sum of ledger entries not yet folded into users.points"""
+    with for_user(user_id):
+        return db.session.query(func.coalesce(func.sum(PointsLedgerEntry.delta), 0)).filter(
+            PointsLedgerEntry.user_id == user_id,
+            PointsLedgerEntry.id > (folded_through or 0)
+        ).scalar()
+
+
+def _sharded_pending(cursors, settled_before=None, chunk_size=200):
+    """{user_id: (delta, last_id)} of unfolded entries when the ledger is sharded
+
+    `cursors` maps user ids to their points_ledger_id.  The ledger cannot be
+    joined with users across databases, so each shard is asked for its users'
+    entries above their cursor, a chunk of users per query.
+    """
+    by_shard = {}
+    for user_id, shard in shard_map.assignments(cursors).items():
+        by_shard.setdefault(shard, []).append(user_id)
+    
+    pending = {}
+    for shard, user_ids in by_shard.items():
+        with on_shard(shard):
+            for start in range(0, len(user_ids), chunk_size):
+                chunk = user_ids[start:start + chunk_size]
+                query = db.session.query(
+                    PointsLedgerEntry.user_id,
+                    func.sum(PointsLedgerEntry.delta),
+                    func.max(PointsLedgerEntry.id)
+                ).filter(or_(*[
+                    and_(PointsLedgerEntry.user_id == user_id, PointsLedgerEntry.id > (cursors[user_id] or 0))
+                    for user_id in chunk
+                ]))
+                if settled_before is not None:
+                    query = query.filter(PointsLedgerEntry.created_at < settled_before)
+                for user_id, delta, last_id in query.group_by(PointsLedgerEntry.user_id):
+                    pending[user_id] = (delta, last_id)
+    return pending
+
+
+def current_totals():
+    """Live (user_id, points) for every user, used to rebuild the leaderboard"""
+    if sharding_enabled():
+        users = db.session.query(User.id, func.coalesce(User.points, 0), User.points_ledger_id).all()
+        pending = _sharded_pending({user_id: cursor for user_id, _, cursor in users})
+        return [(user_id, points + pending.get(user_id, (0, None))[0]) for user_id, points, _ in users]
+    
+    return db.session.query(
+        User.id,
+        func.coalesce(User.points, 0) + func.coalesce(func.sum(PointsLedgerEntry.delta), 0)
+    ).outerjoin(
+        PointsLedgerEntry,
+        (PointsLedgerEntry.user_id == User.id) & (PointsLedgerEntry.id > User.points_ledger_id)
+    ).group_by(User.id, User.points).all()
+
+
+def fold_pending(batch_size=500, settle_seconds=60):
+    """Fold pending ledger entries into users.points/level; returns users updated
+
+    Only entries older than `settle_seconds` are folded.  Ids are allocated
+    at insert time, so a younger entry may still be uncommitted behind a
+    committed one with a higher id; moving the cursor past it would lose it.
+    """
+    if sharding_enabled():
+        return _fold_pending_sharded(batch_size, settle_seconds)
+    
+    folded = 0
+    while True:
+        settled_before = datetime.utcnow() - timedelta(seconds=settle_seconds)
+        pending = db.session.query(
+            PointsLedgerEntry.user_id,
+            func.sum(PointsLedgerEntry.delta).label('delta'),
+            func.max(PointsLedgerEntry.id).label('last_id'),
+            User.points,
+            User.level,
+            User.points_ledger_id
+        ).join(User, User.id == PointsLedgerEntry.user_id).filter(
+            PointsLedgerEntry.id > User.points_ledger_id,
+            PointsLedgerEntry.created_at < settled_before
+        ).group_by(
+            PointsLedgerEntry.user_id, User.points, User.level, User.points_ledger_id
+        ).limit(batch_size).all()
+        
+        if not pending:
+            return folded
+        
+        for row in pending:
+            folded += _apply_fold(row.user_id, row.points, row.level, row.points_ledger_id, row.delta, row.last_id)
+        db.session.commit()
+        
+        if len(pending) < batch_size:
+            return folded
+
+
+def _fold_pending_sharded(batch_size, settle_seconds):
+    """fold_pending for a sharded ledger: walk users in id order, ask their shards"""
+    folded = 0
+    last_user_id = 0
+    while True:
+        settled_before = datetime.utcnow() - timedelta(seconds=settle_seconds)
+        users = db.session.query(
+            User.id, User.points, User.level, User.points_ledger_id
+        ).filter(User.id > last_user_id).order_by(User.id).limit(batch_size).all()
+        if not users:
+            return folded
+        last_user_id = users[-1].id
+        
+        pending = _sharded_pending({user.id: user.points_ledger_id for user in users}, settled_before)
+        for user in users:
+            if user.id in pending:
+                delta, last_id = pending[user.id]
+                folded += _apply_fold(user.id, user.points, user.level, user.points_ledger_id, delta, last_id)
+        db.session.commit()
+
+
+def _apply_fold(user_id, points, level, folded_through, delta, last_id):
+    points = (points or 0) + delta
+    # Only apply the fold if nobody else moved the cursor meanwhile
+    result = db.session.execute(
+        update(User.__table__)
+        .where(User.__table__.c.id == user_id,
+               User.__table__.c.points_ledger_id == folded_through)
+        .values(
+            points=points,
+            level=max(level or 1, level_for_points(points)),
+            points_ledger_id=last_id
+        )
+    )
+    return result.rowcount
+
+
+def main():
+    import argparse
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Fold the points ledger into users.points')
+    parser.add_argument('--settle-seconds', type=int, default=60,
+                        help='only fold entries older than this')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        folded = fold_pending(settle_seconds=args.settle_seconds)
+    print(f"✅ Folded points ledger into {folded} users")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""
+On-demand profiling of a single request.
+
+An admin adds ``X-Profile: 1`` (or ``?profile=1``) to any API request and
+that one request runs under a profiler:
+
+* ``cprofile`` (default) - deterministic: exact call counts and times for
+  every function, at the cost of slowing the request down
+* ``sample`` - a thread samples the request's stack every
+  PROFILER_SAMPLE_INTERVAL_MS; cheap, but short requests get few samples
+
+Pick one with ``X-Profile: sample`` / ``?profile=cprofile``.  Either way the
+profile holds a call tree, the hottest functions, the stacks in the
+collapsed one-line-per-stack format read by flamegraph.pl and speedscope,
+and every SQL statement the request sent (timed, parameters redacted).  It
+is written as JSON to PROFILER_DIR - shared by all workers on the host - and
+the response carries its id in ``X-Profile-Id``; fetch it from
+``GET /api/admin/profiles/<id>`` (``?format=collapsed`` for the flame
+graph input).  Only the newest PROFILER_KEEP profiles are kept.
+
+Requests without the flag only pay for one header and one query string
+lookup; a non-admin's flag is ignored.
+"""
+import cProfile
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+
+from flask import g, request
+
+from services.admin import current_user_is_admin
+from services.sql_instrumentation import count_queries
+
+MODES = ('cprofile', 'sample')
+TOP_FUNCTIONS = 30
+MAX_TREE_DEPTH = 60
+MIN_TREE_SHARE = 0.005  # call tree nodes under 0.5% of the request are pruned
+
+
+def _short_path(filename):
+    for marker in ('site-packages' + os.sep, 'server' + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    return filename
+
+
+def _label(filename, line, name):
+    # ';' separates frames in collapsed stacks
+    return f"{name} ({_short_path(filename)}:{line})".replace(';', ',')
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread"""
+    
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+
+def _tree_from_stacks(stacks, total_ms):
+    """Merge sampled root-to-leaf stacks into a call tree weighted in ms"""
+    total = sum(stacks.values()) or 1
+    root = {'children': {}, 'samples': 0, 'self': 0}
+    for stack, count in stacks.items():
+        node = root
+        for frame in stack:
+            node = node['children'].setdefault(frame, {'children': {}, 'samples': 0, 'self': 0})
+            node['samples'] += count
+        node['self'] += count
+    
+    def convert(name, node, depth):
+        children = [
+            convert(child_name, child, depth + 1)
+            for child_name, child in sorted(node['children'].items(), key=lambda item: -item[1]['samples'])
+            if child['samples'] / total >= MIN_TREE_SHARE and depth < MAX_TREE_DEPTH
+        ]
+        return {
+            'function': name,
+            'samples': node['samples'],
+            'cumulative_ms': round(total_ms * node['samples'] / total, 3),
+            'self_ms': round(total_ms * node['self'] / total, 3),
+            'children': children
+        }
+    
+    return [convert(name, node, 1) for name, node in sorted(root['children'].items(), key=lambda item: -item[1]['samples'])]
+
+
+def _from_samples(sampler, total_ms):
+    self_samples = Counter()
+    for stack, count in sampler.stacks.items():
+        self_samples[stack[-1]] += count
+    total = sampler.samples or 1
+    return {
+        'samples': sampler.samples,
+        'call_tree': _tree_from_stacks(sampler.stacks, total_ms),
+        'functions': [
+            {'function': name, 'samples': count, 'self_ms': round(total_ms * count / total, 3)}
+            for name, count in self_samples.most_common(TOP_FUNCTIONS)
+        ],
+        'collapsed': '\n'.join(f"{';'.join(stack)} {count}" for stack, count in sampler.stacks.items())
+    }
+
+
+def _from_cprofile(profile):
+    """Call tree, top functions and collapsed stacks from cProfile's caller/callee pairs
+
+    cProfile records time per (caller, callee) edge, not whole stacks, so a
+    function reached along several paths has its callees split between the
+    paths in proportion to the time each path spent in it.
+    """
+    stats = pstats.Stats(profile).stats
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[function] = edge
+    roots = [function for function, entry in stats.items() if not entry[4]]
+    total = sum(stats[root][3] for root in roots) or 1e-9
+    collapsed = Counter()
+    
+    def build(function, calls, self_time, cumulative, path, depth):
+        label = _label(*function)
+        stack = path + (label,)
+        collapsed[';'.join(stack)] += int(self_time * 1e6)  # microseconds
+        share = cumulative / stats[function][3] if stats[function][3] else 0
+        children = []
+        if depth < MAX_TREE_DEPTH:
+            for callee, (_, callee_calls, callee_self, callee_cumulative) in sorted(
+                callees.get(function, {}).items(), key=lambda item: -item[1][3]
+            ):
+                if callee_cumulative * share / total < MIN_TREE_SHARE or _label(*callee) in stack:
+                    continue
+                children.append(build(callee, callee_calls, callee_self * share,
+                                      callee_cumulative * share, stack, depth + 1))
+        return {
+            'function': label,
+            'calls': calls,
+            'cumulative_ms': round(cumulative * 1000, 3),
+            'self_ms': round(self_time * 1000, 3),
+            'children': children
+        }
+    
+    tree = [build(root, stats[root][1], stats[root][2], stats[root][3], (), 1)
+            for root in sorted(roots, key=lambda root: -stats[root][3])]
+    functions = sorted(stats.items(), key=lambda item: -item[1][3])[:TOP_FUNCTIONS]
+    return {
+        'call_tree': tree,
+        'functions': [
+            {
+                'function': _label(*function),
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'self_ms': round(self_time * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3)
+            }
+            for function, (primitive_calls, calls, self_time, cumulative, _) in functions
+        ],
+        'collapsed': '\n'.join(f'{stack} {weight}' for stack, weight in collapsed.items() if weight > 0)
+    }
+
+
+class RequestProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.keep = 50
+        self.sample_interval = 0.002
+        self.default_mode = 'cprofile'
+    
+    def init_app(self, app):
+        self.enabled = app.config.get('PROFILER_ENABLED', True)
+        app.extensions['request_profiler'] = self
+        if not self.enabled:
+            return
+        
+        self.directory = app.config.get('PROFILER_DIR') or os.path.join(tempfile.gettempdir(), 'stride_streak_profiles')
+        self.keep = app.config.get('PROFILER_KEEP', 50)
+        self.sample_interval = app.config.get('PROFILER_SAMPLE_INTERVAL_MS', 2) / 1000
+        self.default_mode = app.config.get('PROFILER_DEFAULT_MODE', 'cprofile')
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._cleanup)
+    
+    def after_fork(self):
+        """Nothing to reset: profiles live in PROFILER_DIR and each run's state in ``g``"""
+    
+    def _requested_mode(self):
+        flag = request.headers.get('X-Profile') or request.args.get('profile')
+        if not flag:
+            return None
+        flag = flag.strip().lower()
+        if flag in MODES:
+            return flag
+        return self.default_mode if flag in ('1', 'true', 'yes') else None
+    
+    def _start(self):
+        mode = self._requested_mode()
+        if mode is None or not current_user_is_admin():
+            return None
+        
+        stack = ExitStack()
+        cost = stack.enter_context(count_queries(timed=True))
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            stack.callback(profiler.disable)
+            profiler.enable()
+        else:
+            profiler = StackSampler(threading.get_ident(), self.sample_interval)
+            stack.callback(profiler.stop)
+            profiler.start()
+        g.request_profile = {'mode': mode, 'stack': stack, 'cost': cost, 'profiler': profiler,
+                             'started': time.perf_counter()}
+        return None
+    
+    def _finish(self, response):
+        state = g.pop('request_profile', None)
+        if state is None:
+            return response
+        
+        state['stack'].close()
+        total_ms = (time.perf_counter() - state['started']) * 1000
+        if state['mode'] == 'cprofile':
+            details = _from_cprofile(state['profiler'])
+        else:
+            details = _from_samples(state['profiler'], total_ms)
+        
+        profile_id = uuid.uuid4().hex[:16]
+        cost = state['cost']
+        profile = {
+            'id': profile_id,
+            'created_at': datetime.utcnow().isoformat(),
+            'mode': state['mode'],
+            'request': {
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code
+            },
+            'total_ms': round(total_ms, 3),
+            'sql': {
+                'queries': cost.queries,
+                'total_ms': round(sum(timing['duration_ms'] for timing in cost.timings), 3),
+                'statements': cost.timings
+            },
+            **details
+        }
+        try:
+            self._save(profile, state['profiler'] if state['mode'] == 'cprofile' else None)
+            response.headers['X-Profile-Id'] = profile_id
+        except OSError as e:
+            print(f"⚠️  Could not store request profile: {e}")
+        return response
+    
+    def _cleanup(self, exc=None):
+        # after_request does not run when the request fails before a response exists
+        state = g.pop('request_profile', None)
+        if state is not None:
+            state['stack'].close()
+    
+    def _save(self, profile, cprofile_stats):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{profile['id']}.json")
+        with open(path + '.tmp', 'w') as handle:
+            json.dump(profile, handle, default=str)
+        os.replace(path + '.tmp', path)
+        if cprofile_stats is not None:
+            # Also loadable with pstats / snakeviz
+            cprofile_stats.dump_stats(os.path.join(self.directory, f"{profile['id']}.prof"))
+        self._prune()
+    
+    def _prune(self):
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in profiles[:-self.keep] if self.keep else []:
+            for suffix in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, entry.name[:-5] + suffix))
+                except FileNotFoundError:
+                    pass
+    
+    def path(self, profile_id, suffix='.json'):
+        """File of a stored profile, or None (ids are hex, so no path tricks)"""
+        if not profile_id.isalnum() or self.directory is None:
+            return None
+        path = os.path.join(self.directory, profile_id + suffix)
+        return path if os.path.exists(path) else None
+    
+    def load(self, profile_id):
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        with open(path) as handle:
+            return json.load(handle)
+    
+    def recent(self, limit=None):
+        """Summaries of stored profiles, newest first"""
+        if self.directory is None or not os.path.isdir(self.directory):
+            return []
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+            key=lambda entry: -entry.stat().st_mtime
+        )[:limit]
+        summaries = []
+        for entry in entries:
+            try:
+                with open(entry.path) as handle:
+                    profile = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                'id': profile['id'],
+                'created_at': profile['created_at'],
+                'mode': profile['mode'],
+                'request': profile['request'],
+                'total_ms': profile['total_ms'],
+                'queries': profile['sql']['queries']
+            })
+        return summaries
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,437 @@
+"""
+Push notifications.
+
+Notifications of type ``push`` or ``both`` go to every device the user
+registered (``device_tokens``, one row per app install, on the user's
+shard) through the provider named by PUSH_PROVIDER:
+
+* ``none`` - push is off (the default)
+* ``log`` - prints each message; for development
+* ``http`` - POSTs batches of messages as JSON to PUSH_PROVIDER_URL
+
+``fan_out()`` splits the messages into batches of the provider's size
+(PUSH_BATCH_SIZE) and sends them from up to PUSH_CONCURRENCY threads over
+one pooled keep-alive session, so pushing to thousands of devices costs a
+handful of requests and connections rather than one of each per device.
+The same limit caps the batches in flight across every request and job of
+a process.  Messages the provider could not take (timeouts, 429, 5xx,
+``unavailable``) are retried PUSH_MAX_RETRIES times with backoff; tokens it
+reports as ``invalid_token`` or ``unregistered`` are deleted, since sending
+to them again can never succeed.
+
+The ``http`` protocol, one request per batch::
+
+    POST PUSH_PROVIDER_URL   {"messages": [{"token", "title", "body", "data"}, ...]}
+    200                      {"results": [{"status": "ok"}, {"status": "unregistered"}, ...]}
+
+with one result per message, in order.  A gateway in front of FCM or APNs
+speaks it; other providers plug in as ``PushProvider`` subclasses in
+``PROVIDERS``.  ``StandInReceiver`` answers it locally for tests and
+benchmarks:
+
+    python -m services.push serve --port 8099
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PushMessage = namedtuple('PushMessage', 'user_id token title body data')
+
+# Outcome of one message
+SENT = 'sent'
+INVALID = 'invalid'  # the token will never work again: delete it
+RETRY = 'retry'      # the provider could not take it now
+FAILED = 'failed'    # rejected or out of retries
+
+PERMANENT_ERRORS = {'invalid_token', 'unregistered'}
+RETRYABLE_HTTP_STATUS = {429, 500, 502, 503, 504}
+
+
+class PushProvider:
+    """Sends one batch of messages and returns the status of each, in order"""
+    max_batch = 1
+    
+    def send_batch(self, messages):
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class LogProvider(PushProvider):
+    max_batch = 500
+    
+    def send_batch(self, messages):
+        for message in messages:
+            print(f"📱 Push to user {message.user_id} ({message.token[:12]}...): {message.title}")
+        return [SENT] * len(messages)
+
+
+def _result_status(result):
+    status = result.get('status') if isinstance(result, dict) else None
+    if status == 'ok':
+        return SENT
+    if status in PERMANENT_ERRORS:
+        return INVALID
+    if status == 'unavailable':
+        return RETRY
+    return FAILED
+
+
+class HttpProvider(PushProvider):
+    """The JSON batch protocol over a pooled keep-alive session"""
+    
+    def __init__(self, url, api_key=None, max_batch=500, pool_size=8, timeout=10):
+        self.url = url
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.session = requests.Session()
+        # pool_block: threads wait for a pooled connection instead of opening extra ones
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if api_key:
+            self.session.headers['Authorization'] = f'Bearer {api_key}'
+    
+    def send_batch(self, messages):
+        payload = {'messages': [
+            {'token': message.token, 'title': message.title, 'body': message.body, 'data': message.data or {}}
+            for message in messages
+        ]}
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"⚠️  Push provider unreachable: {e}")
+            return [RETRY] * len(messages)
+        
+        if response.status_code in RETRYABLE_HTTP_STATUS:
+            return [RETRY] * len(messages)
+        if response.status_code != 200:
+            print(f"⚠️  Push provider rejected a batch of {len(messages)}: "
+                  f"HTTP {response.status_code} {response.text[:200]}")
+            return [FAILED] * len(messages)
+        try:
+            results = response.json()['results']
+        except (ValueError, KeyError, TypeError):
+            results = None
+        if not isinstance(results, list) or len(results) != len(messages):
+            print(f"⚠️  Push provider sent an unreadable answer for a batch of {len(messages)}")
+            return [FAILED] * len(messages)
+        return [_result_status(result) for result in results]
+    
+    def close(self):
+        self.session.close()
+
+
+PROVIDERS = {
+    'log': lambda config: LogProvider(),
+    'http': lambda config: HttpProvider(
+        config['PUSH_PROVIDER_URL'],
+        api_key=config.get('PUSH_PROVIDER_API_KEY'),
+        max_batch=config.get('PUSH_BATCH_SIZE', 500),
+        pool_size=config.get('PUSH_CONCURRENCY', 8),
+        timeout=config.get('PUSH_TIMEOUT_SECONDS', 10)
+    ),
+}
+
+
+def _send_batches(provider, batches, concurrency, slots):
+    def send(batch):
+        try:
+            if slots is None:
+                return provider.send_batch(batch)
+            with slots:
+                return provider.send_batch(batch)
+        except Exception as e:
+            print(f"⚠️  Push batch of {len(batch)} failed: {e}")
+            return [RETRY] * len(batch)
+    
+    if len(batches) <= 1 or concurrency <= 1:
+        return [(batch, send(batch)) for batch in batches]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(batches)), thread_name_prefix='push') as pool:
+        return list(zip(batches, pool.map(send, batches)))
+
+
+def fan_out(provider, messages, concurrency=8, max_retries=0, retry_delay=0.2, slots=None):
+    """Send `messages` in provider-sized batches from up to `concurrency` threads
+
+    Returns ({SENT, INVALID, FAILED: message count, 'batches', 'retried'},
+    messages whose token is invalid).  `slots` is a semaphore shared with
+    other callers to bound the batches in flight.
+    """
+    counts = {SENT: 0, INVALID: 0, FAILED: 0, 'batches': 0, 'retried': 0}
+    invalid = []
+    pending = list(messages)
+    for attempt in range(max_retries + 1):
+        if attempt:
+            counts['retried'] += len(pending)
+            time.sleep(retry_delay * 2 ** (attempt - 1) * random.uniform(0.8, 1.2))
+        size = max(provider.max_batch, 1)
+        batches = [pending[start:start + size] for start in range(0, len(pending), size)]
+        pending = []
+        for batch, statuses in _send_batches(provider, batches, concurrency, slots):
+            counts['batches'] += 1
+            for message, status in zip(batch, statuses):
+                if status == RETRY:
+                    pending.append(message)
+                    continue
+                counts[status] += 1
+                if status == INVALID:
+                    invalid.append(message)
+        if not pending:
+            break
+    counts[FAILED] += len(pending)
+    return counts, invalid
+
+
+def device_tokens(user_ids):
+    """{user_id: [token, ...]} for the given users, one query per shard"""
+    from models.device_token import DeviceToken
+    from services.sharding import on_shard, shard_map, sharding_enabled
+    
+    user_ids = list(set(user_ids))
+    shards = shard_map.assignments(user_ids) if sharding_enabled() else dict.fromkeys(user_ids)
+    tokens = {}
+    for shard in set(shards.values()):
+        ids = [user_id for user_id, user_shard in shards.items() if user_shard == shard]
+        with on_shard(shard):
+            rows = DeviceToken.query.with_entities(DeviceToken.user_id, DeviceToken.token).filter(
+                DeviceToken.user_id.in_(ids)
+            ).all()
+        for user_id, token in rows:
+            tokens.setdefault(user_id, []).append(token)
+    return tokens
+
+
+def remove_tokens(messages):
+    """Delete the device tokens of `messages`; returns the number of rows removed"""
+    from config.database import db
+    from models.device_token import DeviceToken
+    from services.sharding import on_shard, shard_map, sharding_enabled
+    
+    by_user = {}
+    for message in messages:
+        by_user.setdefault(message.user_id, set()).add(message.token)
+    # Tokens of a user being moved stay; the next push to them removes them
+    for user_id in shard_map.moving():
+        by_user.pop(user_id, None)
+    shards = shard_map.assignments(list(by_user)) if sharding_enabled() else dict.fromkeys(by_user)
+    removed = 0
+    for shard in set(shards.values()):
+        with on_shard(shard):
+            for user_id in [user_id for user_id, user_shard in shards.items() if user_shard == shard]:
+                removed += DeviceToken.query.filter(
+                    DeviceToken.user_id == user_id,
+                    DeviceToken.token.in_(by_user[user_id])
+                ).delete(synchronize_session=False)
+            db.session.commit()
+    return removed
+
+
+class PushService:
+    """Per-process provider, connection pool and in-flight limit"""
+    
+    def __init__(self):
+        self.app = None
+        self._provider = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = None
+        self.stats = {'messages': 0, SENT: 0, INVALID: 0, FAILED: 0, 'batches': 0, 'retried': 0,
+                      'tokens_removed': 0}
+    
+    def init_app(self, app):
+        self.app = app
+        app.extensions['push'] = self
+        self._slots = threading.BoundedSemaphore(max(app.config.get('PUSH_CONCURRENCY', 8), 1))
+    
+    def after_fork(self):
+        """Drop the master's provider (pooled session, sender threads) and in-flight slots"""
+        self._lock = threading.Lock()
+        self._provider = None
+        self._pid = None
+        if self.app is not None:
+            self._slots = threading.BoundedSemaphore(max(self.app.config.get('PUSH_CONCURRENCY', 8), 1))
+    
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('PUSH_PROVIDER', 'none') in PROVIDERS
+    
+    @property
+    def provider(self):
+        if self._provider is None or self._pid != os.getpid():
+            with self._lock:
+                if self._provider is None or self._pid != os.getpid():
+                    # Forked workers must not share the parent's pooled sockets
+                    self._provider = PROVIDERS[self.app.config['PUSH_PROVIDER']](self.app.config)
+                    self._pid = os.getpid()
+        return self._provider
+    
+    def deliver(self, messages):
+        """Send `messages` now and delete tokens the provider rejected; returns the counts"""
+        if not messages or not self.enabled:
+            return {SENT: 0, INVALID: 0, FAILED: 0, 'batches': 0, 'retried': 0}
+        
+        config = self.app.config
+        counts, invalid = fan_out(
+            self.provider, messages,
+            concurrency=config.get('PUSH_CONCURRENCY', 8),
+            max_retries=config.get('PUSH_MAX_RETRIES', 2),
+            retry_delay=config.get('PUSH_RETRY_BASE_MS', 200) / 1000,
+            slots=self._slots
+        )
+        removed = remove_tokens(invalid) if invalid else 0
+        if removed:
+            print(f"🧹 Removed {removed} push token{'s' if removed != 1 else ''} the provider rejected")
+        with self._lock:
+            self.stats['messages'] += len(messages)
+            self.stats['tokens_removed'] += removed
+            for key, value in counts.items():
+                self.stats[key] += value
+        return counts
+    
+    def push_to_users(self, users, title, body, data=None):
+        """Push one message to every device of the `users` who allow push"""
+        wanted = [user.id for user in users if (user.notification_preferences or {}).get('push', True)]
+        if not wanted or not self.enabled:
+            return self.deliver([])
+        messages = [
+            PushMessage(user_id, token, title, body, data or {})
+            for user_id, tokens in device_tokens(wanted).items()
+            for token in tokens
+        ]
+        return self.deliver(messages)
+
+
+push_service = PushService()
+
+
+# Local stand-in provider
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep connections open between batches
+    disable_nagle_algorithm = True  # the body is a second write; don't hold it for the headers' ACK
+    
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats['connections'] += 1
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._reply(404, {'error': 'Not found'})
+        with self.server.lock:
+            stats = dict(self.server.stats)
+        return self._reply(200, stats)
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            messages = json.loads(body)['messages']
+            tokens = [message['token'] for message in messages]
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {'error': 'Expected {"messages": [{"token": ...}]}'})
+        if len(messages) > self.server.max_batch:
+            return self._reply(413, {'error': f'At most {self.server.max_batch} messages per request'})
+        
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        server = self.server
+        with server.lock:
+            results = []
+            for token in tokens:
+                if str(token).startswith('invalid-'):
+                    results.append({'status': 'unregistered', 'error': 'Token is not registered'})
+                elif server.fail_rate and server.rng.random() < server.fail_rate:
+                    results.append({'status': 'unavailable'})
+                else:
+                    results.append({'status': 'ok'})
+            server.stats['batches'] += 1
+            server.stats['messages'] += len(messages)
+            server.stats['delivered'] += sum(1 for result in results if result['status'] == 'ok')
+        return self._reply(200, {'results': results})
+
+
+class StandInReceiver(ThreadingHTTPServer):
+    """Answers the ``http`` provider protocol without delivering anything
+
+    Tokens starting with ``invalid-`` are ``unregistered``; a `fail_rate`
+    share of the others is ``unavailable``.  Batches over `max_batch` get a
+    413.  ``GET /stats`` counts connections, batches and messages received.
+    """
+    daemon_threads = True
+    
+    def __init__(self, address=('127.0.0.1', 8099), max_batch=500, latency_ms=0, fail_rate=0.0, seed=None):
+        super().__init__(address, _StandInHandler)
+        self.max_batch = max_batch
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'batches': 0, 'messages': 0, 'delivered': 0}
+    
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/send'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Push notification tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='run the local stand-in provider')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8099)
+    serve_parser.add_argument('--max-batch', type=int, default=500)
+    serve_parser.add_argument('--latency-ms', type=float, default=0, help='delay before answering each batch')
+    serve_parser.add_argument('--fail-rate', type=float, default=0, help='share of messages answered unavailable')
+    send_parser = commands.add_parser('send', help='push a message to users through the configured provider')
+    send_parser.add_argument('--user-id', type=int, action='append', required=True)
+    send_parser.add_argument('--title', default='Test notification')
+    send_parser.add_argument('--message', default='Push notifications are working')
+    args = parser.parse_args()
+    
+    if args.command == 'serve':
+        receiver = StandInReceiver((args.host, args.port), max_batch=args.max_batch,
+                                   latency_ms=args.latency_ms, fail_rate=args.fail_rate)
+        print(f"📱 Stand-in push provider on {receiver.url}")
+        try:
+            receiver.serve_forever()
+        except KeyboardInterrupt:
+            print(f"🛑 Stopping; received {json.dumps(receiver.stats)}")
+        return
+    
+    from app import create_app
+    from models.user import User
+    
+    app = create_app()
+    with app.app_context():
+        if not push_service.enabled:
+            print(f"❌ PUSH_PROVIDER '{app.config.get('PUSH_PROVIDER')}' is not one of {', '.join(PROVIDERS)}")
+            return
+        users = User.query.filter(User.id.in_(args.user_id)).all()
+        print(json.dumps(push_service.push_to_users(users, args.title, args.message), indent=2))
+
+
+if __name__ == '__main__':
+    main()
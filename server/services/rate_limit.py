@@ -0,0 +1,253 @@
+"""
+Token-bucket rate limiting for blueprint routes.
+
+Each limit is a bucket holding up to ``count`` tokens that refills at
+``count / period`` tokens per second; a request spends one token and is
+rejected with ``429`` when the bucket is empty.  Buckets are keyed per
+client IP and/or per account: the JWT identity on authenticated routes, the
+e-mail in the request body only where there is no JWT (login).  Behind a
+reverse proxy set TRUSTED_PROXIES so the client IP comes from
+``X-Forwarded-For`` instead of being the proxy's address.
+
+Two backends are available:
+
+* ``memory`` - a dict in the worker process (default, single worker)
+* ``sqlite`` - a small SQLite file shared by every worker on the host; put
+  it on tmpfs (``/dev/shm``) so it behaves like shared memory
+
+Routes opt in with the decorator, and ``RATE_LIMITS`` in the config can
+override the limits per endpoint::
+
+    @auth_bp.route('/login', methods=['POST'])
+    @rate_limit(ip='20/minute', account='5/minute')
+    def login(): ...
+
+    RATE_LIMITS = {'auth.login': {'ip': '50/minute', 'account': '10/minute'}}
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt_identity
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+
+def parse_limit(spec):
+    """Turn '10/minute' into (capacity, refill rate per second)"""
+    count, _, period = spec.partition('/')
+    period = period.strip().rstrip('s')
+    if period not in PERIODS:
+        raise ValueError(f"Unknown rate limit period in '{spec}'")
+    capacity = float(count)
+    return capacity, capacity / PERIODS[period]
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Buckets in a dict guarded by a lock (one worker process)"""
+    
+    def __init__(self, max_keys=100000):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+    
+    def consume(self, key, capacity, rate, now):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], capacity, rate, now)
+            
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False, (1 - tokens) / rate
+            
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self._max_keys:
+                self._evict(now)
+            return True, 0.0
+    
+    def _evict(self, now):
+        # Buckets idle for a minute or more are close to full; forgetting
+        # them only hands those clients a fresh bucket
+        stale = [key for key, (_, updated) in self._buckets.items() if now - updated > 60]
+        for key in stale:
+            del self._buckets[key]
+    
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+    
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by every worker process on the host"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+    
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+    
+    def consume(self, key, capacity, rate, now):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens = capacity if row is None else _refill(row[0], row[1], capacity, rate, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                (key, tokens, now)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return (True, 0.0) if allowed else (False, (1 - tokens) / rate)
+    
+    def reset(self):
+        self._connection().execute("DELETE FROM rate_limit_buckets")
+    
+    def after_fork(self):
+        # SQLite connections must not be shared with the parent process
+        self._local = threading.local()
+
+
+class RateLimiter:
+    """Flask extension holding the backend and per-endpoint overrides"""
+    
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = True
+        self.overrides = {}
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        overrides = app.config.get('RATE_LIMITS') or {}
+        if isinstance(overrides, str):
+            overrides = json.loads(overrides)
+        self.overrides = overrides
+        
+        backend = app.config.get('RATE_LIMIT_BACKEND', 'memory')
+        if backend == 'sqlite':
+            path = app.config.get('RATE_LIMIT_STORAGE_PATH') or os.path.join(
+                tempfile.gettempdir(), 'stride_streak_rate_limits.db'
+            )
+            self.backend = SQLiteBackend(path)
+        elif backend == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown RATE_LIMIT_BACKEND '{backend}'")
+        app.extensions['rate_limiter'] = self
+    
+    def after_fork(self):
+        if self.backend is not None:
+            self.backend.after_fork()
+    
+    def rules_for(self, endpoint, defaults):
+        """Parsed (scope, capacity, rate) rules for an endpoint"""
+        limits = dict(defaults)
+        limits.update(self.overrides.get(endpoint, {}))
+        return [(scope, *parse_limit(spec)) for scope, spec in limits.items() if spec]
+    
+    def check(self, rules):
+        """Spend a token from every bucket; returns seconds to wait, or None"""
+        now = time.monotonic() if isinstance(self.backend, MemoryBackend) else time.time()
+        for scope, capacity, rate in rules:
+            identity = _client_key(scope)
+            if identity is None:
+                continue
+            allowed, retry_after = self.backend.consume(
+                f"{request.endpoint}:{scope}:{identity}", capacity, rate, now
+            )
+            if not allowed:
+                return retry_after
+        return None
+
+
+rate_limiter = RateLimiter()
+
+
+def _client_key(scope):
+    if scope == 'ip':
+        return request.remote_addr or 'unknown'
+    if scope == 'account':
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:
+            identity = None
+        if identity is not None:
+            # Never the body here: a client could name a fresh bucket on every request
+            return f'user:{identity}'
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and isinstance(data.get('email'), str):
+            return data['email'].strip().lower() or None
+        return None
+    raise ValueError(f"Unknown rate limit scope '{scope}'")
+
+
+def rate_limit(ip=None, account=None):
+    """Limit a view per client IP and/or per account, e.g. ip='10/minute'"""
+    defaults = {'ip': ip, 'account': account}
+    
+    def decorator(view):
+        rules_cache = {}
+        
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not rate_limiter.enabled or rate_limiter.backend is None:
+                return view(*args, **kwargs)
+            
+            rules = rules_cache.get(request.endpoint)
+            if rules is None:
+                rules = rules_cache[request.endpoint] = rate_limiter.rules_for(request.endpoint, defaults)
+            
+            retry_after = rate_limiter.check(rules)
+            if retry_after is not None:
+                wait = max(int(retry_after + 0.999), 1)
+                response = jsonify({
+                    'error': 'Too many requests',
+                    'message': f'Too many attempts. Please try again in {wait} seconds.',
+                    'retry_after': wait
+                })
+                response.headers['Retry-After'] = str(wait)
+                return response, 429
+            
+            return view(*args, **kwargs)
+        
+        return wrapper
+    
+    return decorator
@@ -0,0 +1,236 @@
+"""
+Full-text search over habits and todos.
+
+``GET /api/search?q=`` matches words (and word prefixes) in ``habits.title``,
+``habits.description`` and ``todos.text`` through the database's own
+full-text index:
+
+* MySQL - ``FULLTEXT`` indexes queried with ``MATCH ... AGAINST`` in boolean
+  mode
+* SQLite - FTS5 tables (``habits_fts``, ``todos_fts``) using the base tables
+  as external content and kept in step by triggers
+
+The FTS5 tables also index ``user_id``, so a query intersects the user's
+posting list with the search terms instead of collecting every user's
+matches and filtering afterwards, and keep prefix indexes so ``"ab"*`` reads
+one posting list rather than merging every word starting with "ab".  bm25()
+is not used there: it counts each term's documents across the whole table,
+which for common words costs more than the search itself.  The user's
+matches (at most MAX_CANDIDATES, newest first) are ranked in Python instead.
+``ensure_search_indexes`` creates whatever is missing on the primary (or
+every shard) at startup; it is idempotent.
+"""
+import re
+
+from sqlalchemy import text
+
+from config.database import db
+from models.habit import Habit
+from models.todo import Todo
+from services.sharding import shard_key, shard_indexes
+
+MAX_TERMS = 8
+MAX_CANDIDATES = 500
+MIN_PREFIX = 2  # shorter terms only match whole words; "a"* would expand to most of the vocabulary
+
+# SQLite FTS5: external-content tables plus the triggers that maintain them
+SQLITE_INDEXES = {
+    'habits_fts': {
+        'table': 'habits',
+        'columns': ('user_id', 'title', 'description'),
+        'weights': {'title': 10.0, 'description': 1.0},
+    },
+    'todos_fts': {
+        'table': 'todos',
+        'columns': ('user_id', 'text'),
+        'weights': {'text': 1.0},
+    },
+}
+
+# MySQL FULLTEXT indexes
+MYSQL_INDEXES = {
+    'ft_habits_search': ('habits', ('title', 'description')),
+    'ft_todos_search': ('todos', ('text',)),
+}
+
+
+def search_terms(query):
+    """Lower-cased words of a search string, at most MAX_TERMS"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def _matches(word, term):
+    return word.startswith(term) if len(term) >= MIN_PREFIX else word == term
+
+
+def _sqlite_statements(name, table, columns):
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    delete_old = f"INSERT INTO {name}({name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {name}(rowid, {column_list}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{column_list}, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {column_list} ON {table} "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def _ensure_sqlite(connection):
+    created = []
+    for name, spec in SQLITE_INDEXES.items():
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+        ).first()
+        for statement in _sqlite_statements(name, spec['table'], spec['columns']):
+            connection.execute(text(statement))
+        if not exists:
+            # Index rows written before the table existed
+            connection.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+            created.append(name)
+    return created
+
+
+def _ensure_mysql(connection):
+    created = []
+    for name, (table, columns) in MYSQL_INDEXES.items():
+        exists = connection.execute(text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :table AND index_name = :name LIMIT 1"
+        ), {'table': table, 'name': name}).first()
+        if not exists:
+            connection.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({', '.join(columns)})"))
+            created.append(name)
+    return created
+
+
+def ensure_search_indexes():
+    """Create missing full-text indexes where habits and todos live; returns their names"""
+    created = []
+    for shard in shard_indexes():
+        engine = db.engines[shard_key(shard) if shard is not None else None]
+        with engine.begin() as connection:
+            if engine.dialect.name == 'sqlite':
+                created += _ensure_sqlite(connection)
+            elif engine.dialect.name == 'mysql':
+                created += _ensure_mysql(connection)
+    return created
+
+
+def _sqlite_query(kind, user_id, terms, limit=MAX_CANDIDATES):
+    name = 'habits_fts' if kind == 'habit' else 'todos_fts'
+    table = SQLITE_INDEXES[name]['table']
+    searched = list(SQLITE_INDEXES[name]['weights'])
+    # Terms are \w+ words, so quoting them is enough to keep them literal
+    match = f'user_id : {int(user_id)} AND ' + ' AND '.join(
+        f'{{{" ".join(searched)}}} : "{term}"' + ('*' if len(term) >= MIN_PREFIX else '') for term in terms
+    )
+    visible = 'AND t.deleted_at IS NULL' if kind == 'habit' else ''
+    statement = text(
+        f"SELECT t.id AS id, {', '.join(f't.{column}' for column in searched)} FROM {name} "
+        f"JOIN {table} t ON t.id = {name}.rowid "
+        f"WHERE {name} MATCH :match {visible} "
+        f"ORDER BY t.id DESC LIMIT :limit"
+    )
+    return statement, {'match': match, 'limit': limit}
+
+
+def _sqlite_rank(kind, terms, rows, limit):
+    """(id, score) for FTS5 candidate rows, best first
+
+    A field scores the share of its words that start with a search term,
+    times the field's weight, so short titles naming the term outrank long
+    descriptions mentioning it once.
+    """
+    weights = SQLITE_INDEXES['habits_fts' if kind == 'habit' else 'todos_fts']['weights']
+    ranked = []
+    for item_id, *values in rows:
+        score = 0.0
+        for weight, value in zip(weights.values(), values):
+            words = re.findall(r'\w+', (value or '').lower())
+            if words:
+                hits = sum(1 for word in words if any(_matches(word, term) for term in terms))
+                score += weight * hits / len(words)
+        ranked.append((item_id, score))
+    ranked.sort(key=lambda entry: (-entry[1], -entry[0]))
+    return ranked[:limit]
+
+
+def _mysql_query(kind, user_id, terms, limit):
+    table, columns = MYSQL_INDEXES['ft_habits_search' if kind == 'habit' else 'ft_todos_search']
+    against = ' '.join(f'+{term}' + ('*' if len(term) >= MIN_PREFIX else '') for term in terms)
+    match = f"MATCH ({', '.join(columns)}) AGAINST (:against IN BOOLEAN MODE)"
+    visible = 'AND deleted_at IS NULL' if kind == 'habit' else ''
+    statement = text(
+        f"SELECT id, {match} AS score FROM {table} "
+        f"WHERE user_id = :user_id {visible} AND {match} "
+        f"ORDER BY score DESC, id DESC LIMIT :limit"
+    )
+    return statement, {'against': against, 'user_id': user_id, 'limit': limit}
+
+
+def _like_query(kind, user_id, terms, limit):
+    """Unindexed fallback for other databases"""
+    model = Habit if kind == 'habit' else Todo
+    query = db.session.query(model.id).filter(model.user_id == user_id)
+    if kind == 'habit':
+        query = query.filter(Habit.deleted_at.is_(None))
+    for term in terms:
+        pattern = f'%{term}%'
+        if kind == 'habit':
+            query = query.filter(Habit.title.ilike(pattern) | Habit.description.ilike(pattern))
+        else:
+            query = query.filter(Todo.text.ilike(pattern))
+    return [(row.id, 1.0) for row in query.order_by(model.id.desc()).limit(limit)]
+
+
+def _ranked_ids(kind, user_id, terms, limit):
+    mapper = (Habit if kind == 'habit' else Todo).__mapper__
+    # Route like an ORM query on the model: the user's shard, or a replica
+    bind = db.session.get_bind(mapper=mapper)
+    if bind.dialect.name == 'sqlite':
+        statement, params = _sqlite_query(kind, user_id, terms)
+        rows = db.session.execute(statement, params, bind_arguments={'mapper': mapper})
+        return _sqlite_rank(kind, terms, rows, limit)
+    if bind.dialect.name == 'mysql':
+        statement, params = _mysql_query(kind, user_id, terms, limit)
+    else:
+        return _like_query(kind, user_id, terms, limit)
+    rows = db.session.execute(statement, params, bind_arguments={'mapper': mapper})
+    return [(row.id, float(row.score)) for row in rows]
+
+
+def search(user_id, query, kinds=('habit', 'todo'), limit=20, offset=0):
+    """Ranked matches for `query` as (results, has_more)
+
+    Each result is {'type', 'score', 'habit' or 'todo'}.  Scores of habits
+    and todos come from separate indexes; with both kinds the two ranked
+    lists are merged by score.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    
+    wanted = offset + limit + 1
+    ranked = []
+    for kind in kinds:
+        ranked += [(score, kind, item_id) for item_id, score in _ranked_ids(kind, user_id, terms, wanted)]
+    ranked.sort(key=lambda entry: (-entry[0], entry[1], -entry[2]))
+    page = ranked[offset:offset + limit]
+    
+    loaded = {}
+    for kind, model in (('habit', Habit), ('todo', Todo)):
+        ids = [item_id for _, entry_kind, item_id in page if entry_kind == kind]
+        if ids:
+            loaded.update({(kind, item.id): item for item in model.query.filter(model.id.in_(ids))})
+    
+    results = [
+        {'type': kind, 'score': round(score, 4), kind: loaded[(kind, item_id)].to_dict()}
+        for score, kind, item_id in page
+        if (kind, item_id) in loaded
+    ]
+    return results, len(ranked) > offset + limit
@@ -0,0 +1,548 @@
+"""
+Sharding of user-owned data.
+
+When ``DATABASE_SHARD_URLS`` (or ``SHARD_TEST_COUNT`` local SQLite files) is
+set, the tables in ``SHARDED_TABLES`` live on N shard databases while
+``users`` and the other global tables stay on the primary.  All of a user's
+rows live on one shard, so every query a request makes hits one database:
+
+* a user's shard is chosen by a jump consistent hash of their id the first
+  time they touch sharded data, and recorded in ``shard_assignments`` (the
+  shard map); adding a node moves only about 1/N of the users
+* requests resolve the shard once, from the JWT identity, in a
+  ``before_request`` hook; scripts pick one with ``for_user()`` or
+  ``on_shard()``
+* ``RoutingSession.get_bind`` sends statements on sharded tables to that
+  shard, and rejects statements that mix sharded and global tables
+
+Shard tables carry no foreign keys to ``users``, which lives elsewhere.
+Ids are only unique within a shard; moving a user renumbers their rows.
+
+Users are moved between shards with::
+
+    python -m services.sharding status
+    python -m services.sharding rebalance [--dry-run]
+    python -m services.sharding move USER_ID SHARD
+    python -m services.sharding import-primary
+
+A move marks the user ``moving`` (their writes get 503 for the duration,
+and background jobs skip them, see ``ShardMap.moving``), waits for every
+process's shard map cache to expire, copies the rows, flips the assignment,
+waits again and only then deletes the old copy.
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import current_app, g, has_app_context, has_request_context, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import MetaData, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.util import find_tables
+
+SHARD_PREFIX = 'shard_'
+
+# Tables holding per-user rows, parents before children
+SHARDED_TABLES = (
+    'habits',
+    'habit_completions',
+    'habit_completion_bitmaps',
+    'todos',
+    'notifications',
+    'notifications_archive',
+    'notification_counters',
+    'points_ledger',
+    'achievements_awarded',
+    'device_tokens',
+)
+
+_selected_shard = ContextVar('selected_shard', default=None)
+
+
+class ShardingError(RuntimeError):
+    pass
+
+
+def shard_key(index):
+    return f'{SHARD_PREFIX}{index}'
+
+
+def configure_shard_binds(app):
+    """Register the shard databases as binds named shard_<n>"""
+    uris = list(app.config.get('SQLALCHEMY_SHARD_URIS') or [])
+    test_count = app.config.get('SHARD_TEST_COUNT') or 0
+    if not uris and test_count:
+        directory = app.config.get('SHARD_TEST_DIR') or app.instance_path
+        os.makedirs(directory, exist_ok=True)
+        uris = [f"sqlite:///{os.path.join(directory, f'shard_{index}.db')}" for index in range(test_count)]
+    
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for index, uri in enumerate(uris):
+        binds[shard_key(index)] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config['SHARD_COUNT'] = len(uris)
+
+
+def shard_count():
+    return current_app.config.get('SHARD_COUNT', 0) if has_app_context() else 0
+
+
+def sharding_enabled():
+    return shard_count() > 0
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping & Veach): growing N to N+1 moves 1/(N+1) of the keys"""
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def home_shard(user_id, count):
+    """The shard a user belongs on with `count` shards"""
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, 'big'), count)
+
+
+def shard_metadata():
+    """Copies of the sharded tables without foreign keys to users"""
+    from config.database import db
+    
+    metadata = MetaData()
+    for name in SHARDED_TABLES:
+        table = db.metadata.tables[name].to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.startswith('users.'):
+                table.constraints.discard(constraint)
+                table.foreign_keys.difference_update(constraint.elements)
+                for column in constraint.columns:
+                    column.foreign_keys.difference_update(constraint.elements)
+    return metadata
+
+
+def create_shard_tables():
+    """Create the sharded tables on every shard; no-op without sharding"""
+    from config.database import db
+    
+    metadata = shard_metadata()
+    for index in range(shard_count()):
+        metadata.create_all(db.engines[shard_key(index)])
+    return shard_count()
+
+
+class ShardMap:
+    """Process-local cache of shard_assignments
+    
+    Entries are re-read after ``SHARD_MAP_TTL_SECONDS``; moves wait at least
+    that long between steps, so no process acts on a stale entry.
+    """
+    MAX_ENTRIES = 100000
+    
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        app.extensions['shard_map'] = self
+        self.forget()  # entries read from another app's shard_assignments
+        if app.config.get('SHARD_COUNT'):
+            app.before_request(self._select_request_shard)
+    
+    def after_fork(self):
+        """Start the worker with its own lock and no entries cached by the master"""
+        self._lock = threading.Lock()
+        self._entries = {}
+    
+    def lookup(self, user_id):
+        """(shard, state) of a user, assigning their home shard on first use"""
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry[2] < current_app.config.get('SHARD_MAP_TTL_SECONDS', 10):
+            return entry[0], entry[1]
+        
+        shard, state = self._load(user_id)
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[user_id] = (shard, state, now)
+        return shard, state
+    
+    def assignments(self, user_ids=None, chunk_size=500):
+        """{user_id: shard}; unassigned users map to their home shard
+        
+        Without ``user_ids`` the whole table is read in one query, otherwise
+        only the given users' rows, ``chunk_size`` ids per query.
+        """
+        from config.database import db
+        from models.shard import ShardAssignment
+        
+        table = ShardAssignment.__table__
+        query = select(table.c.user_id, table.c.shard)
+        if user_ids is None:
+            with db.engines[None].connect() as connection:
+                return dict(connection.execute(query).all())
+        
+        user_ids = list(user_ids)
+        assigned = {}
+        with db.engines[None].connect() as connection:
+            for start in range(0, len(user_ids), chunk_size):
+                chunk = user_ids[start:start + chunk_size]
+                assigned.update(connection.execute(query.where(table.c.user_id.in_(chunk))).all())
+        count = shard_count()
+        return {user_id: assigned.get(user_id, home_shard(user_id, count)) for user_id in user_ids}
+    
+    def moving(self):
+        """Ids of the users being moved, read from the primary (never cached)
+        
+        Background writers (jobs, push token cleanup) check this before each
+        batch and leave those users' rows alone: the request-path 503 does
+        not cover them, and a write to the source shard during the copy
+        would be lost with it.
+        """
+        if not sharding_enabled():
+            return set()
+        from config.database import db
+        from models.shard import ShardAssignment
+        
+        table = ShardAssignment.__table__
+        with db.engines[None].connect() as connection:
+            return set(connection.execute(select(table.c.user_id).where(table.c.state == 'moving')).scalars())
+    
+    def forget(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+    
+    def _load(self, user_id):
+        # Uses its own connection so a lookup never joins the caller's transaction
+        from config.database import db
+        from models.shard import ShardAssignment
+        
+        table = ShardAssignment.__table__
+        engine = db.engines[None]
+        query = select(table.c.shard, table.c.state).where(table.c.user_id == user_id)
+        with engine.connect() as connection:
+            row = connection.execute(query).first()
+        if row is not None:
+            return row.shard, row.state
+        
+        shard = home_shard(user_id, shard_count())
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(table).values(user_id=user_id, shard=shard, state='active'))
+        except IntegrityError:
+            # Another process assigned the user first
+            with engine.connect() as connection:
+                row = connection.execute(query).first()
+            if row is not None:
+                return row.shard, row.state
+        return shard, 'active'
+    
+    def _select_request_shard(self):
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+        except Exception:
+            # The view's jwt_required reports bad tokens
+            return None
+        if user_id is None:
+            return None
+        
+        shard, state = self.lookup(user_id)
+        g.shard_key = shard_key(shard)
+        if state == 'moving' and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return jsonify({'error': 'Your data is being moved to another server, please retry in a minute'}), 503
+        return None
+
+
+shard_map = ShardMap()
+
+
+@contextmanager
+def on_shard(index):
+    """Route sharded tables to shard `index` inside the block (None: no-op)"""
+    if index is None:
+        yield
+        return
+    token = _selected_shard.set(shard_key(index))
+    try:
+        yield
+    finally:
+        _selected_shard.reset(token)
+
+
+def for_user(user_id):
+    """Route sharded tables to the shard holding `user_id`"""
+    if not sharding_enabled():
+        return nullcontext()
+    return on_shard(shard_map.lookup(user_id)[0])
+
+
+def shard_indexes():
+    """Shards a maintenance job should visit; [None] (just the primary) without sharding"""
+    count = shard_count()
+    return list(range(count)) if count else [None]
+
+
+def shard_engine(session, mapper=None, clause=None):
+    """The shard engine for a statement on sharded tables, None for global ones"""
+    if not sharding_enabled():
+        return None
+    
+    tables = set()
+    if mapper is not None:
+        tables.update(table.name for table in mapper.tables)
+    if clause is not None:
+        tables.update(table.name for table in find_tables(clause, include_crud=True))
+    sharded = tables.intersection(SHARDED_TABLES)
+    if not sharded:
+        return None
+    if tables - sharded:
+        raise ShardingError(
+            f"Statement mixes sharded tables {sorted(sharded)} with global tables {sorted(tables - sharded)}"
+        )
+    
+    key = _selected_shard.get() or (g.get('shard_key') if has_request_context() else None)
+    if key is None:
+        raise ShardingError(f"No shard selected for {sorted(sharded)}; use for_user() or on_shard()")
+    return session._db.engines[key]
+
+
+def _user_rows(connection, table, user_id):
+    from config.database import db
+    
+    order = list(table.primary_key.columns)
+    if 'user_id' in table.c:
+        query = select(table).where(table.c.user_id == user_id)
+    else:
+        habits = db.metadata.tables['habits']
+        query = select(table).join(habits, habits.c.id == table.c.habit_id).where(habits.c.user_id == user_id)
+    return [dict(row) for row in connection.execute(query.order_by(*order)).mappings()]
+
+
+def _remap_subject(subject_key, habit_ids):
+    match = re.match(r'habit:(\d+):(.*)', subject_key)
+    if match and int(match.group(1)) in habit_ids:
+        return f'habit:{habit_ids[int(match.group(1))]}:{match.group(2)}'
+    return subject_key
+
+
+def copy_user_data(source, target, user_id):
+    """Copy a user's rows between engines, renumbering ids on the target.
+    
+    Returns ({table: rows copied}, {old ledger id: new ledger id}).
+    """
+    from config.database import db
+    
+    copied = {}
+    habit_ids = {}
+    ledger_ids = {}
+    with source.connect() as source_connection, target.begin() as target_connection:
+        for name in SHARDED_TABLES:
+            table = db.metadata.tables[name]
+            rows = _user_rows(source_connection, table, user_id)
+            copied[name] = len(rows)
+            if not rows:
+                continue
+            
+            for row in rows:
+                if row.get('habit_id') is not None:
+                    row['habit_id'] = habit_ids.get(row['habit_id'], row['habit_id'])
+                if name == 'achievements_awarded':
+                    row['subject_key'] = _remap_subject(row['subject_key'], habit_ids)
+            
+            if name in ('habits', 'points_ledger'):
+                # Children and the fold cursor refer to these ids
+                remapped = habit_ids if name == 'habits' else ledger_ids
+                for row in rows:
+                    old_id = row.pop('id')
+                    result = target_connection.execute(insert(table).values(**row))
+                    remapped[old_id] = result.inserted_primary_key[0]
+            else:
+                for row in rows:
+                    if 'id' in table.c and table.c.id.primary_key:
+                        row.pop('id', None)
+                target_connection.execute(insert(table), rows)
+    return copied, ledger_ids
+
+
+def delete_user_data(engine, user_id):
+    from config.database import db
+    
+    habits = db.metadata.tables['habits']
+    with engine.begin() as connection:
+        habit_ids = select(habits.c.id).where(habits.c.user_id == user_id).scalar_subquery()
+        for name in reversed(SHARDED_TABLES):
+            table = db.metadata.tables[name]
+            if 'user_id' in table.c:
+                connection.execute(delete(table).where(table.c.user_id == user_id))
+            else:
+                connection.execute(delete(table).where(table.c.habit_id.in_(habit_ids)))
+
+
+def _remap_cursor(connection, user_id, ledger_ids):
+    """Point users.points_ledger_id at the renumbered ledger, racing the fold safely"""
+    from models.user import User
+    
+    users = User.__table__
+    while True:
+        cursor = connection.execute(select(users.c.points_ledger_id).where(users.c.id == user_id)).scalar() or 0
+        new_cursor = max((new for old, new in ledger_ids.items() if old <= cursor), default=0)
+        result = connection.execute(
+            update(users)
+            .where(users.c.id == user_id, users.c.points_ledger_id == cursor)
+            .values(points_ledger_id=new_cursor)
+        )
+        if result.rowcount:
+            return new_cursor
+
+
+def move_user(user_id, target, settle_seconds=None):
+    """Move a user's rows to shard `target`; returns the rows copied per table"""
+    from config.database import db
+    from models.shard import ShardAssignment
+    
+    if settle_seconds is None:
+        settle_seconds = current_app.config.get('SHARD_MAP_TTL_SECONDS', 10) + 1
+    assignments = ShardAssignment.__table__
+    primary = db.engines[None]
+    source, _ = shard_map._load(user_id)
+    if source == target:
+        return {}
+    
+    # 1. block the user's writes everywhere
+    with primary.begin() as connection:
+        connection.execute(update(assignments).where(assignments.c.user_id == user_id).values(state='moving'))
+    time.sleep(settle_seconds)
+    
+    # 2. copy, then flip the assignment together with the renumbered fold cursor
+    try:
+        copied, ledger_ids = copy_user_data(db.engines[shard_key(source)], db.engines[shard_key(target)], user_id)
+        with primary.begin() as connection:
+            _remap_cursor(connection, user_id, ledger_ids)
+            connection.execute(
+                update(assignments)
+                .where(assignments.c.user_id == user_id)
+                .values(shard=target, state='active', updated_at=datetime.utcnow())
+            )
+    except Exception:
+        delete_user_data(db.engines[shard_key(target)], user_id)
+        with primary.begin() as connection:
+            connection.execute(update(assignments).where(assignments.c.user_id == user_id).values(state='active'))
+        raise
+    
+    # 3. drop the old copy once nobody can still be reading it
+    time.sleep(settle_seconds)
+    delete_user_data(db.engines[shard_key(source)], user_id)
+    shard_map.forget(user_id)
+    return copied
+
+
+def rebalance(dry_run=False, settle_seconds=None):
+    """Move every user whose assignment differs from their home shard"""
+    count = shard_count()
+    moves = [
+        (user_id, shard, home_shard(user_id, count))
+        for user_id, shard in sorted(shard_map.assignments().items())
+        if shard != home_shard(user_id, count)
+    ]
+    for user_id, source, target in moves:
+        print(f"{'Would move' if dry_run else 'Moving'} user {user_id}: shard {source} -> {target}")
+        if not dry_run:
+            move_user(user_id, target, settle_seconds)
+    return len(moves)
+
+
+def import_primary():
+    """Copy each user's rows from the unsharded primary tables to their shard"""
+    from config.database import db
+    from models.user import User
+    
+    primary = db.engines[None]
+    imported = 0
+    with primary.connect() as connection:
+        user_ids = connection.execute(select(User.__table__.c.id).order_by(User.__table__.c.id)).scalars().all()
+    for user_id in user_ids:
+        shard, _ = shard_map.lookup(user_id)
+        target = db.engines[shard_key(shard)]
+        with target.connect() as connection:
+            habits = db.metadata.tables['habits']
+            if connection.execute(select(func.count()).where(habits.c.user_id == user_id)).scalar():
+                print(f"⏭️  User {user_id} already has data on shard {shard}, skipping")
+                continue
+        _, ledger_ids = copy_user_data(primary, target, user_id)
+        with primary.begin() as connection:
+            _remap_cursor(connection, user_id, ledger_ids)
+        imported += 1
+    return imported
+
+
+def status():
+    """Users assigned per shard and row counts of each sharded table"""
+    from config.database import db
+    
+    per_shard = {}
+    for shard in shard_map.assignments().values():
+        per_shard[shard] = per_shard.get(shard, 0) + 1
+    report = []
+    for index in range(shard_count()):
+        with db.engines[shard_key(index)].connect() as connection:
+            rows = {
+                name: connection.execute(select(func.count()).select_from(db.metadata.tables[name])).scalar()
+                for name in SHARDED_TABLES
+            }
+        report.append({'shard': index, 'users': per_shard.get(index, 0), 'rows': rows})
+    return report
+
+
+def main():
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Inspect and rebalance user shards')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help='users and rows per shard')
+    rebalance_parser = commands.add_parser('rebalance', help='move users to their home shard')
+    rebalance_parser.add_argument('--dry-run', action='store_true')
+    rebalance_parser.add_argument('--settle-seconds', type=float, help='wait between move steps')
+    move_parser = commands.add_parser('move', help='move one user to a shard')
+    move_parser.add_argument('user_id', type=int)
+    move_parser.add_argument('shard', type=int)
+    move_parser.add_argument('--settle-seconds', type=float, help='wait between move steps')
+    commands.add_parser('import-primary', help='copy unsharded data from the primary to the shards')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        if not sharding_enabled():
+            parser.error('sharding is not configured (set DATABASE_SHARD_URLS or SHARD_TEST_COUNT)')
+        
+        if args.command == 'status':
+            for entry in status():
+                rows = ', '.join(f'{name}={count}' for name, count in entry['rows'].items())
+                print(f"shard {entry['shard']}: {entry['users']} users ({rows})")
+        elif args.command == 'rebalance':
+            moved = rebalance(args.dry_run, args.settle_seconds)
+            print(f"✅ {moved} users {'to move' if args.dry_run else 'moved'}")
+        elif args.command == 'move':
+            if not 0 <= args.shard < shard_count():
+                parser.error(f'shard must be between 0 and {shard_count() - 1}')
+            copied = move_user(args.user_id, args.shard, args.settle_seconds)
+            print(f"✅ Moved user {args.user_id} to shard {args.shard}: {copied}")
+        elif args.command == 'import-primary':
+            imported = import_primary()
+            print(f"✅ Imported {imported} users into their shards")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Slow query log.
+
+When ``SLOW_QUERY_LOG_ENABLED`` is set, every statement is timed through
+SQLAlchemy's ``before_cursor_execute``/``after_cursor_execute`` engine
+events.  Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are recorded with
+their parameters redacted (only their types are kept), the blueprint route
+that issued them, and an ``EXPLAIN`` plan captured on a background thread so
+the request is not delayed.  Records are kept in a bounded ring buffer
+(served by ``GET /api/admin/slow-queries``) and appended as JSON lines to a
+rotating log file.
+
+The explain thread and the log file handler are created again in each
+gunicorn worker after the fork (``after_fork``); the ones built in the master
+during preload are not usable there.
+
+When the log is disabled no listeners are installed, so there is no
+overhead.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLAIN_PREFIXES = {
+    'mysql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+def redact(parameters):
+    """Replace parameter values with their type names"""
+    if isinstance(parameters, dict):
+        return {key: f'<{type(value).__name__}>' for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return [redact(parameters[0]), f'... {len(parameters)} rows']
+        return [f'<{type(value).__name__}>' for value in parameters]
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.threshold = 0.2
+        self.records = deque(maxlen=200)
+        self._explain_executor = None
+        self._explain_local = threading.local()
+        self._file_logger = None
+        self._file_handler = None
+        self._config = {}
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.enabled = app.config.get('SLOW_QUERY_LOG_ENABLED', False)
+        app.extensions['slow_query_log'] = self
+        if not self.enabled:
+            return
+        
+        self.threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS', 200) / 1000
+        self.records = deque(maxlen=app.config.get('SLOW_QUERY_BUFFER_SIZE', 200))
+        self._config = {
+            'explain': app.config.get('SLOW_QUERY_EXPLAIN', True),
+            'path': app.config.get('SLOW_QUERY_LOG_PATH'),
+            'max_bytes': app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024),
+            'backups': app.config.get('SLOW_QUERY_LOG_BACKUPS', 5)
+        }
+        self._open_outputs()
+        
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+    
+    def after_fork(self):
+        """Start a fresh explain thread and reopen the log file in a worker"""
+        if self.enabled:
+            self._open_outputs()
+    
+    def _open_outputs(self):
+        # The executor's thread does not survive a fork, so it is replaced
+        self._explain_executor = None
+        if self._config['explain']:
+            self._explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+        
+        if not self._config['path']:
+            return
+        self._file_logger = logging.getLogger('stride_streak.slow_queries')
+        self._file_logger.setLevel(logging.INFO)
+        self._file_logger.propagate = False
+        if self._file_handler is not None:
+            self._file_logger.removeHandler(self._file_handler)
+            self._file_handler.close()
+        self._file_handler = RotatingFileHandler(
+            self._config['path'],
+            maxBytes=self._config['max_bytes'],
+            backupCount=self._config['backups']
+        )
+        self._file_handler.setFormatter(logging.Formatter('%(message)s'))
+        self._file_logger.addHandler(self._file_handler)
+    
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append((context, time.perf_counter()))
+    
+    def _handle_error(self, exception_context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        if exception_context.connection is None:
+            return
+        started = exception_context.connection.info.get('slow_query_started')
+        if started and started[-1][0] is exception_context.execution_context:
+            started.pop()
+    
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        _, started = conn.info['slow_query_started'].pop()
+        duration = time.perf_counter() - started
+        if duration < self.threshold or getattr(self._explain_local, 'active', False):
+            return
+        
+        record = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'duration_ms': round(duration * 1000, 2),
+            'statement': statement,
+            'parameters': redact(parameters),
+            'executemany': executemany,
+            'route': None,
+            'database': conn.engine.url.render_as_string(hide_password=True),
+            'explain': None
+        }
+        if has_request_context():
+            record['route'] = {
+                'endpoint': request.endpoint,
+                'method': request.method,
+                'rule': request.url_rule.rule if request.url_rule else request.path
+            }
+        self.records.append(record)
+        
+        prefix = EXPLAIN_PREFIXES.get(conn.engine.dialect.name)
+        if (self._explain_executor is not None and prefix and not executemany
+                and statement.lstrip().upper().startswith('SELECT')):
+            self._explain_executor.submit(self._explain, conn.engine, prefix + statement, parameters, record)
+        else:
+            self._write(record)
+    
+    def _explain(self, engine, statement, parameters, record):
+        self._explain_local.active = True
+        try:
+            with engine.connect() as connection:
+                rows = connection.exec_driver_sql(statement, parameters).mappings().all()
+            record['explain'] = [{key: str(value) for key, value in row.items()} for row in rows]
+        except Exception as e:
+            record['explain'] = {'error': str(e)}
+        finally:
+            self._explain_local.active = False
+        self._write(record)
+    
+    def _write(self, record):
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(record, default=str))
+    
+    def recent(self, limit=None):
+        records = list(reversed(self.records))
+        return records[:limit] if limit else records
+    
+    def clear(self):
+        self.records.clear()
+
+
+slow_query_log = SlowQueryLog()
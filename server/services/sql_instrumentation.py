@@ -0,0 +1,92 @@
+"""
+Lightweight SQL instrumentation.
+
+``count_queries()`` counts the statements the current thread sends to the
+database while the block runs, which is how per-request and per-user costs
+(round trips, time) are measured::
+
+    with count_queries() as cost:
+        ...
+    print(cost.queries, cost.elapsed_ms)
+
+``count_queries(timed=True)`` also keeps each statement's duration and
+redacted parameters in ``cost.timings`` (used by the request profiler).
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryCost:
+    def __init__(self, timed=False):
+        self.queries = 0
+        self.statements = []
+        self.timed = timed
+        self.timings = []
+        self.started = time.perf_counter()
+        self.elapsed_ms = 0.0
+    
+    def to_dict(self):
+        return {'queries': self.queries, 'elapsed_ms': round(self.elapsed_ms, 2)}
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counters = getattr(_local, 'counters', None)
+    if counters:
+        for cost in counters:
+            cost.queries += 1
+            cost.statements.append(statement)
+        if any(cost.timed for cost in counters):
+            conn.info.setdefault('instrumentation_started', []).append((context, time.perf_counter()))
+
+
+@event.listens_for(Engine, 'handle_error')
+def _drop_failed_statement(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    if exception_context.connection is None:
+        return
+    started = exception_context.connection.info.get('instrumentation_started')
+    if started and started[-1][0] is exception_context.execution_context:
+        started.pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_statement(conn, cursor, statement, parameters, context, executemany):
+    counters = getattr(_local, 'counters', None)
+    if not counters or not any(cost.timed for cost in counters):
+        return
+    started = conn.info.get('instrumentation_started')
+    if not started:
+        return
+    from services.slow_query_log import redact
+    
+    timing = {
+        'statement': statement,
+        'parameters': redact(parameters),
+        'executemany': executemany,
+        'duration_ms': round((time.perf_counter() - started.pop()[1]) * 1000, 3)
+    }
+    for cost in counters:
+        if cost.timed:
+            cost.timings.append(timing)
+
+
+@contextmanager
+def count_queries(timed=False):
+    """Count statements executed by this thread inside the block"""
+    cost = QueryCost(timed)
+    counters = getattr(_local, 'counters', None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(cost)
+    try:
+        yield cost
+    finally:
+        counters.remove(cost)
+        cost.elapsed_ms = (time.perf_counter() - cost.started) * 1000
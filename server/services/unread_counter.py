@@ -0,0 +1,143 @@
+"""
+Unread notification counters.
+
+``notification_counters`` holds one row per user with the number of their
+notifications whose ``read_at`` is NULL, so the navigation badge
+(``GET /api/notifications/unread-count``) is a primary-key lookup instead of
+a load of every notification.
+
+Counters change in the same transaction as the notifications themselves:
+``adjust_unread`` is called when a notification is created and when one is
+marked read.  Rows written without it (notifications created before the
+counters existed, bulk deletes) are repaired by the reconciliation job:
+
+    python -m services.unread_counter --batch-size 500
+"""
+import argparse
+import time
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from config.database import db
+from models.notification import Notification, NotificationCounter
+from services.sharding import on_shard, shard_indexes, shard_map
+
+
+def _unread_query(user_id):
+    table = Notification.__table__
+    return (
+        select(func.count())
+        .select_from(table)
+        .where(table.c.user_id == user_id, table.c.read_at.is_(None))
+        .scalar_subquery()
+    )
+
+
+def adjust_unread(user_id, delta):
+    """Add `delta` to a user's counter in the current session (the caller commits)
+
+    A user without a counter row gets one holding their actual unread count,
+    which already includes this change.
+    """
+    counters = NotificationCounter.__table__
+    # The counter row is inserted from a count, so pending notifications must be visible
+    db.session.flush()
+    result = db.session.execute(
+        update(counters)
+        .where(counters.c.user_id == user_id)
+        .values(unread=case((counters.c.unread + delta < 0, 0), else_=counters.c.unread + delta))
+    )
+    if result.rowcount:
+        return
+    
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(counters).values(user_id=user_id, unread=_unread_query(user_id)))
+    except IntegrityError:
+        # Another request created the row first
+        db.session.execute(
+            update(counters).where(counters.c.user_id == user_id).values(unread=_unread_query(user_id))
+        )
+
+
+def unread_count(user_id):
+    """The user's unread notifications; counted once until their first counter update"""
+    counters = NotificationCounter.__table__
+    unread = db.session.execute(select(counters.c.unread).where(counters.c.user_id == user_id)).scalar()
+    if unread is None:
+        unread = db.session.execute(select(_unread_query(user_id))).scalar()
+    return unread
+
+
+def reconcile_counters(batch_size=500):
+    """Rewrite counters that disagree with ``read_at IS NULL``; returns stats
+
+    Users are compared in one grouped query per shard; each drifted counter
+    is then recomputed by a single UPDATE (or INSERT) with the count as a
+    subquery, so a notification created meanwhile is never lost.
+    """
+    notifications = Notification.__table__
+    counters = NotificationCounter.__table__
+    checked = 0
+    fixed = 0
+    started = time.perf_counter()
+    
+    for shard in shard_indexes():
+        with on_shard(shard):
+            actual = dict(db.session.execute(
+                select(notifications.c.user_id, func.count())
+                .where(notifications.c.read_at.is_(None))
+                .group_by(notifications.c.user_id)
+            ).all())
+            stored = dict(db.session.execute(select(counters.c.user_id, counters.c.unread)).all())
+            db.session.commit()
+            
+            checked += len(actual.keys() | stored.keys())
+            drifted = sorted(
+                user_id for user_id in actual.keys() | stored.keys()
+                if actual.get(user_id, 0) != stored.get(user_id)
+            )
+            for start in range(0, len(drifted), batch_size):
+                # A counter written on the source shard during a move would be lost
+                moving = shard_map.moving()
+                batch = [user_id for user_id in drifted[start:start + batch_size] if user_id not in moving]
+                try:
+                    for user_id in batch:
+                        result = db.session.execute(
+                            update(counters)
+                            .where(counters.c.user_id == user_id)
+                            .values(unread=_unread_query(user_id))
+                        )
+                        if not result.rowcount:
+                            adjust_unread(user_id, 0)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                fixed += len(batch)
+    
+    return {
+        'checked': checked,
+        'fixed': fixed,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def main():
+    from app import create_app
+    
+    parser = argparse.ArgumentParser(description='Reconcile unread notification counters')
+    parser.add_argument('--batch-size', type=int, help='counters fixed per transaction')
+    args = parser.parse_args()
+    
+    app = create_app()
+    with app.app_context():
+        stats = reconcile_counters(batch_size=args.batch_size or app.config['UNREAD_RECONCILE_BATCH_SIZE'])
+    
+    print(f"🔢 Checked {stats['checked']} unread counters, fixed {stats['fixed']} "
+          f"({stats['elapsed_seconds']}s)")
+
+
+if __name__ == '__main__':
+    main()
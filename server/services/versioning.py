@@ -0,0 +1,68 @@
+"""
+Optimistic concurrency control for habits, todos and users.
+
+``Habit``, ``Todo`` and ``User`` carry a ``version`` column registered as
+SQLAlchemy's ``version_id_col``.  Every ORM UPDATE or DELETE of those rows
+adds ``WHERE version = <version loaded>`` and increments it; when another
+request changed the row in between, nothing matches and the flush raises
+``StaleDataError``.  No row locks are taken, so two devices editing the same
+habit never wait on each other - the slower one gets a 409 instead of
+silently overwriting the other's edit.
+
+The version is sent as ``version`` in ``to_dict()`` and as the ``ETag`` of
+single-item responses.  A client that sends it back in ``If-Match`` is also
+refused with a 409 when the row changed after *it* read it, not just during
+the request.  The 409 body carries the current row so the client can merge
+and retry.
+
+Bulk and Core statements (``query.update()``, ``update(table)``) do not
+check or bump the version; they are used only for bookkeeping columns that
+clients never edit (``last_login``, folded points).
+"""
+from flask import jsonify, request
+
+from config.database import db
+
+
+def etag(item):
+    return f'"{item.version}"'
+
+
+def tagged(payload, item, status=200):
+    """jsonify(payload) carrying `item`'s version as its ETag"""
+    response = jsonify(payload)
+    response.headers['ETag'] = etag(item)
+    return response, status
+
+
+def _kind(item):
+    return type(item).__name__.lower()
+
+
+def conflict(item):
+    """409 with the current state of `item`"""
+    return tagged({
+        'error': 'Conflict',
+        'message': f'This {_kind(item)} was changed by another request; reload it and try again',
+        'current': item.to_dict()
+    }, item, 409)
+
+
+def check_if_match(item):
+    """A 409 response if the request's If-Match names another version of `item`, else None"""
+    header = request.headers.get('If-Match')
+    if not header or header.strip() == '*':
+        return None
+    tags = {tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip() for tag in header.split(',')}
+    if etag(item) in tags:
+        return None
+    return conflict(item)
+
+
+def stale_conflict(model, item_id):
+    """Response for a flush that lost the version race: roll back and report the winner's row"""
+    db.session.rollback()
+    current = db.session.get(model, item_id)
+    if current is None or getattr(current, 'deleted_at', None) is not None:
+        return jsonify({'error': f'{model.__name__} not found'}), 404
+    return conflict(current)
@@ -0,0 +1,196 @@
+"""
+Write-behind buffer for low-value timestamp updates.
+
+``users.last_login`` is written on a hot path (every login), but nobody
+needs it durable the moment the request returns.  Instead of committing per
+request, callers ``record()`` the change here.  The buffer keeps the latest value per row in
+memory and a background thread writes everything collected in batches - one
+transaction per kind (and shard) - every WRITE_BEHIND_FLUSH_SECONDS, or as
+soon as WRITE_BEHIND_MAX_ENTRIES rows are pending.
+
+Memory is bounded: entries coalesce per row, and once twice
+WRITE_BEHIND_MAX_ENTRIES rows are pending (the flusher fell behind) the
+recording request flushes inline.  Entries that fail to flush are kept for
+the next attempt only while they fit under that cap.  The buffer is
+flushed when a worker exits; updates still pending when a process is
+killed are lost, which is the trade-off this column accepts.  Readers see
+a change once it is flushed, and in any worker.
+
+Each kind is a writer function in ``WRITERS`` taking ``{row_id: (user_id,
+value)}`` and returning the users whose rows changed, whose cached
+responses are then invalidated.
+
+With WRITE_BEHIND_ENABLED=false every ``record()`` is written at once.
+
+``notifications.read_at`` is deliberately not buffered: the unread counter
+moves with it, and a read the client was told succeeded must not come back
+as unread from another worker or be lost with a killed one.
+"""
+import atexit
+import os
+import threading
+import time
+
+from sqlalchemy import bindparam, or_, update
+
+from config.database import db
+from models.user import User
+from services.cache import response_cache
+
+
+def _write_last_login(entries):
+    users = User.__table__
+    # Never move last_login backwards (a later login may have been flushed by another worker)
+    db.session.execute(
+        update(users)
+        .where(users.c.id == bindparam('row_id'),
+               or_(users.c.last_login.is_(None), users.c.last_login < bindparam('value')))
+        .values(last_login=bindparam('value')),
+        [{'row_id': row_id, 'value': value} for row_id, (_, value) in entries.items()]
+    )
+    db.session.commit()
+    return {user_id for user_id, _ in entries.values()}
+
+
+WRITERS = {
+    'last_login': _write_last_login,
+}
+
+
+class WriteBehindBuffer:
+    """Per-process buffer of pending updates, flushed by a background thread"""
+    
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.stats = {'recorded': 0, 'flushed': 0, 'dropped': 0, 'flushes': 0, 'last_flush_ms': None}
+    
+    def init_app(self, app):
+        self.app = app
+        app.extensions['write_behind'] = self
+        atexit.register(self.stop)
+    
+    def after_fork(self):
+        """Forget the master's entries and flusher; the worker starts its own on first record()"""
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = os.getpid()
+    
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('WRITE_BEHIND_ENABLED', True)
+    
+    @property
+    def max_entries(self):
+        return self.app.config.get('WRITE_BEHIND_MAX_ENTRIES', 1000)
+    
+    def record(self, kind, row_id, value, user_id):
+        """Queue `value` for row `row_id` of `kind`; the latest value per row wins"""
+        if not self.enabled:
+            self._write({kind: {row_id: (user_id, value)}})
+            return
+        
+        self._ensure_thread()
+        with self._lock:
+            self._pending.setdefault(kind, {})[row_id] = (user_id, value)
+            self.stats['recorded'] += 1
+            size = self._size()
+        if size >= 2 * self.max_entries:
+            # The flusher is not keeping up; push back on the caller instead of growing
+            self.flush()
+        elif size >= self.max_entries:
+            self._wake.set()
+    
+    def pending(self):
+        with self._lock:
+            return self._size()
+    
+    def flush(self):
+        """Write everything pending now; returns the number of rows written"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        return self._write(batch)
+    
+    def stop(self, timeout=10):
+        """Stop the flusher thread and write what is left"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+        if self.app is not None and self._pid == os.getpid():
+            self.flush()
+    
+    def _size(self):
+        return sum(len(entries) for entries in self._pending.values())
+    
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's entries and thread are not ours to flush
+                self._pending = {}
+                self._pid = os.getpid()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        interval = self.app.config.get('WRITE_BEHIND_FLUSH_SECONDS', 5)
+        while not self._stop.is_set():
+            self._wake.wait(interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  Write-behind flush error: {e}")
+    
+    def _write(self, batch):
+        started = time.perf_counter()
+        written = 0
+        with self.app.app_context():
+            for kind, entries in batch.items():
+                try:
+                    changed = WRITERS[kind](entries)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"⚠️  Write-behind {kind}: {len(entries)} rows not written: {e}")
+                    self._requeue(kind, entries)
+                    continue
+                written += len(entries)
+                for user_id in changed:
+                    response_cache.invalidate_user(user_id)
+        with self._lock:
+            self.stats['flushed'] += written
+            self.stats['flushes'] += 1
+            self.stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return written
+    
+    def _requeue(self, kind, entries):
+        with self._lock:
+            pending = self._pending.setdefault(kind, {})
+            room = 2 * self.max_entries - self._size()
+            for row_id, entry in entries.items():
+                if row_id in pending:
+                    continue  # a newer value was recorded meanwhile
+                if room <= 0:
+                    self.stats['dropped'] += 1
+                    continue
+                pending[row_id] = entry
+                room -= 1
+
+
+write_behind = WriteBehindBuffer()
@@ -0,0 +1,34 @@
+"""Admin endpoints are limited to the accounts listed in ADMIN_USER_IDS"""
+import pytest
+
+
+@pytest.fixture
+def config_overrides(tmp_path):
+    return {'ADMIN_USER_IDS': [1], 'PROFILER_DIR': str(tmp_path / 'profiles')}
+
+
+def test_only_listed_accounts_are_admins(client, auth, register):
+    other = register('bob')
+    
+    assert client.get('/api/admin/slow-queries', headers=auth).status_code == 200
+    assert client.get('/api/admin/slow-queries', headers=other).status_code == 403
+
+
+def test_changing_the_email_does_not_grant_admin(client, auth, register):
+    other = register('bob')
+    client.put('/api/auth/profile', headers=auth, json={'email': 'ops@example.com'})
+    
+    response = client.put('/api/auth/profile', headers=other, json={'email': 'Alice@Example.com'})
+    
+    assert response.status_code == 200
+    assert client.get('/api/admin/slow-queries', headers=other).status_code == 403
+    assert client.get('/api/admin/jobs', headers=other).status_code == 403
+
+
+def test_only_admins_can_profile_requests(client, auth, register):
+    other = register('bob')
+    
+    assert 'X-Profile-Id' in client.get('/api/habits', headers={**auth, 'X-Profile': '1'}).headers
+    response = client.get('/api/habits', headers={**other, 'X-Profile': '1'})
+    assert response.status_code == 200
+    assert 'X-Profile-Id' not in response.headers
@@ -0,0 +1,85 @@
+"""Worker state after gunicorn forks a preloaded app (wsgi.reset_after_fork)"""
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+from services.db_routing import replica_monitor
+from services.jobs import job_runner
+from services.push import push_service
+from services.sharding import shard_map
+from services.write_behind import write_behind
+
+
+@pytest.fixture
+def wsgi(app):
+    """wsgi creates its app at import; the fixture's Config patches still apply"""
+    import wsgi
+    yield wsgi
+    # The singletons outlive the test: drop what it planted in them
+    shard_map.after_fork()
+    replica_monitor.after_fork()
+    write_behind.flush()
+    sys.modules.pop('wsgi', None)
+
+
+def in_child(check):
+    """Run `check` in a forked process and return what it returned"""
+    reader, writer = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(reader)
+        try:
+            result = check()
+        except Exception as e:
+            result = {'error': repr(e)}
+        os.write(writer, json.dumps(result).encode())
+        os._exit(0)
+    os.close(writer)
+    with os.fdopen(reader) as handle:
+        output = handle.read()
+    os.waitpid(pid, 0)
+    return json.loads(output)
+
+
+def test_every_extension_of_ours_resets_after_fork(wsgi):
+    names = ('rate_limiter', 'response_cache', 'leaderboard', 'slow_query_log', 'push', 'replica_monitor',
+             'shard_map', 'request_profiler', 'write_behind', 'job_runner')
+    
+    assert [name for name in names if not callable(getattr(wsgi.app.extensions[name], 'after_fork', None))] == []
+
+
+def test_worker_starts_without_the_masters_state(wsgi):
+    app = wsgi.app
+    with app.app_context():
+        shard_map._entries[1] = (0, 'moving', 0.0)
+        replica_monitor._status['replica_0'] = (0.0, 0.0)
+        replica_monitor.record_write(1, 30)
+        write_behind.record('last_login', 1, datetime.utcnow(), user_id=1)
+        master_lock = push_service._lock
+    
+    def check():
+        wsgi.reset_after_fork(app)
+        return {
+            'shard_map': len(shard_map._entries),
+            'replica_status': len(replica_monitor._status),
+            'recent_writers': len(replica_monitor._recent_writers),
+            'write_behind_pending': write_behind.pending(),
+            'write_behind_thread': write_behind._thread is not None,
+            'push_lock_replaced': push_service._lock is not master_lock,
+            'push_provider': push_service._provider is not None,
+            'job_threads': len(job_runner._threads),
+        }
+    
+    assert in_child(check) == {
+        'shard_map': 0,
+        'replica_status': 0,
+        'recent_writers': 0,
+        'write_behind_pending': 0,
+        'write_behind_thread': False,
+        'push_lock_replaced': True,
+        'push_provider': False,
+        'job_threads': 0,
+    }
@@ -0,0 +1,66 @@
+"""Completion bitmaps answer the same calendar and stats questions as the rows"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from config.database import db
+from models.habit import HabitCompletion
+from services.completion_bitmap import completions_between, rebuild_bitmaps
+from services.sharding import for_user
+
+
+@pytest.fixture(params=[False, True], ids=['rows', 'bitmaps'])
+def config_overrides(request):
+    return {'COMPLETION_BITMAPS_ENABLED': request.param}
+
+
+@pytest.fixture
+def history(app, client, auth):
+    """A daily habit completed on 12 of the last 40 days, plus today through the API"""
+    habit = client.post('/api/habits', headers=auth, json={'title': 'Run', 'frequency': 'daily'}).get_json()['habit']
+    now = datetime.utcnow()
+    with app.app_context(), for_user(habit['user_id']):
+        db.session.add_all([
+            HabitCompletion(habit_id=habit['id'], completed_at=now - timedelta(days=days_ago))
+            for days_ago in (1, 2, 3, 5, 8, 13, 21, 29, 31, 34, 38, 39)
+        ])
+        db.session.commit()
+        rebuild_bitmaps()
+    assert client.post(f"/api/habits/{habit['id']}/complete", headers=auth).status_code == 200
+    return habit
+
+
+def test_stats_count_the_last_30_days(client, auth, history):
+    stats = client.get('/api/habits/stats', headers=auth).get_json()
+    
+    # today plus 1, 2, 3, 5, 8, 13, 21 and 29 days ago
+    assert stats['completion_rate_30d'] == round(9 / 30 * 100, 2)
+
+
+def test_calendar_lists_each_completed_day(client, auth, history):
+    year = datetime.utcnow().year
+    days = client.get(f"/api/habits/{history['id']}/calendar?year={year}", headers=auth).get_json()['completed_days']
+    
+    today = datetime.utcnow().date()
+    expected = sorted(
+        (today - timedelta(days=days_ago)).isoformat()
+        for days_ago in (0, 1, 2, 3, 5, 8, 13, 21, 29, 31, 34, 38, 39)
+        if (today - timedelta(days=days_ago)).year == year
+    )
+    assert days == expected
+
+
+def test_completions_between_spans_years(app, client, auth):
+    habit = client.post('/api/habits', headers=auth, json={'title': 'Read', 'frequency': 'daily'}).get_json()['habit']
+    with app.app_context(), for_user(habit['user_id']):
+        db.session.add_all([
+            HabitCompletion(habit_id=habit['id'], completed_at=datetime(2024, 12, 30, 8)),
+            HabitCompletion(habit_id=habit['id'], completed_at=datetime(2024, 12, 31, 8)),
+            HabitCompletion(habit_id=habit['id'], completed_at=datetime(2025, 1, 1, 8)),
+            HabitCompletion(habit_id=habit['id'], completed_at=datetime(2025, 1, 3, 8)),
+        ])
+        db.session.commit()
+        rebuild_bitmaps()
+        
+        assert completions_between([habit['id'], 999], date(2024, 12, 31), date(2025, 1, 2)) == {habit['id']: 2, 999: 0}
+        assert completions_between([habit['id']], date(2025, 1, 2), date(2025, 1, 1)) == {habit['id']: 0}
@@ -0,0 +1,114 @@
+"""NDJSON export of one account imported into another"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from config.database import db
+from models.habit import HabitCompletion
+from models.notification import Notification
+from services.sharding import for_user
+from services.unread_counter import adjust_unread
+
+
+@pytest.fixture
+def history(app, client, auth):
+    """alice's account: two habits with completions, todos and notifications"""
+    habits = []
+    for title in ('Run', 'Read'):
+        response = client.post('/api/habits', headers=auth, json={'title': title, 'frequency': 'daily'})
+        assert response.status_code == 201
+        habits.append(response.get_json()['habit']['id'])
+    for text, completed in (('Buy milk', False), ('Call mum', True)):
+        assert client.post('/api/todos', headers=auth, json={'text': text, 'completed': completed}).status_code == 201
+    
+    now = datetime.utcnow()
+    with app.app_context(), for_user(1):
+        # Three days of Run, one of Read
+        db.session.add_all([HabitCompletion(habit_id=habits[0], completed_at=now - timedelta(days=days))
+                            for days in range(3)])
+        db.session.add(HabitCompletion(habit_id=habits[1], completed_at=now))
+        db.session.add_all([
+            Notification(user_id=1, title='Unread', message='New badge', type='push'),
+            Notification(user_id=1, title='Also unread', message='Streak', type='push'),
+            Notification(user_id=1, title='Read', message='Welcome', type='push', read_at=now),
+        ])
+        adjust_unread(1, 2)
+        db.session.commit()
+    return habits
+
+
+def export(client, auth):
+    response = client.get('/api/export', headers=auth)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def by_type(records, entity):
+    return [record['data'] for record in records if record['type'] == entity]
+
+
+def import_records(client, auth, lines):
+    return client.post('/api/import', headers=auth, data='\n'.join(lines) + '\n',
+                       content_type='application/x-ndjson')
+
+
+def test_round_trip_into_another_account(client, auth, register, history):
+    exported = export(client, auth)
+    bob = register('bob')
+    client.post('/api/habits', headers=bob, json={'title': 'Own habit', 'frequency': 'weekly'})
+    
+    response = import_records(client, bob, [json.dumps(record) for record in exported])
+    
+    assert response.status_code == 201, response.get_data(as_text=True)
+    assert response.get_json()['imported'] == {'habit': 2, 'habit_completion': 4, 'todo': 2, 'notification': 3}
+    imported = export(client, bob)
+    assert by_type(imported, 'user')[0]['username'] == 'bob'
+    habits = {habit['title']: habit['id'] for habit in by_type(imported, 'habit')}
+    assert set(habits) == {'Own habit', 'Run', 'Read'}
+    # Completions follow their habit to its new id
+    per_habit = {}
+    for completion in by_type(imported, 'habit_completion'):
+        per_habit[completion['habit_id']] = per_habit.get(completion['habit_id'], 0) + 1
+    assert per_habit == {habits['Run']: 3, habits['Read']: 1}
+    assert {(todo['text'], todo['completed']) for todo in by_type(imported, 'todo')} == {
+        ('Buy milk', False), ('Call mum', True)
+    }
+    assert client.get('/api/notifications/unread-count', headers=bob).get_json()['unread'] == 2
+    # The source account is untouched
+    assert len(by_type(export(client, auth), 'habit')) == 2
+
+
+def test_bad_line_rejects_the_whole_file(client, auth, register, history):
+    lines = [json.dumps(record) for record in export(client, auth)]
+    bob = register('bob')
+    
+    response = import_records(client, bob, lines[:3] + ['{not json'] + lines[3:])
+    
+    assert response.status_code == 400
+    assert 'Line 4' in response.get_json()['message']
+    assert by_type(export(client, bob), 'habit') == []
+    assert client.get('/api/notifications/unread-count', headers=bob).get_json()['unread'] == 0
+
+
+@pytest.mark.parametrize('value', ['false', 'true', 0, 1, None])
+def test_booleans_must_be_json_booleans(client, register, value):
+    bob = register('bob')
+    record = {'type': 'todo', 'data': {'text': 'Imported', 'completed': value}}
+    
+    response = import_records(client, bob, [json.dumps(record)])
+    
+    assert response.status_code == 400
+    assert response.get_json()['message'].startswith('Line 1: completed ')
+    assert client.get('/api/todos', headers=bob).get_json()['todos'] == []
+
+
+def test_json_false_is_imported_as_false(client, register):
+    bob = register('bob')
+    records = [{'type': 'todo', 'data': {'text': text, 'completed': completed}}
+               for text, completed in (('Open', False), ('Done', True))]
+    
+    assert import_records(client, bob, [json.dumps(record) for record in records]).status_code == 201
+    
+    todos = client.get('/api/todos', headers=bob).get_json()['todos']
+    assert {(todo['text'], todo['completed']) for todo in todos} == {('Open', False), ('Done', True)}
@@ -0,0 +1,145 @@
+"""compute_analytics against a plain Python reference on fixed histories"""
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services.habit_analytics import ROLLING_WINDOWS, WEEKDAYS, compute_analytics
+
+
+def reference(timestamps, today, start=None):
+    """What compute_analytics should return, one day at a time"""
+    timestamps = [stamp for stamp in timestamps if stamp.date() <= today]
+    result = {
+        'total_completions': len(timestamps),
+        'days_completed': 0,
+        'first_completion': None,
+        'rolling_completion_rates': {f'{window}d': 0.0 for window in ROLLING_WINDOWS},
+        'weekday_completion_rates': {name: 0.0 for name in WEEKDAYS},
+        'best_weekday': None,
+        'worst_weekday': None,
+        'hour_distribution': [0] * 24,
+        'trend': {'weeks': 0, 'slope_per_week': 0.0}
+    }
+    if not timestamps:
+        return result
+    
+    completed = {stamp.date() for stamp in timestamps}
+    first = min(completed) if start is None else min(min(completed), start)
+    days = [first + timedelta(days=offset) for offset in range((today - first).days + 1)]
+    done = [1 if day in completed else 0 for day in days]
+    result['days_completed'] = sum(done)
+    result['first_completion'] = min(timestamps).isoformat()
+    
+    for window in ROLLING_WINDOWS:
+        length = min(window, len(days))
+        result['rolling_completion_rates'][f'{window}d'] = round(sum(done[-length:]) / length * 100, 2)
+    
+    rates = {}
+    for weekday, name in enumerate(WEEKDAYS):
+        flags = [flag for day, flag in zip(days, done) if day.weekday() == weekday]
+        if flags:
+            rates[name] = sum(flags) / len(flags)
+        result['weekday_completion_rates'][name] = round(rates.get(name, 0.0) * 100, 2)
+    # Ties go to the earlier weekday
+    result['best_weekday'] = max(rates, key=lambda name: (rates[name], -WEEKDAYS.index(name)))
+    result['worst_weekday'] = min(rates, key=lambda name: (rates[name], WEEKDAYS.index(name)))
+    
+    hours = Counter(stamp.hour for stamp in timestamps)
+    result['hour_distribution'] = [hours[hour] for hour in range(24)]
+    
+    weeks = len(days) // 7
+    if weeks >= 2:
+        tail = done[len(days) - weeks * 7:]
+        weekly = [sum(tail[week * 7:week * 7 + 7]) for week in range(weeks)]
+        x_mean = (weeks - 1) / 2
+        y_mean = sum(weekly) / weeks
+        slope = (sum((x - x_mean) * (y - y_mean) for x, y in enumerate(weekly))
+                 / sum((x - x_mean) ** 2 for x in range(weeks)))
+        result['trend'] = {'weeks': weeks, 'slope_per_week': round(slope, 4)}
+    return result
+
+
+def analytics(timestamps, today, start=None):
+    return compute_analytics(np.array(timestamps, dtype='datetime64[s]'), today, start=start)
+
+
+def assert_matches_reference(timestamps, today, start=None):
+    actual = analytics(timestamps, today, start)
+    expected = reference(timestamps, today, start)
+    assert actual['trend']['slope_per_week'] == pytest.approx(expected['trend']['slope_per_week'], abs=1e-4)
+    actual['trend']['slope_per_week'] = expected['trend']['slope_per_week']
+    assert actual == expected
+    return actual
+
+
+def test_empty_history():
+    result = assert_matches_reference([], date(2024, 3, 1), start=date(2024, 1, 1))
+    
+    assert result['total_completions'] == 0 and result['best_weekday'] is None
+
+
+def test_completions_after_today_are_ignored():
+    result = assert_matches_reference([datetime(2024, 3, 1, 8), datetime(2024, 3, 2, 8)], date(2024, 3, 1))
+    
+    assert result['total_completions'] == 1
+    assert result['rolling_completion_rates']['7d'] == 100.0
+
+
+def test_start_before_the_first_completion_counts_the_missed_days():
+    stamps = [datetime(2024, 3, 8, 7, 30), datetime(2024, 3, 9, 21, 5), datetime(2024, 3, 10, 7)]
+    
+    result = assert_matches_reference(stamps, date(2024, 3, 10), start=date(2024, 3, 1))
+    
+    assert result['rolling_completion_rates']['7d'] == round(3 / 7 * 100, 2)
+    assert result['rolling_completion_rates']['30d'] == 30.0  # 3 of the 10 days since start
+
+
+def test_start_after_the_first_completion_is_ignored():
+    # Completions imported from before the habit was (re)created
+    stamps = [datetime(2024, 2, 20, 9), datetime(2024, 3, 5, 9), datetime(2024, 3, 6, 9)]
+    
+    result = assert_matches_reference(stamps, date(2024, 3, 6), start=date(2024, 3, 1))
+    
+    assert result['first_completion'] == '2024-02-20T09:00:00'
+    assert result['rolling_completion_rates']['90d'] == round(3 / 16 * 100, 2)
+
+
+@pytest.mark.parametrize('first, today', [
+    (date(2023, 12, 20), date(2024, 1, 12)),   # new year
+    (date(2024, 2, 20), date(2024, 3, 10)),    # leap day
+    (date(2022, 11, 1), date(2024, 2, 15)),    # several year ends
+])
+def test_year_boundaries(first, today):
+    stamps = [
+        datetime.combine(first + timedelta(days=offset), datetime.min.time()) + timedelta(hours=offset % 24)
+        for offset in range((today - first).days + 1)
+        if offset % 3 != 1
+    ]
+    
+    result = assert_matches_reference(stamps, today, start=first)
+    
+    assert result['days_completed'] == len(stamps)
+
+
+def test_random_history_matches_reference():
+    rng = random.Random(7)
+    today = date(2025, 1, 3)
+    first = today - timedelta(days=3 * 365)
+    stamps = []
+    for offset in range((today - first).days + 1):
+        # Streaky: the habit is done more often on weekdays and in later years
+        day = first + timedelta(days=offset)
+        chance = (0.3 if day.weekday() >= 5 else 0.7) * (0.5 + offset / ((today - first).days * 2))
+        for _ in range(2 if rng.random() < 0.1 else 1):
+            if rng.random() < chance:
+                stamps.append(datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randrange(1440)))
+    rng.shuffle(stamps)  # rows come back in no particular order
+    
+    start = first - timedelta(days=10)
+    
+    result = assert_matches_reference(stamps, today, start=start)
+    
+    assert result['trend']['weeks'] == ((today - start).days + 1) // 7
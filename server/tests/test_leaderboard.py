@@ -0,0 +1,135 @@
+"""The treap leaderboard against a sorted list of the same users"""
+import random
+import threading
+
+import pytest
+
+from config.database import db
+from models.user import User
+from services.leaderboard import Leaderboard
+
+
+def ordered(points):
+    """(rank, user_id, points) for a {user_id: points} dict, highest first"""
+    users = sorted(points.items(), key=lambda item: (-item[1], item[0]))
+    return [(rank, user_id, total) for rank, (user_id, total) in enumerate(users, 1)]
+
+
+def assert_matches(board, points):
+    expected = ordered(points)
+    assert len(board) == len(points)
+    assert board.top(len(points) + 5) == expected
+    for rank, user_id, total in expected:
+        assert board.rank(user_id) == rank
+        assert board.points(user_id) == total
+
+
+def test_ties_are_ranked_by_user_id():
+    board = Leaderboard()
+    board.rebuild([(3, 50), (1, 50), (2, 80), (4, None)])
+    
+    assert board.top(10) == [(1, 2, 80), (2, 1, 50), (3, 3, 50), (4, 4, 0)]
+    assert board.rank(3) == 3
+    assert board.rank(99) is None
+
+
+def test_random_updates_and_removals_match_sorted_list():
+    rng = random.Random(3)
+    board = Leaderboard()
+    points = {}
+    for step in range(3000):
+        user_id = rng.randrange(1, 300)
+        if rng.random() < 0.2:
+            board.remove(user_id)
+            points.pop(user_id, None)
+        else:
+            # Few distinct totals, so many users tie
+            points[user_id] = rng.randrange(0, 40) * 10
+            board.update(user_id, points[user_id])
+        if step % 500 == 0:
+            assert_matches(board, points)
+    assert_matches(board, points)
+
+
+def test_remove():
+    board = Leaderboard()
+    board.rebuild([(1, 30), (2, 20), (3, 10)])
+    
+    board.remove(2)
+    board.remove(42)  # not ranked
+    
+    assert board.rank(2) is None and board.points(2) is None
+    assert board.rank(3) == 2
+    assert board.top(10) == [(1, 1, 30), (2, 3, 10)]
+    assert board.around(2, 1) == []
+
+
+@pytest.mark.parametrize('user_id, radius, ranks', [
+    (10, 2, [8, 9, 10, 11, 12]),
+    (1, 2, [1, 2, 3]),        # clipped at the top
+    (20, 3, [17, 18, 19, 20]),  # clipped at the bottom
+    (5, 0, [5]),
+    (7, 50, list(range(1, 21))),
+])
+def test_around(user_id, radius, ranks):
+    board = Leaderboard()
+    # User n has rank n
+    board.rebuild([(user_id, 1000 - user_id) for user_id in range(1, 21)])
+    
+    assert board.around(user_id, radius) == [(rank, rank, 1000 - rank) for rank in ranks]
+
+
+def wait_for_refresh():
+    for thread in threading.enumerate():
+        if thread.name == 'leaderboard-refresh':
+            thread.join(5)
+
+
+def set_points(app, points):
+    with app.app_context():
+        for user_id, total in points.items():
+            db.session.get(User, user_id).points = total
+        db.session.commit()
+
+
+def test_refresh_if_stale(app, register):
+    for username in ('alice', 'bob', 'carol'):
+        register(username)
+    set_points(app, {1: 10, 2: 30, 3: 20})
+    board = Leaderboard()
+    board.app = app
+    board.refresh_seconds = 60
+    
+    # Never loaded: the first read starts a reload
+    assert board.refresh_if_stale()
+    wait_for_refresh()
+    assert board.top(10) == [(1, 2, 30), (2, 3, 20), (3, 1, 10)]
+    
+    # Fresh data is kept, even when the database has moved on
+    set_points(app, {1: 50})
+    assert not board.refresh_if_stale()
+    assert board.rank(1) == 3
+    
+    board.loaded_at -= 61
+    assert board.refresh_if_stale()
+    wait_for_refresh()
+    assert board.rank(1) == 1
+    assert not board.refresh_if_stale()
+
+
+def test_refresh_starts_one_reload_at_a_time(app):
+    board = Leaderboard()
+    board.app = app
+    board._refreshing = True
+    
+    assert not board.refresh_if_stale()
+
+
+@pytest.mark.parametrize('has_app, refresh_seconds', [(False, 10), (True, 0)])
+def test_refresh_disabled(app, has_app, refresh_seconds):
+    board = Leaderboard()
+    board.app = app if has_app else None
+    board.refresh_seconds = refresh_seconds
+    
+    assert not board.refresh_if_stale()
+    assert board.loaded_at is None
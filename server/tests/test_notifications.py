@@ -0,0 +1,113 @@
+"""Reading notifications and the unread counter"""
+import pytest
+
+from config.database import db
+from models.notification import Notification
+from models.user import User
+from services.sharding import for_user
+from services.sql_instrumentation import count_queries
+from services.unread_counter import adjust_unread
+from services.write_behind import write_behind
+
+
+@pytest.fixture
+def config_overrides():
+    return {'MAIL_SUPPRESS_SEND': True, 'MAIL_DEFAULT_SENDER': 'reminders@example.com'}
+
+
+def add_notifications(app, user_id, count):
+    with app.app_context(), for_user(user_id):
+        notifications = [Notification(user_id=user_id, title=f'Note {index}', message='Hello', type='push')
+                         for index in range(count)]
+        db.session.add_all(notifications)
+        adjust_unread(user_id, count)
+        db.session.commit()
+        return [notification.id for notification in notifications]
+
+
+def unread(client, auth):
+    response = client.get('/api/notifications/unread-count', headers=auth)
+    assert response.status_code == 200
+    return response.get_json()['unread']
+
+
+def test_mark_read_is_written_before_the_response(app, client, auth):
+    first, second = add_notifications(app, 1, 2)
+    
+    response = client.post(f'/api/notifications/{first}/read', headers=auth)
+    
+    assert response.status_code == 200
+    assert unread(client, auth) == 1
+    assert write_behind.pending() == 0
+    with app.app_context(), for_user(1):
+        assert db.session.get(Notification, first).read_at is not None
+        assert db.session.get(Notification, second).read_at is None
+
+
+def test_reading_twice_decrements_the_counter_once(app, client, auth):
+    first, _ = add_notifications(app, 1, 2)
+    
+    for _ in range(2):
+        assert client.post(f'/api/notifications/{first}/read', headers=auth).status_code == 200
+    
+    assert unread(client, auth) == 1
+
+
+def test_other_users_notifications_are_not_found(app, client, auth, register):
+    bob = register('bob')
+    (note,) = add_notifications(app, 1, 1)
+    
+    assert client.post(f'/api/notifications/{note}/read', headers=bob).status_code == 404
+    assert unread(client, auth) == 1
+
+
+# SELECT user + SELECT habits + INSERT notification + UPDATE counter, the
+# same for any number of due habits (the e-mail and push are not queries)
+DIGEST_QUERIES = 4
+
+
+def set_reminder_mode(app, user_id, mode):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.notification_preferences = {**user.notification_preferences, 'reminder_mode': mode}
+        db.session.commit()
+
+
+def send_reminders(client, auth):
+    with count_queries() as cost:
+        response = client.post('/api/notifications/reminders', headers=auth)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json(), cost
+
+
+def add_habits(client, auth, count):
+    for index in range(count):
+        response = client.post('/api/habits', headers=auth, json={'title': f'Habit {index}', 'frequency': 'daily'})
+        assert response.status_code == 201, response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('habits', [1, 12])
+def test_digest_cost_does_not_grow_with_due_habits(app, client, auth, habits):
+    set_reminder_mode(app, 1, 'digest')
+    add_habits(client, auth, habits)
+    send_reminders(client, auth)  # creates the unread counter row
+    
+    body, cost = send_reminders(client, auth)
+    
+    assert body['notifications_created'] == 1 and body['reminders_sent'] == habits
+    assert cost.queries == DIGEST_QUERIES, cost.statements
+    assert 'cost' not in body
+
+
+def test_accounts_without_reminder_mode_keep_one_notification_per_habit(app, client, auth):
+    with app.app_context():
+        user = db.session.get(User, 1)
+        user.notification_preferences = {'email': True, 'push': True}
+        db.session.commit()
+    add_habits(client, auth, 3)
+    
+    body, _ = send_reminders(client, auth)
+    
+    assert body['mode'] == 'individual'
+    assert body['notifications_created'] == 3
+    assert unread(client, auth) == 3
@@ -0,0 +1,135 @@
+"""Push fan-out and cleanup of device tokens the provider rejects"""
+import threading
+
+import pytest
+
+from models.device_token import DeviceToken
+from models.user import User
+from services.push import FAILED, INVALID, RETRY, SENT, PushMessage, PushProvider, StandInReceiver, fan_out, push_service
+from services.sharding import on_shard, shard_indexes
+
+
+class ScriptedProvider(PushProvider):
+    """Answers each token from a script of statuses, one per attempt"""
+    
+    def __init__(self, script, max_batch=2):
+        self.script = {token: list(statuses) for token, statuses in script.items()}
+        self.max_batch = max_batch
+        self.batches = []
+        self.lock = threading.Lock()
+    
+    def send_batch(self, messages):
+        with self.lock:
+            self.batches.append([message.token for message in messages])
+            return [self.script[message.token].pop(0) if self.script[message.token] else SENT for message in messages]
+
+
+def message(token, user_id=1):
+    return PushMessage(user_id, token, 'Reminder', 'Run is still open for today', {})
+
+
+def test_fan_out_sends_provider_sized_batches():
+    provider = ScriptedProvider({f't{index}': [] for index in range(5)}, max_batch=2)
+    
+    counts, invalid = fan_out(provider, [message(f't{index}') for index in range(5)], concurrency=3)
+    
+    assert counts[SENT] == 5 and counts['batches'] == 3
+    assert sorted(len(batch) for batch in provider.batches) == [1, 2, 2]
+    assert invalid == []
+
+
+def test_fan_out_retries_unavailable_messages_and_reports_invalid_tokens():
+    provider = ScriptedProvider({'ok': [SENT], 'busy': [RETRY, SENT], 'down': [RETRY] * 5, 'gone': [INVALID]})
+    messages = [message(token) for token in ('ok', 'busy', 'down', 'gone')]
+    
+    counts, invalid = fan_out(provider, messages, max_retries=2, retry_delay=0)
+    
+    assert (counts[SENT], counts[INVALID], counts[FAILED]) == (2, 1, 1)
+    assert counts['retried'] == 3  # busy and down once, down again
+    assert [item.token for item in invalid] == ['gone']
+
+
+@pytest.fixture
+def receiver():
+    server = StandInReceiver(('127.0.0.1', 0), max_batch=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config_overrides(receiver):
+    return {
+        'PUSH_PROVIDER': 'http',
+        'PUSH_PROVIDER_URL': receiver.url,
+        'PUSH_BATCH_SIZE': 2,
+        'PUSH_RETRY_BASE_MS': 1
+    }
+
+
+@pytest.fixture(autouse=True)
+def fresh_provider():
+    # The provider is cached per process; each test has its own receiver
+    push_service._provider = None
+    yield
+    push_service._provider = None
+
+
+def add_devices(client, auth, tokens):
+    for token in tokens:
+        response = client.post('/api/notifications/devices', headers=auth, json={'token': token, 'platform': 'ios'})
+        assert response.status_code == 201
+
+
+def stored_tokens(app, user_id=None):
+    tokens = []
+    with app.app_context():
+        for shard in shard_indexes():
+            with on_shard(shard):
+                query = DeviceToken.query if user_id is None else DeviceToken.query.filter_by(user_id=user_id)
+                tokens += [device.token for device in query]
+    return sorted(tokens)
+
+
+def test_push_reaches_every_device_and_removes_rejected_tokens(app, client, auth, receiver):
+    add_devices(client, auth, ['phone', 'tablet', 'invalid-old-phone'])
+    
+    with app.app_context():
+        counts = push_service.push_to_users([User.query.first()], 'Reminder', 'Run is still open')
+    
+    assert (counts[SENT], counts[INVALID]) == (2, 1)
+    assert counts['batches'] == 2
+    assert receiver.stats['delivered'] == 2
+    assert stored_tokens(app) == ['phone', 'tablet']
+
+
+def test_users_who_turned_push_off_get_nothing(app, client, auth, receiver):
+    add_devices(client, auth, ['phone'])
+    client.put('/api/auth/profile', headers=auth, json={'notification_preferences': {'push': False}})
+    
+    with app.app_context():
+        counts = push_service.push_to_users([User.query.first()], 'Reminder', 'Run is still open')
+    
+    assert counts[SENT] == 0
+    assert receiver.stats['messages'] == 0
+
+
+def test_a_token_moves_to_the_account_that_registers_it(app, client, auth, register):
+    add_devices(client, auth, ['shared-tablet'])
+    other = register('bob')
+    add_devices(client, other, ['shared-tablet'])
+    
+    assert stored_tokens(app, user_id=1) == []
+    assert stored_tokens(app, user_id=2) == ['shared-tablet']
+
+
+def test_deleting_the_account_deletes_its_tokens(app, client, auth, register):
+    add_devices(client, auth, ['phone', 'tablet'])
+    add_devices(client, register('bob'), ['bobs-phone'])
+    
+    response = client.delete('/api/auth/delete-account', headers=auth)
+    
+    assert response.status_code == 200
+    assert stored_tokens(app) == ['bobs-phone']
@@ -0,0 +1,110 @@
+"""Token buckets of both rate limit backends, alone and behind the decorator"""
+import pytest
+
+from services.rate_limit import MemoryBackend, SQLiteBackend, parse_limit
+
+LIMITS = {
+    'auth.login': {'ip': '3/minute', 'account': '2/minute'},
+    'todos.create_todo': {'account': '2/minute'},
+}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend_name(request):
+    return request.param
+
+
+@pytest.fixture
+def backend(backend_name, tmp_path):
+    if backend_name == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'buckets.db'))
+    return MemoryBackend()
+
+
+@pytest.fixture
+def config_overrides(backend_name, tmp_path):
+    return {
+        'RATE_LIMIT_ENABLED': True,
+        'RATE_LIMIT_BACKEND': backend_name,
+        'RATE_LIMIT_STORAGE_PATH': str(tmp_path / 'rate_limits.db'),
+        'RATE_LIMITS': LIMITS,
+    }
+
+
+def test_parse_limit():
+    assert parse_limit('10/minute') == (10.0, 10 / 60)
+    assert parse_limit('5/hours') == (5.0, 5 / 3600)
+    with pytest.raises(ValueError):
+        parse_limit('5/fortnight')
+
+
+def test_bucket_empties_and_refills(backend):
+    capacity, rate = parse_limit('3/minute')  # a token every 20 seconds
+    
+    assert [backend.consume('k', capacity, rate, 1000.0)[0] for _ in range(3)] == [True] * 3
+    allowed, retry_after = backend.consume('k', capacity, rate, 1000.0)
+    assert not allowed and retry_after == pytest.approx(20)
+    
+    # Half a token later the wait is halved; rejected requests spend nothing
+    allowed, retry_after = backend.consume('k', capacity, rate, 1010.0)
+    assert not allowed and retry_after == pytest.approx(10)
+    assert backend.consume('k', capacity, rate, 1020.0) == (True, 0.0)
+    assert not backend.consume('k', capacity, rate, 1020.0)[0]
+    
+    # A long pause refills up to the capacity and no further
+    results = [backend.consume('k', capacity, rate, 5000.0)[0] for _ in range(4)]
+    assert results == [True, True, True, False]
+
+
+def test_buckets_are_per_key(backend):
+    capacity, rate = parse_limit('1/minute')
+    
+    assert backend.consume('a', capacity, rate, 0.0)[0]
+    assert not backend.consume('a', capacity, rate, 0.0)[0]
+    assert backend.consume('b', capacity, rate, 0.0)[0]
+    
+    backend.reset()
+    assert backend.consume('a', capacity, rate, 0.0)[0]
+
+
+def login(client, email, ip='10.0.0.1'):
+    return client.post('/api/auth/login', json={'email': email, 'password': 'wrong'},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def test_429_with_retry_after(client):
+    assert [login(client, 'alice@example.com').status_code for _ in range(2)] == [401, 401]
+    
+    response = login(client, 'alice@example.com')
+    
+    assert response.status_code == 429
+    # 2/minute refills a token every 30 seconds
+    assert 29 <= int(response.headers['Retry-After']) <= 30
+    assert response.get_json()['retry_after'] == int(response.headers['Retry-After'])
+
+
+def test_login_is_limited_by_account_and_by_ip(client):
+    # The account limit follows the e-mail from one address to the next...
+    assert login(client, 'alice@example.com', '10.0.0.1').status_code == 401
+    assert login(client, 'Alice@Example.com ', '10.0.0.2').status_code == 401
+    assert login(client, 'alice@example.com', '10.0.0.3').status_code == 429
+    # ...and the IP limit stops one address from trying many accounts
+    assert login(client, 'bob@example.com', '10.0.0.1').status_code == 401
+    assert login(client, 'carol@example.com', '10.0.0.1').status_code == 401
+    assert login(client, 'dave@example.com', '10.0.0.1').status_code == 429
+    assert login(client, 'dave@example.com', '10.0.0.4').status_code == 401
+
+
+def test_authenticated_routes_are_limited_by_identity(client, register):
+    alice, bob = register('alice'), register('bob')
+    
+    def create(headers, ip, email='bob@example.com'):
+        return client.post('/api/todos', headers=headers, json={'text': 'Todo', 'email': email},
+                           environ_base={'REMOTE_ADDR': ip}).status_code
+    
+    # The body cannot move alice into another bucket, nor can a new address
+    assert [create(alice, '10.0.0.1'), create(alice, '10.0.0.2')] == [201, 201]
+    assert create(alice, '10.0.0.3', email='someone-else@example.com') == 429
+    # bob's bucket is his own, from the same address
+    assert [create(bob, '10.0.0.1'), create(bob, '10.0.0.1')] == [201, 201]
+    assert create(bob, '10.0.0.1') == 429
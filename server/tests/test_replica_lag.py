@@ -0,0 +1,76 @@
+"""Replica lag is probed in the background; requests never wait for it"""
+import threading
+import time
+
+import pytest
+
+from services import db_routing
+from services.db_routing import ReplicaMonitor
+
+ENGINES = {None: 'primary', 'replica_0': 'fast', 'replica_1': 'lagging'}
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    """measure_lag stand-in: blocks until released, then reports ENGINES' lag"""
+    release = threading.Event()
+    calls = []
+    
+    def measure_lag(engine):
+        calls.append(engine)
+        release.wait(5)
+        return {'fast': 0.5, 'lagging': 60.0}[engine]
+    
+    monkeypatch.setattr(db_routing, 'measure_lag', measure_lag)
+    return release, calls
+
+
+@pytest.fixture
+def monitor():
+    monitor = ReplicaMonitor()
+    yield monitor
+    monitor.stop(timeout=5)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_requests_do_not_wait_for_a_slow_probe(monitor, probes):
+    release, calls = probes
+    
+    started = time.perf_counter()
+    healthy = monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=10)
+    
+    assert time.perf_counter() - started < 0.5
+    assert healthy == []  # nothing measured yet: read from the primary
+    wait_for(lambda: calls)
+    
+    release.set()
+    wait_for(lambda: len(monitor.status()) == 2)
+    assert monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=10) == ['replica_0']
+    assert monitor.status() == {'replica_0': 0.5, 'replica_1': 60.0}
+
+
+def test_unreachable_replicas_are_skipped(monitor, monkeypatch):
+    monkeypatch.setattr(db_routing, 'measure_lag', lambda engine: None if engine == 'lagging' else 0.0)
+    
+    monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=10)
+    wait_for(lambda: len(monitor.status()) == 2)
+    
+    assert monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=10) == ['replica_0']
+
+
+def test_stale_measurements_are_not_trusted(monitor, probes):
+    release, _ = probes
+    release.set()
+    monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=0.05)
+    wait_for(lambda: monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=0.05) == ['replica_0'])
+    
+    # A probe stuck on a replica leaves its last measurement to age out
+    release.clear()
+    wait_for(lambda: monitor.healthy_replicas(ENGINES, max_lag=5, check_interval=0.05) == [])
+    release.set()
@@ -0,0 +1,76 @@
+"""Full-text search over the user's habits and todos"""
+import pytest
+
+
+@pytest.fixture
+def items(client, auth):
+    for title, description in (('Morning run', 'Run 5k before work'), ('Read', 'Twenty pages of a running book'),
+                               ('Stretch', 'After the run')):
+        client.post('/api/habits', headers=auth, json={'title': title, 'description': description, 'frequency': 'daily'})
+    for text in ('Buy running shoes', 'Call mum'):
+        client.post('/api/todos', headers=auth, json={'text': text})
+
+
+def search(client, auth, **params):
+    response = client.get('/api/search', headers=auth, query_string=params)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def titles(results):
+    return [result['habit']['title'] if result['type'] == 'habit' else result['todo']['text'] for result in results]
+
+
+def test_matches_words_and_prefixes_in_habits_and_todos(client, auth, items):
+    found = titles(search(client, auth, q='run')['results'])
+    
+    assert sorted(found) == ['Buy running shoes', 'Morning run', 'Read', 'Stretch']
+    assert 'Call mum' not in found
+
+
+def test_title_matches_rank_above_description_matches(client, auth, items):
+    results = search(client, auth, q='run', type='habit')['results']
+    
+    assert titles(results)[0] == 'Morning run'
+    assert results[0]['score'] >= results[-1]['score']
+
+
+def test_every_term_must_match(client, auth, items):
+    assert titles(search(client, auth, q='run work')['results']) == ['Morning run']
+    assert search(client, auth, q='run swim')['results'] == []
+
+
+def test_type_filter(client, auth, items):
+    assert titles(search(client, auth, q='run', type='todo')['results']) == ['Buy running shoes']
+    assert {result['type'] for result in search(client, auth, q='run', type='habit')['results']} == {'habit'}
+
+
+def test_pages_with_next_offset(client, auth, items):
+    first = search(client, auth, q='run', limit=3)
+    second = search(client, auth, q='run', limit=3, offset=first['next_offset'])
+    
+    assert len(first['results']) == 3 and first['next_offset'] == 3
+    assert len(second['results']) == 1 and second['next_offset'] is None
+    assert not set(titles(first['results'])) & set(titles(second['results']))
+
+
+def test_only_the_users_own_items_match(client, auth, register, items):
+    other = register('bob')
+    
+    assert search(client, other, q='run')['results'] == []
+
+
+def test_edits_and_deletes_reach_the_index(client, auth):
+    habit = client.post('/api/habits', headers=auth, json={'title': 'Swim', 'frequency': 'daily'}).get_json()['habit']
+    client.put(f"/api/habits/{habit['id']}", headers=auth, json={'title': 'Cycle'})
+    
+    assert search(client, auth, q='swim')['results'] == []
+    assert titles(search(client, auth, q='cycle')['results']) == ['Cycle']
+    
+    client.delete(f"/api/habits/{habit['id']}", headers=auth)
+    assert search(client, auth, q='cycle')['results'] == []
+
+
+@pytest.mark.parametrize('params', [{}, {'q': '  '}, {'q': 'run', 'type': 'goal'}, {'q': 'run', 'offset': 501}])
+def test_invalid_requests(client, auth, params):
+    assert client.get('/api/search', headers=auth, query_string=params).status_code == 400
@@ -0,0 +1,82 @@
+"""Background writers leave users who are being moved between shards alone"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from config.database import db
+from models.device_token import DeviceToken
+from models.habit import Habit
+from models.notification import Notification, NotificationCounter
+from models.shard import ShardAssignment
+from services.habit_purge import purge_deleted_habits
+from services.notification_retention import purge_read_notifications
+from services.push import PushMessage, remove_tokens
+from services.sharding import for_user, shard_map
+from services.unread_counter import reconcile_counters
+
+LONG_AGO = datetime.utcnow() - timedelta(days=400)
+
+
+@pytest.fixture
+def config_overrides():
+    return {'SHARD_TEST_COUNT': 2}
+
+
+@pytest.fixture
+def user(app, client, auth):
+    """alice (id 1) with a purgeable habit, an old read notification, a
+    drifted unread counter and a device token"""
+    response = client.post('/api/habits', headers=auth, json={'title': 'Stretch', 'frequency': 'daily'})
+    assert response.status_code == 201
+    with app.app_context(), for_user(1):
+        db.session.get(Habit, response.get_json()['habit']['id']).deleted_at = LONG_AGO
+        db.session.add(Notification(user_id=1, title='Old', message='Read long ago', type='push',
+                                    created_at=LONG_AGO, read_at=LONG_AGO))
+        db.session.add(NotificationCounter(user_id=1, unread=5))
+        db.session.add(DeviceToken(user_id=1, token='rejected-token'))
+        db.session.commit()
+    return 1
+
+
+def set_state(app, user_id, state):
+    with app.app_context():
+        db.session.execute(
+            update(ShardAssignment.__table__).where(ShardAssignment.user_id == user_id).values(state=state)
+        )
+        db.session.commit()
+
+
+def run_background_writers(app):
+    with app.app_context():
+        return {
+            'retention': purge_read_notifications(retention_days=90)['purged'],
+            'purge': purge_deleted_habits(undo_window_hours=1)['habits'],
+            'reconcile': reconcile_counters()['fixed'],
+            'tokens': remove_tokens([PushMessage(1, 'rejected-token', 'Hi', 'There', {})]),
+        }
+
+
+def test_moving_users_are_skipped(app, user):
+    set_state(app, user, 'moving')
+    with app.app_context():
+        assert shard_map.moving() == {user}
+    
+    assert run_background_writers(app) == {'retention': 0, 'purge': 0, 'reconcile': 0, 'tokens': 0}
+    with app.app_context(), for_user(user):
+        assert Habit.query.count() == 1
+        assert Notification.query.count() == 1
+        assert db.session.get(NotificationCounter, user).unread == 5
+        assert DeviceToken.query.count() == 1
+
+
+def test_rows_are_processed_once_the_move_ends(app, user):
+    set_state(app, user, 'moving')
+    run_background_writers(app)
+    set_state(app, user, 'active')
+    
+    assert run_background_writers(app) == {'retention': 1, 'purge': 1, 'reconcile': 1, 'tokens': 1}
+    with app.app_context(), for_user(user):
+        assert db.session.get(NotificationCounter, user).unread == 0
+
+
@@ -0,0 +1,84 @@
+"""Optimistic locking: ETag/If-Match and 409 Conflict on single-item writes"""
+from sqlalchemy import event, text
+
+from models.habit import Habit
+from services.db_routing import RoutingSession
+
+
+def create_habit(client, auth, title='Run'):
+    response = client.post('/api/habits', headers=auth, json={'title': title, 'frequency': 'daily'})
+    assert response.status_code == 201
+    return response.get_json()['habit']
+
+
+def test_habit_responses_carry_the_version_as_etag(client, auth):
+    habit = create_habit(client, auth)
+    
+    response = client.get(f"/api/habits/{habit['id']}", headers=auth)
+    assert response.headers['ETag'] == '"1"'
+    assert response.get_json()['version'] == 1
+    
+    response = client.put(f"/api/habits/{habit['id']}", headers=auth, json={'title': 'Run 5k'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+
+
+def test_matching_if_match_updates(client, auth):
+    habit = create_habit(client, auth)
+    
+    response = client.put(f"/api/habits/{habit['id']}", headers={**auth, 'If-Match': '"1"'}, json={'title': 'Run 5k'})
+    assert response.status_code == 200
+    assert response.get_json()['habit']['title'] == 'Run 5k'
+
+
+def test_stale_if_match_is_a_conflict(client, auth):
+    habit = create_habit(client, auth)
+    client.put(f"/api/habits/{habit['id']}", headers=auth, json={'title': 'Run 5k'})
+    
+    response = client.put(f"/api/habits/{habit['id']}", headers={**auth, 'If-Match': '"1"'}, json={'title': 'Walk'})
+    assert response.status_code == 409
+    assert response.headers['ETag'] == '"2"'
+    assert response.get_json()['current']['title'] == 'Run 5k'
+    assert client.get(f"/api/habits/{habit['id']}", headers=auth).get_json()['title'] == 'Run 5k'
+
+
+def test_weak_and_wildcard_if_match_are_accepted(client, auth):
+    habit = create_habit(client, auth)
+    
+    response = client.put(f"/api/habits/{habit['id']}", headers={**auth, 'If-Match': 'W/"1"'}, json={'title': 'A'})
+    assert response.status_code == 200
+    response = client.put(f"/api/habits/{habit['id']}", headers={**auth, 'If-Match': '*'}, json={'title': 'B'})
+    assert response.status_code == 200
+
+
+def test_todo_and_profile_check_if_match(client, auth):
+    todo = client.post('/api/todos', headers=auth, json={'text': 'Buy milk'}).get_json()['todo']
+    response = client.put(f"/api/todos/{todo['id']}", headers={**auth, 'If-Match': '"7"'}, json={'completed': True})
+    assert response.status_code == 409
+    
+    response = client.put('/api/auth/profile', headers={**auth, 'If-Match': '"7"'}, json={'username': 'alicia'})
+    assert response.status_code == 409
+    response = client.put('/api/auth/profile', headers={**auth, 'If-Match': '"1"'}, json={'username': 'alicia'})
+    assert response.status_code == 200
+
+
+def test_write_that_loses_the_race_is_a_conflict(app, client, auth):
+    habit = create_habit(client, auth)
+    
+    def concurrent_edit(session, flush_context, instances):
+        # Another request commits its edit between this request's read and write
+        with session.get_bind(Habit.__mapper__).begin() as connection:
+            connection.execute(text("UPDATE habits SET title = 'Swim', version = version + 1 WHERE id = :id"),
+                               {'id': habit['id']})
+    
+    event.listen(RoutingSession, 'before_flush', concurrent_edit, once=True)
+    try:
+        with app.app_context():
+            response = client.put(f"/api/habits/{habit['id']}", headers=auth, json={'title': 'Walk'})
+    finally:
+        if event.contains(RoutingSession, 'before_flush', concurrent_edit):
+            event.remove(RoutingSession, 'before_flush', concurrent_edit)
+    
+    assert response.status_code == 409
+    assert response.get_json()['current']['title'] == 'Swim'
+    assert response.headers['ETag'] == '"2"'
@@ -0,0 +1,57 @@
+"""
+SQL statements issued by the write endpoints.
+
+Each handler's statements are counted with
+services.sql_instrumentation.count_queries, so a change that brings back
+post-commit refresh SELECTs fails here.
+"""
+import pytest
+
+from services.sql_instrumentation import count_queries
+
+# Most statements a handler may issue, and what they are.  Reads that
+# refresh rows already in the session after commit must not appear here.
+BUDGETS = {
+    # INSERT habit
+    'POST /api/habits': 1,
+    # SELECT habit + UPDATE habit
+    'PUT /api/habits/<id>': 2,
+    # SELECT habit + UPDATE habit + INSERT completion + INSERT ledger entry
+    # + SELECT user + SELECT pending points (a first completion unlocks no
+    # achievements, so the achievement checks issue nothing)
+    'POST /api/habits/<id>/complete': 6,
+    # INSERT todo
+    'POST /api/todos': 1,
+    # SELECT todo + UPDATE todo
+    'PUT /api/todos/<id>': 2,
+}
+
+
+def measure(client, auth, method, url, **kwargs):
+    with count_queries() as cost:
+        response = getattr(client, method)(url, headers=auth, **kwargs)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    return response.get_json(), cost
+
+
+@pytest.fixture
+def costs(client, auth):
+    """Statement counts of one pass over the write endpoints"""
+    results = {}
+    body, results['POST /api/habits'] = measure(
+        client, auth, 'post', '/api/habits', json={'title': 'Run', 'frequency': 'daily'}
+    )
+    habit_id = body['habit']['id']
+    _, results['PUT /api/habits/<id>'] = measure(client, auth, 'put', f'/api/habits/{habit_id}', json={'title': 'Run 5k'})
+    _, results['POST /api/habits/<id>/complete'] = measure(client, auth, 'post', f'/api/habits/{habit_id}/complete')
+    body, results['POST /api/todos'] = measure(client, auth, 'post', '/api/todos', json={'text': 'Buy milk'})
+    todo_id = body['todo']['id']
+    _, results['PUT /api/todos/<id>'] = measure(client, auth, 'put', f'/api/todos/{todo_id}', json={'completed': True})
+    return results
+
+
+@pytest.mark.parametrize('endpoint', sorted(BUDGETS))
+def test_write_endpoint_stays_within_budget(costs, endpoint):
+    cost = costs[endpoint]
+    statements = '\n'.join(' '.join(statement.split())[:120] for statement in cost.statements)
+    assert cost.queries <= BUDGETS[endpoint], f'{endpoint} issued {cost.queries} statements:\n{statements}'
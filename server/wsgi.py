@@ -0,0 +1,31 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is created once at import time.  With ``preload_app`` gunicorn does
+this in the master, so database engines and other connection pools must be
+reset in each worker after the fork (see ``reset_after_fork``).
+"""
+from app import create_app
+from config.database import db
+
+app = create_app()
+
+
+def reset_after_fork(app):
+    """Drop connections inherited from the master process.
+
+    ``dispose(close=False)`` replaces each engine's pool without closing the
+    parent's sockets, which are still owned by the master.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    
+    # Locks, threads, pools and caches copied from the master (see each
+    # extension's after_fork)
+    for extension in list(app.extensions.values()):
+        after_fork = getattr(extension, 'after_fork', None)
+        if callable(after_fork):
+            after_fork()